@@ -20,6 +20,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const API_BASE_URL = 'http://127.0.0.1:8000';
     let dernierePropositionComplete = null;
+    let dernierPlanId = null;
 
     // --- GESTION DES ONGLETS ---
     const tabs = [
@@ -343,6 +344,7 @@ document.addEventListener('DOMContentLoaded', () => {
             
             const result = await response.json();
             dernierePropositionComplete = result.data;
+            dernierPlanId = result.plan_id || null;
             displayResults(result.data);
         } catch (error) {
             resultatSection.innerHTML = `<div class="p-4 text-center bg-red-100 text-red-800 rounded-lg"><p><b>Erreur :</b> ${error.message}</p></div>`;
@@ -417,11 +419,19 @@ document.addEventListener('DOMContentLoaded', () => {
         btn.disabled = true;
 
         try {
-            const response = await fetch(`${API_BASE_URL}${endpoint}`, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(dernierePropositionComplete),
-            });
+            let response = null;
+            // Le serveur garde le plan calculé : on le redemande par son identifiant sans renvoyer tout le plan
+            if (dernierPlanId && type !== 'dwg') {
+                response = await fetch(`${API_BASE_URL}/api/plans/${dernierPlanId}/${type}`);
+            }
+            // Plan expiré (ou servi par une autre instance) : on renvoie le plan complet
+            if (!response || response.status === 404) {
+                response = await fetch(`${API_BASE_URL}${endpoint}`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(dernierePropositionComplete),
+                });
+            }
 
             if (!response.ok) {
                 const errorData = await response.json();
@@ -0,0 +1,237 @@
+# benchmark.py
+# Mesures de performance du calcul et des rendus, à lancer à la main :
+#   python -m generateurbackend.benchmark --preset rapide --sortie bench.json
+#   python -m generateurbackend.benchmark --preset rapide --reference bench.json   (comparaison entre commits)
+#   python -m generateurbackend.benchmark --cotes                                  (profils de cotes DXF)
+#   python -m generateurbackend.benchmark --json                                   (encodage / décodage JSON des plans)
+#   python -m generateurbackend.benchmark --import                                 (temps d'import au démarrage)
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .dessin_dxf import PROFILS_COTES, creer_plan_dxf_bytes
+from .dessin_pdf import creer_plan_pdf_bytes
+
+# Grilles de scénarios : (nombres de morceaux, nombres de sections par morceau, remplissages, avec platine)
+REMPLISSAGES = ("barreaudage_vertical", "barreaudage_horizontal")
+PRESETS = {
+    "rapide": ((1, 10), (1, 10), REMPLISSAGES, (False, True)),
+    "standard": ((1, 10, 100), (1, 10, 50), REMPLISSAGES, (False, True)),
+    "complet": ((1, 10, 100, 1000), (1, 10, 50), REMPLISSAGES, (False, True)),
+}
+# Étapes mesurées : calcul du plan (process_data), rendu PDF, rendu DXF (sérialisation comprise)
+ETAPES = ("process_data", "pdf", "dxf")
+
+
+def projet_synthetique(nb_morceaux: int, nb_sections: int, remplissage: str = "barreaudage_vertical", platine: bool = False) -> Dict[str, Any]:
+    """
+    Projet (ProjectData) généré : `nb_morceaux` morceaux de `nb_sections` sections chacun.
+    Les longueurs varient d'un morceau à l'autre pour que chaque morceau ait une géométrie distincte.
+    """
+    morceaux = []
+    for m in range(nb_morceaux):
+        structure: List[Dict[str, Any]] = [{"type": "poteau"}]
+        for s in range(nb_sections):
+            structure.append({"type": "section", "longueur": 800 + (m * 7 + s * 13) % 700})
+            structure.append({"type": "poteau" if s == nb_sections - 1 else "liaison"})
+        morceaux.append({"nombre_sections": nb_sections, "angle": (0.0, 12.5, 30.0)[m % 3], "structure": structure})
+    return {
+        "titre_plan": f"Benchmark {nb_morceaux}x{nb_sections}", "nom_client": "Benchmark", "date_chantier": "2025-01-01",
+        "hauteur_totale": 1020, "hauteur_lisse_basse": 100,
+        "poteau_dims": "40x40", "liaison_dims": "40x20", "lissehaute_dims": "40x40",
+        "lissebasse_dims": "40x30", "barreau_dims": "20x20", "ecart_barreaux": 110,
+        "type_fixation": "platine" if platine else "scellement", "remplissage_type": remplissage,
+        "platine_dimensions": "150x150x8", "platine_trous": "4 x Ø12", "platine_entraxes": "110x110",
+        "nombre_morceaux": nb_morceaux, "morceaux_identiques": "non", "morceaux": morceaux,
+    }
+
+def plan_synthetique(nb_morceaux: int, nb_sections: int, **options) -> Dict[str, Any]:
+    """Plan calculé (FinalPlanData.model_dump()) à partir d'un projet synthétique."""
+    from .calcul import ProjectData, calculer_plan_dict
+    return calculer_plan_dict(ProjectData(**projet_synthetique(nb_morceaux, nb_sections, **options)))
+
+def chronometrer(fn: Callable[[], Any], repetitions: int = 3) -> Tuple[float, Any]:
+    """Meilleur temps (s) sur `repetitions` appels, et le résultat du dernier appel."""
+    meilleur, resultat = float("inf"), None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fn()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur, resultat
+
+def bench_cotes_dxf(tailles: List[Tuple[int, int]], repetitions: int = 3) -> List[Dict[str, Any]]:
+    """Compare temps de génération et taille du DXF selon le profil de cotes (rendues / natives)."""
+    resultats = []
+    for nb_morceaux, nb_sections in tailles:
+        plan = plan_synthetique(nb_morceaux, nb_sections)
+        for cotes in PROFILS_COTES:
+            duree, contenu = chronometrer(lambda: creer_plan_dxf_bytes(plan, cotes=cotes), repetitions)
+            resultats.append({"morceaux": nb_morceaux, "sections": nb_sections, "cotes": cotes, "secondes": round(duree, 4), "octets": len(contenu)})
+    return resultats
+
+def bench_json(tailles: List[Tuple[int, int]], repetitions: int = 3, decimales: int = 2) -> List[Dict[str, Any]]:
+    """
+    Compare, pour la réponse de process-data, l'encodage par défaut de FastAPI (jsonable_encoder + json)
+    à ReponseJSON (avec et sans arrondi des flottants) ; et, pour le corps de draw-pdf / draw-dxf,
+    la validation d'un dictionnaire issu de json.loads à `model_validate_json`.
+    """
+    from fastapi.encoders import jsonable_encoder
+    from .calcul import FinalPlanData
+    from .reponses import ReponseJSON
+    variantes = {
+        "encodage_fastapi": lambda contenu, corps: json.dumps(jsonable_encoder(contenu), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8"),
+        "encodage_direct": lambda contenu, corps: ReponseJSON(contenu).body,
+        f"encodage_{decimales}_decimales": lambda contenu, corps: ReponseJSON(contenu, decimales=decimales).body,
+        "decodage_dict": lambda contenu, corps: FinalPlanData(**json.loads(corps)).model_dump(),
+        "decodage_direct": lambda contenu, corps: FinalPlanData.model_validate_json(corps).model_dump(),
+    }
+    resultats = []
+    for nb_morceaux, nb_sections in tailles:
+        plan = plan_synthetique(nb_morceaux, nb_sections)
+        contenu, corps = {"status": "success", "plan_id": "benchmark", "data": plan}, ReponseJSON(plan).body
+        for variante, fn in variantes.items():
+            duree, produit = chronometrer(lambda: fn(contenu, corps), repetitions)
+            octets = len(produit) if isinstance(produit, bytes) else len(corps)
+            resultats.append({"morceaux": nb_morceaux, "sections": nb_sections, "variante": variante, "secondes": round(duree, 4), "octets": octets})
+    return resultats
+
+# Imports mesurés par bench_import : l'application seule (démarrage), puis chaque dépendance chargée à la demande
+IMPORTS_DEMARRAGE = ("generateurbackend.main", "generateurbackend.dessin_pdf", "generateurbackend.dessin_dxf", "google.generativeai", "PIL.Image")
+
+def bench_import(modules: Iterable[str] = IMPORTS_DEMARRAGE, repetitions: int = 3) -> List[Dict[str, Any]]:
+    """Meilleur temps d'import de chaque module dans un interpréteur neuf (démarrage à froid d'un worker)."""
+    resultats = []
+    for module in modules:
+        code = f"import time; debut = time.perf_counter(); import {module}; print(time.perf_counter() - debut)"
+        durees = []
+        for _ in range(repetitions):
+            sortie = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True)
+            if sortie.returncode != 0:
+                break
+            durees.append(float(sortie.stdout.strip().splitlines()[-1]))
+        resultats.append({"module": module, "secondes": round(min(durees), 4) if durees else None})
+    return resultats
+
+
+def memoire_max(fn: Callable[[], Any]) -> int:
+    """Pic d'allocation mémoire Python (octets) pendant un appel, mesuré par tracemalloc."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def scenarios(preset: str) -> Iterable[Dict[str, Any]]:
+    morceaux, sections, remplissages, platines = PRESETS[preset]
+    for nb_morceaux, nb_sections, remplissage, platine in itertools.product(morceaux, sections, remplissages, platines):
+        yield {"morceaux": nb_morceaux, "sections": nb_sections, "remplissage": remplissage, "platine": platine}
+
+def mesurer_scenario(scenario: Dict[str, Any], repetitions: int = 3, memoire: bool = True) -> List[Dict[str, Any]]:
+    """Latence (meilleur temps), pic mémoire et taille produite de chaque étape pour un projet synthétique."""
+    from starlette.requests import Request
+    from .main import ProjectData, process_data
+    requete = Request({"type": "http", "headers": []})
+    projet = projet_synthetique(scenario["morceaux"], scenario["sections"], scenario["remplissage"], scenario["platine"])
+    # Le plan calculé sert d'entrée aux deux rendus, comme dans l'API
+    plan = json.loads(asyncio.run(process_data(ProjectData(**projet), requete)).body)["data"]
+    etapes = {
+        "process_data": lambda: asyncio.run(process_data(ProjectData(**projet), requete)).body,
+        "pdf": lambda: creer_plan_pdf_bytes(plan),
+        "dxf": lambda: creer_plan_dxf_bytes(plan),
+    }
+    resultats = []
+    for etape in ETAPES:
+        duree, contenu = chronometrer(etapes[etape], repetitions)
+        resultats.append({**scenario, "etape": etape, "secondes": round(duree, 6), "octets": len(contenu or b""), "memoire_max": memoire_max(etapes[etape]) if memoire else None})
+    return resultats
+
+def commit_courant() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executer_benchmark(preset: str, repetitions: int = 3, memoire: bool = True) -> Dict[str, Any]:
+    """Mesure tous les scénarios du preset et retourne le rapport (sérialisable en JSON)."""
+    resultats = []
+    for scenario in scenarios(preset):
+        resultats += mesurer_scenario(scenario, repetitions, memoire)
+    return {
+        "commit": commit_courant(), "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(), "preset": preset, "repetitions": repetitions, "resultats": resultats,
+    }
+
+def cle_resultat(ligne: Dict[str, Any]) -> Tuple:
+    return (ligne["morceaux"], ligne["sections"], ligne["remplissage"], ligne["platine"], ligne["etape"])
+
+def comparer(rapport: Dict[str, Any], reference: Dict[str, Any], seuil: float = 1.2) -> List[Dict[str, Any]]:
+    """
+    Compare deux rapports et retourne les régressions : mesures (temps, mémoire, taille) du rapport
+    supérieures de plus de `seuil` fois à celles de la référence, pour les mêmes scénarios.
+    """
+    anciens = {cle_resultat(ligne): ligne for ligne in reference["resultats"]}
+    regressions = []
+    for ligne in rapport["resultats"]:
+        ancienne = anciens.get(cle_resultat(ligne))
+        if ancienne is None:
+            continue
+        for mesure in ("secondes", "memoire_max", "octets"):
+            if ligne.get(mesure) and ancienne.get(mesure) and ligne[mesure] > seuil * ancienne[mesure]:
+                regressions.append({**ligne, "mesure": mesure, "reference": ancienne[mesure], "ratio": round(ligne[mesure] / ancienne[mesure], 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    warnings.simplefilter("ignore")
+    parser = argparse.ArgumentParser(description="Benchmark du calcul (process_data) et des rendus PDF/DXF.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="rapide")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--sans-memoire", action="store_true", help="ne pas mesurer le pic mémoire (plus rapide)")
+    parser.add_argument("--sortie", help="fichier JSON où écrire les résultats")
+    parser.add_argument("--reference", help="résultats JSON d'un commit précédent, pour détecter les régressions")
+    parser.add_argument("--seuil", type=float, default=1.2, help="ratio au-delà duquel une mesure est une régression")
+    parser.add_argument("--cotes", action="store_true", help="comparer seulement les profils de cotes DXF")
+    parser.add_argument("--json", action="store_true", help="comparer seulement l'encodage et le décodage JSON des plans")
+    parser.add_argument("--import", dest="imports", action="store_true", help="mesurer seulement les temps d'import au démarrage")
+    args = parser.parse_args()
+
+    if args.cotes:
+        print(f"{'morceaux':>9} {'sections':>9} {'cotes':>8} {'secondes':>9} {'octets':>10}")
+        for ligne in bench_cotes_dxf([(1, 5), (10, 10), (50, 20)], args.repetitions):
+            print(f"{ligne['morceaux']:>9} {ligne['sections']:>9} {ligne['cotes']:>8} {ligne['secondes']:>9.3f} {ligne['octets']:>10}")
+        sys.exit(0)
+    if args.json:
+        print(f"{'morceaux':>9} {'sections':>9} {'variante':>21} {'secondes':>9} {'octets':>10}")
+        for ligne in bench_json([(10, 10), (100, 10), (1000, 10)], args.repetitions):
+            print(f"{ligne['morceaux']:>9} {ligne['sections']:>9} {ligne['variante']:>21} {ligne['secondes']:>9.3f} {ligne['octets']:>10}")
+        sys.exit(0)
+    if args.imports:
+        print(f"{'module':>30} {'secondes':>9}")
+        for ligne in bench_import(repetitions=args.repetitions):
+            print(f"{ligne['module']:>30} {ligne['secondes'] if ligne['secondes'] is not None else 'absent':>9}")
+        sys.exit(0)
+
+    rapport = executer_benchmark(args.preset, args.repetitions, memoire=not args.sans_memoire)
+    print(f"{'morceaux':>9} {'sections':>9} {'remplissage':>23} {'platine':>8} {'etape':>13} {'secondes':>9} {'memoire':>11} {'octets':>10}")
+    for ligne in rapport["resultats"]:
+        print(f"{ligne['morceaux']:>9} {ligne['sections']:>9} {ligne['remplissage']:>23} {str(ligne['platine']):>8} {ligne['etape']:>13} {ligne['secondes']:>9.3f} {ligne['memoire_max'] or 0:>11} {ligne['octets']:>10}")
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            regressions = comparer(rapport, json.load(f), args.seuil)
+        for r in regressions:
+            print(f"REGRESSION {r['etape']} {r['morceaux']}x{r['sections']} {r['remplissage']} platine={r['platine']} : {r['mesure']} x{r['ratio']}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,120 @@
+# cache_ia.py
+# Cache des analyses de description (/api/parse-text) : une description déjà analysée, aux espaces et
+# à la casse près, retrouve son formulaire sans nouvel appel au modèle. Entrées limitées en nombre (LRU)
+# et en durée de vie ; copie facultative dans un fichier SQLite pour survivre aux redémarrages.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+def normaliser_description(description: str) -> str:
+    """Description sans différences d'espacement ni de casse."""
+    return " ".join(description.split()).casefold()
+
+def cle_description(description: str, analyseur: str) -> str:
+    """Clé d'une analyse : empreinte de la description normalisée et de l'analyseur (backend, modèle)."""
+    return hashlib.sha256(f"{analyseur}\n{normaliser_description(description)}".encode("utf-8")).hexdigest()
+
+
+class CacheAnalyses:
+    """
+    Formulaires (`ParsedFormData.model_dump()`) déjà obtenus, par clé de description (voir `cle_description`).
+    Les entrées expirent après `ttl` secondes et les moins récemment utilisées sont oubliées au-delà de
+    `max_entrees` (0 désactive le cache). Avec un `fichier`, les entrées sont aussi écrites dans une base
+    SQLite, rechargée à la création du cache. `get` ne lit que la mémoire : les dates d'accès sont
+    reportées dans la base au prochain `put` (qui y écrit de toute façon) ou à la fermeture.
+    """
+
+    def __init__(self, max_entrees: int, ttl: float, fichier: Optional[Path] = None):
+        self.max_entrees = max_entrees
+        self.ttl = ttl
+        self._entrees: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Dates d'accès pas encore écrites dans la base, par clé
+        self._acces: Dict[str, float] = {}
+        self._verrou = threading.Lock()
+        self._base: Optional[sqlite3.Connection] = None
+        if self.actif and fichier:
+            Path(fichier).parent.mkdir(parents=True, exist_ok=True)
+            self._base = sqlite3.connect(str(fichier), check_same_thread=False, isolation_level=None)
+            self._base.execute("PRAGMA journal_mode=WAL")
+            self._base.execute("CREATE TABLE IF NOT EXISTS analyses (cle TEXT PRIMARY KEY, expiration REAL, acces REAL, champs TEXT)")
+            self._charger()
+
+    @property
+    def actif(self) -> bool:
+        return self.max_entrees > 0
+
+    def _charger(self):
+        """Reprend les entrées encore valides de la base, les plus récemment utilisées en dernier."""
+        self._base.execute("DELETE FROM analyses WHERE expiration < ?", (time.time(),))
+        lignes = self._base.execute("SELECT cle, expiration, champs FROM analyses ORDER BY acces DESC LIMIT ?", (self.max_entrees,)).fetchall()
+        for cle, expiration, champs in reversed(lignes):
+            self._entrees[cle] = (expiration, json.loads(champs))
+        self._base.execute("DELETE FROM analyses WHERE cle NOT IN (SELECT cle FROM analyses ORDER BY acces DESC LIMIT ?)", (self.max_entrees,))
+
+    def get(self, cle: str) -> Optional[Dict[str, Any]]:
+        if not self.actif:
+            return None
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None:
+                return None
+            expiration, champs = entree
+            maintenant = time.time()
+            if expiration < maintenant:
+                # La ligne expirée de la base est supprimée au prochain chargement
+                del self._entrees[cle]
+                self._acces.pop(cle, None)
+                return None
+            self._entrees.move_to_end(cle)
+            if self._base is not None:
+                self._acces[cle] = maintenant
+            return dict(champs)
+
+    def put(self, cle: str, champs: Dict[str, Any]):
+        if not self.actif:
+            return
+        maintenant = time.time()
+        with self._verrou:
+            self._entrees.pop(cle, None)
+            self._entrees[cle] = (maintenant + self.ttl, dict(champs))
+            self._acces.pop(cle, None)
+            evincees = []
+            while len(self._entrees) > self.max_entrees:
+                evincee = self._entrees.popitem(last=False)[0]
+                self._acces.pop(evincee, None)
+                evincees.append(evincee)
+            if self._base is not None:
+                self._base.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)", (cle, maintenant + self.ttl, maintenant, json.dumps(champs, ensure_ascii=False)))
+                self._base.executemany("DELETE FROM analyses WHERE cle = ?", [(c,) for c in evincees])
+                self._ecrire_acces()
+
+    def _ecrire_acces(self):
+        """Reporte dans la base les dates d'accès en attente (appelé sous self._verrou)."""
+        if self._acces:
+            self._base.executemany("UPDATE analyses SET acces = ? WHERE cle = ?", [(acces, cle) for cle, acces in self._acces.items()])
+            self._acces.clear()
+
+    def fermer(self):
+        with self._verrou:
+            if self._base is not None:
+                self._ecrire_acces()
+                self._base.close()
+                self._base = None
+
+
+def creer_cache_analyses_depuis_env() -> CacheAnalyses:
+    """Construit le cache à partir de IA_CACHE_MAX, IA_CACHE_TTL (secondes) et IA_CACHE_FICHIER (base SQLite, facultative)."""
+    fichier = os.getenv("IA_CACHE_FICHIER")
+    return CacheAnalyses(
+        max_entrees=int(os.getenv("IA_CACHE_MAX", "1000")),
+        ttl=float(os.getenv("IA_CACHE_TTL", str(7 * 24 * 3600))),
+        fichier=Path(fichier) if fichier else None,
+    )
@@ -0,0 +1,139 @@
+# cache_rendu.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+
+def empreinte_canonique(obj: Any) -> str:
+    """Empreinte SHA-256 d'un objet JSON sérialisé de façon canonique (clés triées, sans espaces)."""
+    canonique = json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonique.encode('utf-8')).hexdigest()
+
+def cle_rendu(data: Dict[str, Any], format_sortie: str, version_rendu: str) -> str:
+    """Calcule la clé de cache d'un rendu : empreinte du plan, du format de sortie et de la version du moteur de rendu."""
+    return empreinte_canonique({"data": data, "format": format_sortie, "version": version_rendu})
+
+
+class CacheRendu:
+    """
+    Cache disque des fichiers PDF/DXF générés, adressé par contenu (voir `cle_rendu`).
+    La taille totale est plafonnée à `taille_max` octets, les entrées les moins récemment
+    utilisées étant supprimées en premier. Une taille maximale de 0 désactive le cache.
+    Les méthodes accèdent au disque : le serveur les appelle hors de la boucle d'événements.
+    """
+
+    def __init__(self, dossier: Path, taille_max: int):
+        self.dossier = Path(dossier)
+        self.taille_max = taille_max
+        self.hits = 0
+        self.misses = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._taille_totale = 0
+        self._verrou = threading.Lock()
+        if self.actif:
+            self.dossier.mkdir(parents=True, exist_ok=True)
+            self._charger_index()
+
+    @property
+    def actif(self) -> bool:
+        return self.taille_max > 0
+
+    def _chemin(self, cle: str) -> Path:
+        return self.dossier / cle
+
+    def _charger_index(self):
+        """Reconstruit l'index LRU à partir des fichiers déjà présents (ordre: date de dernier accès)."""
+        fichiers = [f for f in self.dossier.iterdir() if f.is_file() and not f.name.startswith('.')]
+        fichiers.sort(key=lambda f: f.stat().st_mtime)
+        for f in fichiers:
+            taille = f.stat().st_size
+            self._index[f.name] = taille
+            self._taille_totale += taille
+        self._evincer()
+
+    def _evincer(self, entrees_min: int = 0):
+        while self._taille_totale > self.taille_max and len(self._index) > entrees_min:
+            cle, taille = self._index.popitem(last=False)
+            self._taille_totale -= taille
+            self._chemin(cle).unlink(missing_ok=True)
+
+    def get(self, cle: str) -> Optional[BinaryIO]:
+        """
+        Ouvre le fichier en cache et retourne son descripteur, ou None (et compte un échec).
+        Le fichier est ouvert sous le verrou : s'il est évincé pendant l'envoi, la lecture en cours
+        n'est pas interrompue (le contenu reste lisible jusqu'à la fermeture du descripteur).
+        """
+        if not self.actif:
+            return None
+        with self._verrou:
+            if cle not in self._index:
+                self.misses += 1
+                return None
+            chemin = self._chemin(cle)
+            try:
+                fichier = open(chemin, 'rb')
+            except FileNotFoundError:
+                self._taille_totale -= self._index.pop(cle)
+                self.misses += 1
+                return None
+            self._index.move_to_end(cle)
+            self.hits += 1
+        # La date de modification sert d'ordre LRU au redémarrage
+        try:
+            os.utime(chemin)
+        except FileNotFoundError:
+            pass
+        return fichier
+
+    def put(self, cle: str, contenu: bytes) -> Optional[Path]:
+        """Écrit `contenu` dans le cache (écriture atomique) et retourne le chemin de l'entrée."""
+        if not self.actif:
+            return None
+        chemin = self._chemin(cle)
+        with tempfile.NamedTemporaryFile(dir=self.dossier, prefix='.', delete=False) as tmpfile:
+            tmpfile.write(contenu)
+        os.replace(tmpfile.name, chemin)
+        self._enregistrer(cle, len(contenu))
+        return chemin
+
+    def chemin_temporaire(self) -> Path:
+        """Fichier vide où écrire un rendu en flux avant de l'ajouter au cache avec `adopter`."""
+        dossier = self.dossier if self.actif else None
+        descripteur, nom = tempfile.mkstemp(dir=dossier, prefix='.')
+        os.close(descripteur)
+        return Path(nom)
+
+    def adopter(self, cle: str, chemin: Path) -> Optional[Path]:
+        """Ajoute au cache un fichier déjà écrit (déplacé, sans copie) et retourne le chemin de l'entrée."""
+        if not self.actif:
+            return None
+        taille = Path(chemin).stat().st_size
+        destination = self._chemin(cle)
+        os.replace(chemin, destination)
+        self._enregistrer(cle, taille)
+        return destination
+
+    def _enregistrer(self, cle: str, taille: int):
+        with self._verrou:
+            self._taille_totale -= self._index.pop(cle, 0)
+            self._index[cle] = taille
+            self._taille_totale += taille
+            # On garde toujours au moins l'entrée qui vient d'être ajoutée
+            self._evincer(entrees_min=1)
+
+    def stats(self) -> Dict[str, int]:
+        with self._verrou:
+            return {"hits": self.hits, "misses": self.misses, "entrees": len(self._index), "octets": self._taille_totale}
+
+
+def creer_cache_depuis_env() -> CacheRendu:
+    """Construit le cache à partir de RENDU_CACHE_DIR et RENDU_CACHE_MAX_MO (0 pour désactiver)."""
+    dossier = os.getenv("RENDU_CACHE_DIR", os.path.join(tempfile.gettempdir(), "garde_corps_rendu_cache"))
+    taille_max_mo = int(os.getenv("RENDU_CACHE_MAX_MO", "256"))
+    return CacheRendu(Path(dossier), taille_max_mo * 1024 * 1024)
@@ -0,0 +1,237 @@
+# calcul.py
+# Calcul du plan de fabrication (répartition des barreaux, nomenclature, platine) et modèles de données
+# du projet et du plan. Ce module n'importe pas l'application : les processus de rendu, qui exécutent
+# ces calculs pour les lots et les requêtes profilées, n'en subissent pas l'initialisation (caches, client IA).
+
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from .colonnes import TYPE_AUTRE, TYPE_LIAISON, TYPE_POTEAU, TYPE_SECTION, SectionsColonnes, StructureColonnes, longueurs_libres
+from .metriques import ELEMENTS_PLAN, etape
+from .profils import profils_du_plan
+from .repartition import calculate_repartition_batch
+
+
+class StructureItem(BaseModel):
+    type: str
+    longueur: Optional[float] = None
+
+class MorceauData(BaseModel):
+    nombre_sections: int
+    structure: List[StructureItem]
+    angle: Optional[float] = 0.0
+
+class PlatineDetails(BaseModel):
+    longueur: float
+    largeur: float
+    epaisseur: float
+    nombre_trous: int
+    diametre_trous: float
+    entraxe_longueur: float
+    entraxe_largeur: float
+
+class ProjectData(BaseModel):
+    titre_plan: str
+    nom_client: str
+    date_chantier: str
+    hauteur_totale: int
+    hauteur_lisse_basse: int
+    poteau_dims: str
+    liaison_dims: str
+    lissehaute_dims: str
+    lissebasse_dims: str
+    barreau_dims: str
+    ecart_barreaux: int
+    type_fixation: str
+    remplissage_type: str
+    platine_dimensions: Optional[str] = None
+    platine_trous: Optional[str] = None
+    platine_entraxes: Optional[str] = None
+    nombre_morceaux: int
+    morceaux_identiques: str
+    morceaux: List[MorceauData]
+
+class NomenclatureItem(BaseModel):
+    item: str
+    details: str
+    quantite: int
+    longueur_unitaire_mm: int
+
+class SectionPlan(BaseModel):
+    longueur_section: float
+    longueur_libre: float
+    nombre_barreaux: int
+    vide_entre_barreaux_mm: float
+    jeu_depart_mm: float
+
+class MorceauPlan(BaseModel):
+    id: int
+    longueur_totale: float
+    angle: float
+    structure: List[StructureItem]
+    sections_details: List[SectionPlan]
+
+class RepartitionResult(BaseModel):
+    nombre_barreaux: int
+    vide_entre_barreaux_mm: float
+    jeu_depart_mm: float
+
+class FinalPlanData(BaseModel):
+    titre_plan: str
+    nom_client: str
+    date_chantier: str
+    description_projet: str
+    nomenclature: List[NomenclatureItem]
+    morceaux: List[MorceauPlan]
+    hauteur_totale: int
+    hauteur_lisse_basse: int
+    poteau_dims: str
+    liaison_dims: str
+    lissehaute_dims: str
+    lissebasse_dims: str
+    barreau_dims: str
+    platine_details: Optional[PlatineDetails] = None
+    remplissage_type: str
+    remplissage_details: Optional[RepartitionResult] = None
+
+
+def calculate_repartition(longueur_libre: float, epaisseur_barreau: float, ecart_maximal: float) -> RepartitionResult:
+    if longueur_libre <= 0 or epaisseur_barreau <= 0 or ecart_maximal <= 0:
+        return RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
+    nombre_blocs = longueur_libre / (epaisseur_barreau + ecart_maximal)
+    nombre_barreaux = math.ceil(nombre_blocs - 1)
+    if nombre_barreaux < 0:
+        nombre_barreaux = 0
+    nombre_espaces = nombre_barreaux + 1
+    if nombre_espaces == 0:
+        return RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
+    longueur_totale_barreaux = nombre_barreaux * epaisseur_barreau
+    espacement_reel = (longueur_libre - longueur_totale_barreaux) / nombre_espaces
+    if espacement_reel > (ecart_maximal + 1e-9):
+        nombre_barreaux += 1
+        nombre_espaces = nombre_barreaux + 1
+        longueur_totale_barreaux = nombre_barreaux * epaisseur_barreau
+        espacement_reel = (longueur_libre - longueur_totale_barreaux) / nombre_espaces
+    if nombre_barreaux <= 0:
+        return RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
+    return RepartitionResult(nombre_barreaux=nombre_barreaux, vide_entre_barreaux_mm=espacement_reel, jeu_depart_mm=espacement_reel)
+
+def parse_platine_data(platine_string: str) -> Optional[PlatineDetails]:
+    if not platine_string:
+        return None
+    try:
+        parts = {p.split(':')[0].strip().lower(): p.split(':')[1].strip() for p in platine_string.split('/') if ':' in p}
+        dims_part = next((p.strip() for p in platine_string.split('/') if ':' not in p), "")
+        dims = [float(d) for d in re.findall(r'(\d+\.?\d*)', dims_part)]
+        trous = [float(t) for t in re.findall(r'(\d+\.?\d*)', parts.get('trous', ''))]
+        entraxes = [float(e) for e in re.findall(r'(\d+\.?\d*)', parts.get('entraxes', ''))]
+        return PlatineDetails(longueur=dims[0], largeur=dims[1], epaisseur=dims[2], nombre_trous=int(trous[0]), diametre_trous=trous[1], entraxe_longueur=entraxes[0], entraxe_largeur=entraxes[1])
+    except (IndexError, ValueError, KeyError):
+        return None
+
+def calculer_plan(data: ProjectData) -> FinalPlanData:
+    """Calcule le plan de fabrication complet (répartition, nomenclature, platine) d'un projet."""
+    return FinalPlanData.model_validate(calculer_plan_dict(data))
+
+def article(item: str, details: str, quantite: int, longueur_unitaire_mm: int) -> Dict[str, Any]:
+    """Ligne de nomenclature au format de `NomenclatureItem.model_dump()`."""
+    return {"item": item, "details": details, "quantite": quantite, "longueur_unitaire_mm": longueur_unitaire_mm}
+
+def calculer_plan_dict(data: ProjectData) -> Dict[str, Any]:
+    """
+    Calcule le plan au format de `FinalPlanData.model_dump()`, sans créer de modèle par élément :
+    la structure et les sections sont traitées en colonnes (voir colonnes.py).
+    """
+    # Chaque désignation de profilé n'est analysée qu'une fois pour tout le calcul
+    profils = profils_du_plan(data)
+    deductions = np.zeros(TYPE_AUTRE + 1)
+    deductions[TYPE_POTEAU], deductions[TYPE_LIAISON] = profils['poteau'].deduction, profils['liaison'].deduction
+
+    if data.remplissage_type == 'barreaudage_vertical':
+        barreau_epaisseur_repartition = profils['barreau'].deduction
+    elif data.remplissage_type == 'barreaudage_horizontal':
+        barreau_epaisseur_repartition = profils['barreau'].epaisseur
+    else:
+        barreau_epaisseur_repartition = 0
+
+    # Longueur libre de chaque section, après déduction des jonctions, pour tous les morceaux à la fois
+    structure = StructureColonnes.depuis_morceaux(data.morceaux)
+    morceaux_retenus, _, longueurs, libres, debuts_sections = longueurs_libres(structure, deductions)
+
+    # Répartition des barreaux de toutes les sections en un seul calcul vectorisé
+    if data.remplissage_type == 'barreaudage_vertical':
+        nombres, vides, jeux = calculate_repartition_batch(libres, barreau_epaisseur_repartition, data.ecart_barreaux)
+    else:
+        nombres, vides, jeux = np.zeros(len(libres), dtype=np.int64), np.zeros(len(libres)), libres
+    sections = SectionsColonnes(longueurs, libres, nombres, vides, jeux, debuts_sections)
+
+    final_morceaux = []
+    for k, i in enumerate(morceaux_retenus.tolist()):
+        morceau = structure.morceau(i)
+        if np.isnan(morceau.angle):
+            raise ValueError(f"Angle manquant pour le morceau {i + 1}.")
+        longueur_totale = sum(l for l in morceau.longueurs[morceau.types == TYPE_SECTION].tolist() if not math.isnan(l))
+        final_morceaux.append({"id": i, "longueur_totale": float(longueur_totale), "angle": morceau.angle, "structure": morceau.structure_dict(), "sections_details": sections.details(k)})
+
+    nomenclature = []
+    total_poteaux = int(np.count_nonzero(structure.types == TYPE_POTEAU))
+    total_liaisons = int(np.count_nonzero(structure.types == TYPE_LIAISON))
+    if total_poteaux > 0: nomenclature.append(article("Poteaux", data.poteau_dims, total_poteaux, data.hauteur_totale))
+    if total_liaisons > 0: nomenclature.append(article("Liaisons", data.liaison_dims, total_liaisons, data.hauteur_totale))
+    longueurs_libres_liste = libres.tolist()
+    total_longueur_lisses = sum(longueurs_libres_liste)
+    if total_longueur_lisses > 0 and len(final_morceaux) > 0:
+        nomenclature.append(article("Lisse Haute", data.lissehaute_dims, len(final_morceaux), round(total_longueur_lisses/len(final_morceaux))))
+        nomenclature.append(article("Lisse Basse", data.lissebasse_dims, len(final_morceaux), round(total_longueur_lisses/len(final_morceaux))))
+
+    remplissage_details = None
+    if data.remplissage_type == 'barreaudage_vertical':
+        total_barreaux = int(nombres.sum())
+        if total_barreaux > 0:
+            epaisseur_lisse_haute = profils['lissehaute'].epaisseur
+            epaisseur_lisse_basse = profils['lissebasse'].epaisseur
+            longueur_unitaire_barreau = data.hauteur_totale - data.hauteur_lisse_basse - epaisseur_lisse_haute - epaisseur_lisse_basse
+            nomenclature.append(article("Barreaux", data.barreau_dims, total_barreaux, round(longueur_unitaire_barreau)))
+
+    elif data.remplissage_type == 'barreaudage_horizontal':
+        hauteur_disponible = data.hauteur_totale - data.hauteur_lisse_basse - profils['lissehaute'].epaisseur - profils['lissebasse'].epaisseur
+        remplissage_details = calculate_repartition(hauteur_disponible, barreau_epaisseur_repartition, data.ecart_barreaux)
+
+        if remplissage_details and remplissage_details.nombre_barreaux > 0:
+            barreaux_par_longueur = {}
+            for longueur_libre in longueurs_libres_liste:
+                longueur = round(longueur_libre)
+                if longueur > 0:
+                    barreaux_par_longueur[longueur] = barreaux_par_longueur.get(longueur, 0) + 1
+
+            for longueur, nb_sections in barreaux_par_longueur.items():
+                nomenclature.append(article(f"Barreaux L={longueur}mm", data.barreau_dims, remplissage_details.nombre_barreaux * nb_sections, longueur))
+
+    platine_details = None
+    if data.type_fixation == 'platine' and data.platine_dimensions and data.platine_trous and data.platine_entraxes:
+        full_platine_string = f"{data.platine_dimensions} / Trous:{data.platine_trous} / Entraxes:{data.platine_entraxes}"
+        platine_details = parse_platine_data(full_platine_string)
+
+    return {
+        "titre_plan": data.titre_plan, "nom_client": data.nom_client, "date_chantier": data.date_chantier,
+        "description_projet": f"Garde-corps détaillé en {data.nombre_morceaux} morceau(x).",
+        "nomenclature": nomenclature, "morceaux": final_morceaux,
+        "hauteur_totale": data.hauteur_totale, "hauteur_lisse_basse": data.hauteur_lisse_basse,
+        "poteau_dims": data.poteau_dims, "liaison_dims": data.liaison_dims, "lissehaute_dims": data.lissehaute_dims,
+        "lissebasse_dims": data.lissebasse_dims, "barreau_dims": data.barreau_dims,
+        "platine_details": platine_details.model_dump() if platine_details else None,
+        "remplissage_type": data.remplissage_type,
+        "remplissage_details": remplissage_details.model_dump() if remplissage_details else None,
+    }
+
+def calculer_plan_et_mesurer(data: ProjectData) -> Dict[str, Any]:
+    """`calculer_plan_dict(data)`, en notant la durée du calcul et la taille du plan dans les métriques."""
+    with etape("calcul_plan"):
+        plan = calculer_plan_dict(data)
+    ELEMENTS_PLAN.observe(len(plan['morceaux']), type="morceaux")
+    ELEMENTS_PLAN.observe(sum(len(m['sections_details']) for m in plan['morceaux']), type="sections")
+    return plan
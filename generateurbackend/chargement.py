@@ -0,0 +1,48 @@
+# chargement.py
+# Imports différés des dépendances lourdes (SDK Gemini, PIL, fpdf, ezdxf) : le serveur démarre sans
+# elles, puis les importe à la première requête qui en a besoin, ou en arrière-plan juste après le
+# démarrage (préchauffage), pour que la première requête de rendu ne paie pas leur import.
+
+import functools
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Dict, Iterable, Optional
+
+
+@functools.lru_cache(maxsize=None)
+def module_optionnel(nom: str) -> Optional[ModuleType]:
+    """Module importé au premier appel, ou None s'il n'est pas installé."""
+    try:
+        return importlib.import_module(nom)
+    except ImportError:
+        return None
+
+
+def prechauffer(noms: Iterable[str], preparations: Iterable[Callable[[], object]] = ()) -> Dict[str, float]:
+    """
+    Importe les modules `noms` (absents tolérés), puis exécute les `preparations` (caches à remplir).
+    Retourne la durée de chaque import (s).
+    """
+    durees = {}
+    for nom in noms:
+        debut = time.perf_counter()
+        module_optionnel(nom)
+        durees[nom] = time.perf_counter() - debut
+    for preparation in preparations:
+        try:
+            preparation()
+        except Exception as e:
+            print(f"ERREUR lors du préchauffage ({getattr(preparation, '__name__', preparation)}): {e}")
+    return durees
+
+def demarrer_prechauffage(noms: Iterable[str], preparations: Iterable[Callable[[], object]] = ()) -> threading.Thread:
+    """
+    Lance `prechauffer` dans un thread d'arrière-plan (le serveur répond pendant ce temps).
+    Les processus de rendu doivent être démarrés avant : un processus créé pendant qu'un import est en
+    cours dans ce thread ne doit pas en hériter les verrous (voir rendu.contexte_processus).
+    """
+    fil = threading.Thread(target=prechauffer, args=(tuple(noms), tuple(preparations)), name="prechauffage", daemon=True)
+    fil.start()
+    return fil
@@ -0,0 +1,244 @@
+# client_ia.py
+# Client des analyses IA (texte de description, image de schéma) utilisé par /api/parse-text et
+# /api/analyze-schema : appels asynchrones, nombre d'appels simultanés borné, délai maximal par appel
+# et nouvelles tentatives avec attente exponentielle. Le service appelé est un « backend » interchangeable :
+# - "gemini" : API Gemini (SDK google.generativeai, importé au premier appel) ;
+# - "local" : réponses locales, sans réseau, pour les tests et les tests de charge.
+
+import asyncio
+import base64
+import binascii
+import io
+import json
+import os
+import random
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .chargement import module_optionnel
+
+MODULE_GENAI = "google.generativeai"
+MODULE_IMAGE = "PIL.Image"
+
+CONSIGNE_TEXTE = (
+    "Tu extrais les caractéristiques d'un garde-corps à partir de la description d'un projet. "
+    "Réponds uniquement par un objet JSON conforme à ce schéma, en omettant les champs inconnus :\n{schema}\n\n"
+    "Description :\n{description}"
+)
+CONSIGNE_IMAGE = (
+    "Tu extrais les caractéristiques d'un garde-corps à partir de ce schéma (croquis coté). "
+    "Réponds uniquement par un objet JSON conforme à ce schéma, en omettant les champs inconnus :\n{schema}"
+)
+
+
+class ServiceIAError(Exception):
+    """Échec d'une analyse IA ; `status_code` est le code HTTP à renvoyer au client."""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+class ErreurTemporaireIA(Exception):
+    """Erreur passagère du service (quota, surcharge, coupure) : l'appel peut être retenté."""
+
+
+def decoder_image(image_data: str) -> bytes:
+    """Octets d'une image envoyée en base64, avec ou sans préfixe `data:image/...;base64,`."""
+    if image_data.startswith("data:"):
+        image_data = image_data.partition(",")[2]
+    try:
+        return base64.b64decode(image_data, validate=True)
+    except (binascii.Error, ValueError):
+        raise ServiceIAError("Image invalide : contenu base64 attendu.", status_code=422)
+
+def lire_json(texte: str) -> Dict[str, Any]:
+    """Objet JSON d'une réponse du modèle (éventuellement entouré d'un bloc ```json)."""
+    texte = texte.strip()
+    if texte.startswith("```"):
+        texte = texte.strip("`").removeprefix("json").strip()
+    try:
+        resultat = json.loads(texte)
+    except json.JSONDecodeError:
+        raise ServiceIAError("Réponse du service d'analyse IA illisible (JSON attendu).")
+    if not isinstance(resultat, dict):
+        raise ServiceIAError("Réponse du service d'analyse IA inattendue (objet JSON attendu).")
+    return resultat
+
+
+# --- BACKENDS ---
+
+class BackendIA:
+    """Service d'analyse : chaque méthode retourne les champs extraits (dictionnaire au format du schéma)."""
+
+    nom = "abstrait"
+
+    @property
+    def identite(self) -> str:
+        """Backend (et modèle) qui produit les analyses : deux identités différentes peuvent répondre différemment."""
+        return self.nom
+
+    async def analyser_texte(self, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def analyser_image(self, image: bytes, schema: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def fermer(self):
+        pass
+
+
+class BackendLocal(BackendIA):
+    """
+    Backend sans réseau : retourne `reponse` (formulaire vide par défaut) après `latence` secondes,
+    pour simuler le service dans les tests et les tests de charge.
+    """
+
+    nom = "local"
+
+    def __init__(self, reponse: Optional[Dict[str, Any]] = None, latence: float = 0.0):
+        self.reponse = reponse or {}
+        self.latence = latence
+        self.appels = 0
+
+    async def _repondre(self) -> Dict[str, Any]:
+        self.appels += 1
+        if self.latence > 0:
+            await asyncio.sleep(self.latence)
+        return dict(self.reponse)
+
+    async def analyser_texte(self, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._repondre()
+
+    async def analyser_image(self, image: bytes, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._repondre()
+
+
+class BackendGemini(BackendIA):
+    """
+    API Gemini. Le SDK est importé et configuré au premier appel, hors de la boucle d'événements, et le
+    modèle est partagé par toutes les requêtes, qui réutilisent ainsi le même canal (connexions) vers le service.
+    """
+
+    nom = "gemini"
+
+    def __init__(self, cle_api: Optional[str], modele: str):
+        self.cle_api = cle_api
+        self.nom_modele = modele
+        self._modele = None
+        self._erreurs_temporaires: tuple = ()
+        self._verrou = threading.Lock()
+
+    @property
+    def identite(self) -> str:
+        return f"{self.nom}:{self.nom_modele}"
+
+    def _get_modele(self):
+        with self._verrou:
+            return self._modele or self._creer_modele()
+
+    def _creer_modele(self):
+        genai = module_optionnel(MODULE_GENAI)
+        if not genai:
+            raise ServiceIAError("Le service d'analyse IA n'est pas disponible (module non installé).", status_code=503)
+        if not self.cle_api:
+            raise ServiceIAError("La clé d'API MA_CLE_GEMINI n'est pas configurée sur le serveur.", status_code=503)
+        try:
+            genai.configure(api_key=self.cle_api)
+        except Exception as e:
+            raise ServiceIAError(f"Erreur lors de la configuration de l'API Gemini: {e}", status_code=500)
+        from google.api_core import exceptions
+        self._erreurs_temporaires = (exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.ServiceUnavailable,
+                                     exceptions.DeadlineExceeded, exceptions.InternalServerError)
+        self._modele = genai.GenerativeModel(self.nom_modele, generation_config={"response_mime_type": "application/json"})
+        print("API Gemini configurée avec succès.")
+        return self._modele
+
+    async def _generer(self, contenu: Any) -> Dict[str, Any]:
+        # Import du SDK (plusieurs secondes au premier appel) dans le pool de threads
+        modele = self._modele or await asyncio.to_thread(self._get_modele)
+        try:
+            reponse = await modele.generate_content_async(contenu)
+        except self._erreurs_temporaires as e:
+            raise ErreurTemporaireIA(str(e)) from e
+        except Exception as e:
+            raise ServiceIAError(f"Erreur du service d'analyse IA: {e}")
+        return lire_json(reponse.text)
+
+    async def analyser_texte(self, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._generer(CONSIGNE_TEXTE.format(schema=json.dumps(schema, ensure_ascii=False), description=description))
+
+    async def analyser_image(self, image: bytes, schema: Dict[str, Any]) -> Dict[str, Any]:
+        Image = await asyncio.to_thread(module_optionnel, MODULE_IMAGE)
+        if not Image:
+            raise ServiceIAError("Le service d'analyse d'image n'est pas disponible (modules manquants).", status_code=503)
+        try:
+            # Décodage de l'image hors de la boucle d'événements
+            schema_image = await asyncio.to_thread(lambda: Image.open(io.BytesIO(image)).copy())
+        except Exception:
+            raise ServiceIAError("Image invalide : format non reconnu.", status_code=422)
+        return await self._generer([CONSIGNE_IMAGE.format(schema=json.dumps(schema, ensure_ascii=False)), schema_image])
+
+
+BACKENDS = {"gemini": BackendGemini, "local": BackendLocal}
+
+
+# --- CLIENT ---
+
+class ClientIA:
+    """
+    Appels au backend d'analyse : au plus `concurrence` appels simultanés (les suivants attendent leur tour ;
+    un appel qui attend avant une nouvelle tentative ne compte pas),
+    `delai` secondes par tentative, et jusqu'à `tentatives` essais en cas d'erreur temporaire ou de délai
+    dépassé, séparés d'une attente de `attente` secondes doublée à chaque échec (plus un aléa).
+    """
+
+    def __init__(self, backend: BackendIA, concurrence: int = 4, delai: float = 30.0, tentatives: int = 3, attente: float = 0.5):
+        self.backend = backend
+        self.concurrence = max(1, concurrence)
+        self.delai = delai
+        self.tentatives = max(1, tentatives)
+        self.attente = attente
+        self._semaphore = asyncio.Semaphore(self.concurrence)
+
+    async def _appeler(self, fn: Callable[..., Awaitable[Dict[str, Any]]], *args: Any) -> Dict[str, Any]:
+        for tentative in range(1, self.tentatives + 1):
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(fn(*args), self.delai)
+            except (ErreurTemporaireIA, asyncio.TimeoutError) as e:
+                if tentative == self.tentatives:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise ServiceIAError(f"Le service d'analyse IA n'a pas répondu en {self.delai:g} s.", status_code=504)
+                    raise ServiceIAError(f"Le service d'analyse IA est indisponible: {e}", status_code=503)
+            # Attente hors du sémaphore : la place sert à un autre appel en attendant la tentative suivante
+            await asyncio.sleep(self.attente * 2 ** (tentative - 1) * (1 + random.random() / 2))
+
+    async def analyser_texte(self, description: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._appeler(self.backend.analyser_texte, description, schema)
+
+    async def analyser_image(self, image_data: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._appeler(self.backend.analyser_image, decoder_image(image_data), schema)
+
+    async def fermer(self):
+        await self.backend.fermer()
+
+
+def creer_client_ia_depuis_env() -> ClientIA:
+    """
+    Construit le client à partir des variables IA_BACKEND (gemini, local), MA_CLE_GEMINI, IA_MODELE,
+    IA_CONCURRENCE, IA_DELAI, IA_TENTATIVES, IA_ATTENTE et IA_LOCAL_LATENCE (backend local).
+    """
+    nom = os.getenv("IA_BACKEND", "gemini")
+    if nom not in BACKENDS:
+        raise ValueError(f"Backend IA inconnu: {nom}. Backends possibles: {', '.join(BACKENDS)}.")
+    if nom == "local":
+        backend: BackendIA = BackendLocal(latence=float(os.getenv("IA_LOCAL_LATENCE", "0")))
+    else:
+        backend = BackendGemini(os.getenv("MA_CLE_GEMINI"), os.getenv("IA_MODELE", "gemini-1.5-flash"))
+    return ClientIA(
+        backend,
+        concurrence=int(os.getenv("IA_CONCURRENCE", "4")),
+        delai=float(os.getenv("IA_DELAI", "30")),
+        tentatives=int(os.getenv("IA_TENTATIVES", "3")),
+        attente=float(os.getenv("IA_ATTENTE", "0.5")),
+    )
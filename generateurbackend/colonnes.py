@@ -0,0 +1,194 @@
+# colonnes.py
+# Représentation en colonnes de la structure d'un plan, utilisée par le calcul et la géométrie :
+# une ligne par élément (code de type, longueur), une ligne par section calculée, et la position
+# du premier élément (ou de la première section) de chaque morceau. Les modèles Pydantic ne servent
+# qu'à l'entrée et à la sortie de l'API.
+
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Codes des types d'éléments (colonne int8) ; un type inconnu est conservé tel quel à part
+TYPE_RIEN, TYPE_POTEAU, TYPE_LIAISON, TYPE_SECTION, TYPE_AUTRE = range(5)
+CODES_TYPES = {"rien": TYPE_RIEN, "poteau": TYPE_POTEAU, "liaison": TYPE_LIAISON, "section": TYPE_SECTION}
+NOMS_TYPES = {code: nom for nom, code in CODES_TYPES.items()}
+
+
+def _champ(objet: Any, nom: str, defaut: Any = None) -> Any:
+    """Lit un champ d'un dictionnaire (plan sérialisé) ou d'un modèle Pydantic (entrée de l'API)."""
+    return objet.get(nom, defaut) if isinstance(objet, dict) else getattr(objet, nom, defaut)
+
+
+class StructureColonnes:
+    """
+    Structure de tous les morceaux d'un plan :
+    - types : code de chaque élément (TYPE_*), `types_autres` donne le nom des types inconnus par ligne
+    - longueurs : longueur de chaque élément (NaN si absente)
+    - debuts : ligne du premier élément de chaque morceau, plus le nombre total d'éléments
+    - angles : angle de chaque morceau (degrés)
+    """
+
+    __slots__ = ("types", "longueurs", "debuts", "angles", "types_autres")
+
+    def __init__(self, types: np.ndarray, longueurs: np.ndarray, debuts: np.ndarray, angles: np.ndarray, types_autres: Optional[Dict[int, str]] = None):
+        self.types = types
+        self.longueurs = longueurs
+        self.debuts = debuts
+        self.angles = angles
+        self.types_autres = types_autres or {}
+
+    @classmethod
+    def depuis_morceaux(cls, morceaux: Iterable[Any]) -> "StructureColonnes":
+        """Colonnes des morceaux d'un projet (MorceauData) ou d'un plan (dictionnaires `model_dump()`)."""
+        noms: List[str] = []
+        longueurs: List[Optional[float]] = []
+        debuts, angles = [0], []
+        for morceau in morceaux:
+            if isinstance(morceau, dict):
+                noms += [item.get('type') for item in morceau['structure']]
+                longueurs += [item.get('longueur') for item in morceau['structure']]
+            else:
+                noms += [item.type for item in morceau.structure]
+                longueurs += [item.longueur for item in morceau.structure]
+            debuts.append(len(noms))
+            angles.append(_champ(morceau, 'angle', 0))
+        codes = [CODES_TYPES.get(nom, TYPE_AUTRE) for nom in noms]
+        types_autres = {ligne: noms[ligne] for ligne, code in enumerate(codes) if code == TYPE_AUTRE} if TYPE_AUTRE in codes else {}
+        # None (longueur ou angle absent) devient NaN
+        return cls(np.array(codes, dtype=np.int8), np.array(longueurs, dtype=np.float64),
+                   np.array(debuts, dtype=np.int64), np.array(angles, dtype=np.float64), types_autres)
+
+    @property
+    def nb_morceaux(self) -> int:
+        return len(self.angles)
+
+    def nom_type(self, ligne: int) -> str:
+        code = int(self.types[ligne])
+        return self.types_autres[ligne] if code == TYPE_AUTRE else NOMS_TYPES[code]
+
+    def noms_types(self, lignes: np.ndarray) -> List[str]:
+        """Nom du type des lignes données."""
+        if not self.types_autres:
+            return [NOMS_TYPES[code] for code in self.types[lignes].tolist()]
+        return [self.nom_type(ligne) for ligne in lignes.tolist()]
+
+    def morceau(self, index: int) -> "VueMorceau":
+        return VueMorceau(self, index)
+
+    def __iter__(self):
+        return (VueMorceau(self, index) for index in range(self.nb_morceaux))
+
+
+class VueMorceau:
+    """Vue sur les éléments d'un morceau (tranches des colonnes, sans copie)."""
+
+    __slots__ = ("structure", "index", "debut", "fin")
+
+    def __init__(self, structure: StructureColonnes, index: int):
+        self.structure = structure
+        self.index = index
+        self.debut = int(structure.debuts[index])
+        self.fin = int(structure.debuts[index + 1])
+
+    @property
+    def types(self) -> np.ndarray:
+        return self.structure.types[self.debut:self.fin]
+
+    @property
+    def longueurs(self) -> np.ndarray:
+        return self.structure.longueurs[self.debut:self.fin]
+
+    @property
+    def angle(self) -> float:
+        return float(self.structure.angles[self.index])
+
+    def noms_types(self, lignes: Optional[np.ndarray] = None) -> List[str]:
+        """Nom du type des éléments (de tous, ou des lignes données, relatives au morceau)."""
+        lignes = np.arange(self.fin - self.debut) if lignes is None else lignes
+        return self.structure.noms_types(lignes + self.debut)
+
+    def cle(self) -> tuple:
+        """Clé d'identité : deux morceaux de même clé ont exactement le même dessin."""
+        types_autres = self.structure.types_autres
+        autres = tuple(types_autres[ligne] for ligne in range(self.debut, self.fin) if ligne in types_autres) if types_autres else ()
+        return (self.angle, self.types.tobytes(), self.longueurs.tobytes(), autres)
+
+    def structure_dict(self) -> List[Dict[str, Any]]:
+        """Éléments du morceau au format de `StructureItem.model_dump()`."""
+        return [{"type": nom, "longueur": None if math.isnan(longueur) else longueur}
+                for nom, longueur in zip(self.noms_types(), self.longueurs.tolist())]
+
+
+class SectionsColonnes:
+    """
+    Sections calculées de tous les morceaux du plan (une ligne par section) ;
+    `debuts` donne la première section de chaque morceau, plus le nombre total de sections.
+    """
+
+    __slots__ = ("longueur_section", "longueur_libre", "nombre_barreaux", "vide_entre_barreaux_mm", "jeu_depart_mm", "debuts")
+
+    def __init__(self, longueur_section: np.ndarray, longueur_libre: np.ndarray, nombre_barreaux: np.ndarray, vide_entre_barreaux_mm: np.ndarray, jeu_depart_mm: np.ndarray, debuts: np.ndarray):
+        self.longueur_section = longueur_section
+        self.longueur_libre = longueur_libre
+        self.nombre_barreaux = nombre_barreaux
+        self.vide_entre_barreaux_mm = vide_entre_barreaux_mm
+        self.jeu_depart_mm = jeu_depart_mm
+        self.debuts = debuts
+
+    @classmethod
+    def depuis_morceaux(cls, morceaux: Iterable[Dict[str, Any]]) -> "SectionsColonnes":
+        """Colonnes des sections d'un plan sérialisé (`FinalPlanData.model_dump()`)."""
+        lignes, debuts = [], [0]
+        for morceau in morceaux:
+            for s in morceau['sections_details']:
+                lignes.append((s['longueur_section'], s['longueur_libre'], s['nombre_barreaux'], s['vide_entre_barreaux_mm'], s['jeu_depart_mm']))
+            debuts.append(len(lignes))
+        tableau = np.array(lignes, dtype=np.float64).reshape(-1, 5)
+        return cls(tableau[:, 0], tableau[:, 1], tableau[:, 2].astype(np.int64), tableau[:, 3], tableau[:, 4], np.array(debuts, dtype=np.int64))
+
+    def details(self, index: int) -> List[Dict[str, Any]]:
+        """Sections du morceau `index` au format de `SectionPlan.model_dump()`."""
+        debut, fin = int(self.debuts[index]), int(self.debuts[index + 1])
+        colonnes = (self.longueur_section, self.longueur_libre, self.nombre_barreaux, self.vide_entre_barreaux_mm, self.jeu_depart_mm)
+        return [
+            {"longueur_section": a, "longueur_libre": b, "nombre_barreaux": n, "vide_entre_barreaux_mm": v, "jeu_depart_mm": j}
+            for a, b, n, v, j in zip(*(colonne[debut:fin].tolist() for colonne in colonnes))
+        ]
+
+
+def longueurs_libres(structure: StructureColonnes, deductions: np.ndarray) -> tuple:
+    """
+    Longueur libre de chaque section, après déduction de la moitié de chaque jonction voisine
+    (ou de toute l'épaisseur pour un élément d'extrémité). Les éléments « rien » sont ignorés et
+    les morceaux de moins de deux éléments ne sont pas retenus.
+    `deductions[code]` : épaisseur déduite pour un élément de ce type.
+    Retourne (morceaux retenus, lignes des sections dans la structure, longueurs, longueurs libres, débuts des sections par morceau retenu).
+    """
+    garde = np.flatnonzero(structure.types != TYPE_RIEN)
+    types = structure.types[garde]
+    # Morceau de chaque élément retenu, position dans son morceau et nombre d'éléments du morceau
+    morceau_de = np.searchsorted(structure.debuts, garde, side='right') - 1
+    nb_par_morceau = np.bincount(morceau_de, minlength=structure.nb_morceaux)
+    debut_morceau = np.concatenate(([0], np.cumsum(nb_par_morceau)[:-1]))
+    position = np.arange(len(garde)) - debut_morceau[morceau_de]
+    taille = nb_par_morceau[morceau_de]
+
+    est_section = (types == TYPE_SECTION) & (taille >= 2)
+    k = np.flatnonzero(est_section)
+    idx, n = position[k], taille[k]
+    a_gauche, a_droite = idx > 0, idx < n - 1
+    code_gauche = types[np.where(a_gauche, k - 1, k)]
+    code_droite = types[np.where(a_droite, k + 1, k)]
+    deduction_gauche = np.where(a_gauche, deductions[code_gauche] / np.where(idx - 1 == 0, 1, 2), 0)
+    deduction_droite = np.where(a_droite, deductions[code_droite] / np.where(idx + 1 == n - 1, 1, 2), 0)
+
+    lignes = garde[k]
+    longueurs = structure.longueurs[lignes]
+    if np.isnan(longueurs).any():
+        raise ValueError("Longueur manquante pour une section.")
+    libres = longueurs - deduction_gauche - deduction_droite
+
+    morceaux_retenus = np.flatnonzero(nb_par_morceau >= 2)
+    debuts_sections = np.searchsorted(morceau_de[k], morceaux_retenus, side='left')
+    return morceaux_retenus, lignes, longueurs, libres, np.append(debuts_sections, len(k))
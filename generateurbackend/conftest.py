@@ -0,0 +1,32 @@
+# conftest.py
+import pytest
+from starlette.requests import Request
+
+
+@pytest.fixture
+def projet_exemple():
+    """Projet de deux morceaux (un droit, un rampant) en barreaudage vertical, avec platine."""
+    morceau = {
+        "nombre_sections": 2,
+        "angle": 0.0,
+        "structure": [
+            {"type": "poteau"}, {"type": "section", "longueur": 1000},
+            {"type": "liaison"}, {"type": "section", "longueur": 1200},
+            {"type": "poteau"},
+        ],
+    }
+    return {
+        "titre_plan": "Plan Test", "nom_client": "Client Test", "date_chantier": "2025-01-15",
+        "hauteur_totale": 1020, "hauteur_lisse_basse": 100,
+        "poteau_dims": "40x40", "liaison_dims": "40x20", "lissehaute_dims": "40x40",
+        "lissebasse_dims": "40x40", "barreau_dims": "20x20", "ecart_barreaux": 110,
+        "type_fixation": "platine", "remplissage_type": "barreaudage_vertical",
+        "platine_dimensions": "150x150x8", "platine_trous": "4 x Ø12", "platine_entraxes": "110x110",
+        "nombre_morceaux": 2, "morceaux_identiques": "non",
+        "morceaux": [morceau, dict(morceau, angle=30.0)],
+    }
+
+@pytest.fixture
+def requete():
+    """Requête HTTP sans en-tête particulier, pour appeler directement les routes de l'API."""
+    return Request({"type": "http", "headers": [], "query_string": b""})
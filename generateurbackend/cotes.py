@@ -0,0 +1,11 @@
+# cotes.py
+# Profils de sortie des cotes DXF, à part du dessin pour que l'API puisse valider le paramètre `cotes`
+# sans importer ezdxf :
+# - "rendues" : ezdxf précalcule la géométrie de chaque cote (bloc anonyme), affichage identique partout ;
+# - "natives" : les cotes de même forme (longueur, texte, style) partagent le bloc de géométrie de la
+#   première, décalé par leur point d'insertion ; le logiciel de CAO peut les régénérer à l'édition
+#   (moins de blocs, fichier plus léger quand les sections se répètent).
+
+COTES_RENDUES = "rendues"
+COTES_NATIVES = "natives"
+PROFILS_COTES = (COTES_RENDUES, COTES_NATIVES)
@@ -1,16 +1,46 @@
 # dessin_dxf.py
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import io
 import ezdxf
 from ezdxf.document import Drawing
-from ezdxf.math import Vec2, BoundingBox
+from ezdxf.math import Vec2, Vec3, BoundingBox
 from ezdxf.enums import TextEntityAlignment
-from ezdxf import bbox
 from datetime import datetime
 import math
-
-# Importations des fonctions utilitaires pour obtenir les dimensions des profilés
-from .utils import get_deduction_dimension, get_thickness_dimension
+import weakref
+
+# Géométrie précalculée, partagée avec le rendu PDF
+from .colonnes import NOMS_TYPES, TYPE_LIAISON, TYPE_POTEAU, TYPE_SECTION
+from .cotes import COTES_NATIVES, COTES_RENDUES, PROFILS_COTES
+from .geometrie import GeometrieMorceau, GeometriePlan, calculer_geometrie, calculer_geometrie_morceau
+from .mise_en_page import ECHELLE_MIN_MORCEAU, ECHELLE_MIN_VUE_ENSEMBLE, Fenetre, decouper_chemin, ranger_par_etageres, segments_chemin
+from .metriques import ELEMENTS_PLAN, etape
+from .profils import profils_du_plan
+
+# Version du moteur de rendu : à incrémenter à chaque changement du dessin produit
+# (elle fait partie de la clé du cache de rendu).
+VERSION_RENDU = "7"
+
+# Préfixe des blocs contenant la vue détaillée d'un morceau distinct
+PREFIXE_BLOC_MORCEAU = "MORCEAU_"
+# Style des cotes (masque de fond sous le texte)
+STYLE_COTES = "METALLERIE_MASQUE"
+
+# Emprise du dessin ($EXTMIN/$EXTMAX), tenue à jour au fil du placement des éléments :
+# - largeur moyenne d'un caractère rapportée à la hauteur du texte (police par défaut) ;
+# - débord des cotes et annotations autour de la géométrie d'un morceau.
+RATIO_LARGEUR_TEXTE = 0.7
+MARGE_COTES_MORCEAU = 450
+
+# Longueur maximale (mm) d'une rangée de morceaux dans l'espace objet avant de passer à la suivante
+LONGUEUR_RANGEE_MAX = 60000
+
+# Feuilles de l'espace papier (présentations) : format A3 paysage, dimensions en mm papier
+FORMAT_FEUILLE = (420, 297)
+MARGE_FEUILLE = 10
+ESPACEMENT_VUES = 10
+ZONE_UTILE_FEUILLE = (FORMAT_FEUILLE[0] - 2 * MARGE_FEUILLE, FORMAT_FEUILLE[1] - 2 * MARGE_FEUILLE)
 
 # Dictionnaire des couleurs ACI (AutoCAD Color Index) pour les calques
 LAYER_COLORS = {
@@ -30,6 +60,15 @@ LAYER_COLORS = {
 
 # --- FONCTIONS UTILITAIRES DE DESSIN ---
 
+def etendre_emprise(emprise: Optional[BoundingBox], coin_min, coin_max):
+    """Agrandit l'emprise du dessin pour y inclure le rectangle [coin_min, coin_max]."""
+    if emprise is not None:
+        emprise.extend([coin_min, coin_max])
+
+def etendre_emprise_texte(emprise: Optional[BoundingBox], text: str, position: Vec2, height: float):
+    """Emprise approchée d'un texte aligné en haut à gauche."""
+    etendre_emprise(emprise, position - (0, height), position + (len(text) * height * RATIO_LARGEUR_TEXTE, 0))
+
 def add_annotation(msp, text: str, position: Vec2, height=25, layer="TEXTE", align: TextEntityAlignment = TextEntityAlignment.TOP_LEFT):
     """Ajoute une annotation texte au plan avec un alignement spécifié."""
     msp.add_text(
@@ -37,16 +76,49 @@ def add_annotation(msp, text: str, position: Vec2, height=25, layer="TEXTE", ali
         dxfattribs={"layer": layer, "height": height}
     ).set_placement(position, align=align)
 
-def add_aligned_dim_with_mask(msp, p1: Vec2, p2: Vec2, distance: float, text: str, dim_style: str, layer="COTES"):
+# Blocs de géométrie déjà dessinés en profil natif, par document : forme de la cote -> (nom du bloc, point d'origine)
+_geometries_cotes: "weakref.WeakKeyDictionary[Drawing, Dict[tuple, Tuple[str, Vec3]]]" = weakref.WeakKeyDictionary()
+
+def forme_cote(dim) -> tuple:
+    """Ce qui détermine le dessin d'une cote à une translation près (points relatifs au premier point mesuré)."""
+    dxf = dim.dimension.dxf
+    origine = dxf.defpoint2
+    relatifs = tuple(round(c, 4) for point in (dxf.defpoint3, dxf.defpoint) for c in point - origine)
+    return (dxf.owner, dxf.dimtype, relatifs, round(dxf.get("angle", 0.0), 9), dxf.text, dxf.dimstyle, dxf.layer, tuple(sorted(dim.dimstyle_attribs.items())))
+
+def finaliser_cote(dim, cotes: str = COTES_RENDUES):
+    """
+    Précalcule la géométrie de la cote (bloc anonyme *D). En profil natif, les cotes de même forme
+    partagent le bloc de la première, décalé par le point d'insertion de la cote (code 12).
+    """
+    if cotes != COTES_NATIVES:
+        dim.render()
+        return
+    dxf = dim.dimension.dxf
+    geometries = _geometries_cotes.setdefault(dim.doc, {})
+    forme = forme_cote(dim)
+    if forme not in geometries:
+        dim.render()
+        geometries[forme] = (dxf.geometry, dxf.defpoint2)
+        return
+    nom_bloc, origine = geometries[forme]
+    # Mesure et position du texte calculées sans redessiner la géométrie
+    dim.get_renderer().finalize()
+    dxf.geometry = nom_bloc
+    dxf.insert = dxf.defpoint2 - origine
+    dim.commit()
+
+def add_aligned_dim_with_mask(msp, p1: Vec2, p2: Vec2, distance: float, text: str, dim_style: str, layer="COTES", cotes: str = COTES_RENDUES):
     """Ajoute une cote alignée avec un masque d'arrière-plan."""
     dim = msp.add_aligned_dim(p1=p1, p2=p2, distance=distance, text=text, dimstyle=dim_style, dxfattribs={"layer": layer})
-    dim.render()
+    finaliser_cote(dim, cotes)
 
 # --- FONCTIONS DE DESSIN PRINCIPALES ---
 
-def draw_legend(msp, data: Dict[str, Any], origin: Vec2, text_height=60):
+def draw_legend(msp, data: Dict[str, Any], origin: Vec2, text_height=60, emprise: Optional[BoundingBox] = None):
     """Dessine une légende avec les dimensions des profilés."""
     add_annotation(msp, "LEGENDE", origin, height=text_height*1.2, layer="TEXTE")
+    etendre_emprise_texte(emprise, "LEGENDE", origin, text_height*1.2)
     
     y_offset = -text_height * 2
     
@@ -60,13 +132,16 @@ def draw_legend(msp, data: Dict[str, Any], origin: Vec2, text_height=60):
     
     for label, dim, layer in legend_items:
         add_annotation(msp, f"{label} {dim}", origin + (0, y_offset), height=text_height, layer=layer)
+        etendre_emprise_texte(emprise, f"{label} {dim}", origin + (0, y_offset), text_height)
         y_offset -= text_height * 1.5
 
 
-def draw_cartouche(msp, data: Dict[str, Any], origin: Vec2, width=5000, height=1800, text_height=80):
+def draw_cartouche(msp, data: Dict[str, Any], origin: Vec2, width=5000, height=1800, text_height=80, emprise: Optional[BoundingBox] = None):
     """Dessine un cartouche d'informations pour le plan."""
     layer = "CARTOUCHE"
     msp.add_lwpolyline([origin, origin + (width, 0), origin + (width, height), origin + (0, height)], close=True, dxfattribs={"layer": layer})
+    # Les textes restent à l'intérieur du cadre
+    etendre_emprise(emprise, origin, origin + (width, height))
     
     line_y_1 = origin + (0, height * 2/3)
     msp.add_line(line_y_1, line_y_1 + (width, 0), dxfattribs={"layer": layer})
@@ -89,189 +164,243 @@ def draw_cartouche(msp, data: Dict[str, Any], origin: Vec2, width=5000, height=1
     date_pos = origin + (margin, margin * 1.5)
     add_annotation(msp, f"Date: {formatted_date}", date_pos, height=text_height, layer=layer)
 
-def draw_vue_ensemble_dxf(msp, data: Dict[str, Any], origin: Vec2, dim_style: str):
+def draw_vue_ensemble_dxf(msp, data: Dict[str, Any], origin: Vec2, dim_style: str, geometrie: Optional[GeometriePlan] = None, emprise: Optional[BoundingBox] = None):
     """Dessine une vue d'ensemble schématique de tous les morceaux."""
     add_annotation(msp, "VUE D'ENSEMBLE", origin, height=100, layer="TEXTE")
+    etendre_emprise_texte(emprise, "VUE D'ENSEMBLE", origin, 100)
     
     cursor = origin + (0, -500)
-    dims_map_visuel = {"poteau": get_deduction_dimension(data['poteau_dims']), "liaison": get_deduction_dimension(data['liaison_dims'])}
+    vue = (geometrie or calculer_geometrie(data)).vue_ensemble
+    thickness = 250
+    # Chemin précalculé, élargi de l'épaisseur des éléments et des annotations de longueur
+    x_min, y_min, x_max, y_max = vue.bbox
+    debord = thickness + 50 + 50
+    etendre_emprise(emprise, cursor + (x_min - debord, y_min - debord), cursor + (x_max + debord, y_max + debord))
     
-    for morceau in data['morceaux']:
-        angle_rad = math.radians(morceau['angle'])
-        structure_items = [item for item in morceau['structure'] if item.get('type') != 'rien']
-
-        for item in structure_items:
-            item_type = item['type']
-            start_point = cursor
-            
-            longueur = dims_map_visuel.get(item_type, item.get('longueur', 0))
-            
-            end_point = start_point + Vec2.from_angle(angle_rad, longueur)
-
-            thickness = 250
-            v_thickness = Vec2.from_angle(angle_rad + math.pi / 2, thickness)
-            
-            p1 = start_point
-            p2 = end_point
-            p3 = end_point + v_thickness
-            p4 = start_point + v_thickness
-            
-            poly_points = [p1, p2, p3, p4]
-            
-            # MODIF: Utiliser le calque approprié pour le contour et supprimer le remplissage
-            layer_name = "REFERENCE"
-            if item_type in ['poteau', 'liaison']:
-                layer_name = item_type.upper()
-
-            msp.add_lwpolyline(poly_points, close=True, dxfattribs={"layer": layer_name})
-            
-            if item_type == 'section':
-                mid_point = p1.lerp(p2)
-                annot_pos = mid_point + v_thickness.normalize() * (thickness + 50)
-                add_annotation(msp, f"L:{longueur:.0f} A:{morceau['angle']:.1f}°", annot_pos, height=50, layer="TEXTE", align=TextEntityAlignment.BOTTOM_CENTER)
+    for (x1, y1, x2, y2), code, angle, longueur in zip(vue.segments.tolist(), vue.codes.tolist(), vue.angles, vue.longueurs):
+        angle_rad = math.radians(angle)
+        v_thickness = Vec2.from_angle(angle_rad + math.pi / 2, thickness)
+        
+        p1 = cursor + (x1, y1)
+        p2 = cursor + (x2, y2)
+        p3 = p2 + v_thickness
+        p4 = p1 + v_thickness
+        
+        poly_points = [p1, p2, p3, p4]
+        
+        # MODIF: Utiliser le calque approprié pour le contour et supprimer le remplissage
+        layer_name = "REFERENCE"
+        if code == TYPE_POTEAU or code == TYPE_LIAISON:
+            layer_name = NOMS_TYPES[code].upper()
 
-            cursor = end_point
+        msp.add_lwpolyline(poly_points, close=True, dxfattribs={"layer": layer_name})
+        
+        if code == TYPE_SECTION:
+            mid_point = p1.lerp(p2)
+            annot_pos = mid_point + v_thickness.normalize() * (thickness + 50)
+            add_annotation(msp, f"L:{longueur:.0f} A:{angle:.1f}°", annot_pos, height=50, layer="TEXTE", align=TextEntityAlignment.BOTTOM_CENTER)
 
-def draw_morceau_view(msp, morceau: Dict[str, Any], all_data: Dict[str, Any], origin: Vec2, dim_style: str):
+def draw_morceau_view(msp, morceau: Dict[str, Any], all_data: Dict[str, Any], origin: Vec2, dim_style: str, geometrie: Optional[GeometrieMorceau] = None, cotes: str = COTES_RENDUES):
     """Dessine la vue détaillée d'un morceau, incluant la géométrie et toutes les cotes."""
+    geometrie = geometrie or calculer_geometrie_morceau(morceau, all_data, profils_du_plan(all_data))
     hauteur_totale = all_data['hauteur_totale']
     hauteur_lisse_basse = all_data['hauteur_lisse_basse']
-    angle_deg = morceau.get('angle', 0)
-    angle_rad = math.radians(angle_deg)
-    cos_angle, sin_angle = math.cos(angle_rad), math.sin(angle_rad)
-    longueur_rampante_totale = morceau.get('longueur_totale', 0)
+    longueur_rampante_totale = geometrie.longueur_totale
 
     # --- 1. DESSIN DE LA GÉOMÉTRIE ---
-    x_cursor_horiz, y_cursor_vert = origin.x, origin.y
-    key_points = []
-    structure_items = [item for item in morceau['structure'] if item.get('type') != 'rien']
-    dims_map_visuel = {"poteau": get_deduction_dimension(all_data['poteau_dims']), "liaison": get_deduction_dimension(all_data['liaison_dims'])}
-    
-    section_details_iterator = iter(morceau['sections_details'])
-    for item in structure_items:
-        key_points.append({'x': x_cursor_horiz, 'y': y_cursor_vert, 'type': item['type']})
-        item_type = item['type']
-        ep_visuelle = dims_map_visuel.get(item_type, 0)
-        
-        if item_type in ['poteau', 'liaison']:
-            p1 = Vec2(x_cursor_horiz, y_cursor_vert)
-            p2 = Vec2(x_cursor_horiz, y_cursor_vert + hauteur_totale)
-            msp.add_lwpolyline([p1, p1 + (ep_visuelle, 0), p2 + (ep_visuelle, 0), p2], close=True, dxfattribs={"layer": item_type.upper()})
-            x_cursor_horiz += ep_visuelle
-        elif item_type == 'section':
-            section = next(section_details_iterator)
-            longueur_rampante_libre = section['longueur_libre']
-            longueur_horiz_libre = longueur_rampante_libre * cos_angle
-            denivele_section = longueur_rampante_libre * sin_angle
-            
-            start_x, start_y = x_cursor_horiz, y_cursor_vert
-            end_x, end_y = start_x + longueur_horiz_libre, start_y + denivele_section
-            
-            lisse_haute_ep = get_thickness_dimension(all_data['lissehaute_dims'])
-            lisse_basse_ep = get_thickness_dimension(all_data['lissebasse_dims'])
-            
+    # Les primitives sont en coordonnées locales au morceau : on les translate sur `origin`
+    poteaux, lisses, barreaux = geometrie.poteaux.tolist(), geometrie.lisses.tolist(), geometrie.barreaux.tolist()
+    i_poteau = i_section = i_barreau = 0
+    for code in geometrie.codes.tolist():
+        if code == TYPE_POTEAU or code == TYPE_LIAISON:
+            x, y, ep_visuelle, hauteur = poteaux[i_poteau]; i_poteau += 1
+            p1 = origin + (x, y)
+            p2 = origin + (x, y + hauteur)
+            msp.add_lwpolyline([p1, p1 + (ep_visuelle, 0), p2 + (ep_visuelle, 0), p2], close=True, dxfattribs={"layer": NOMS_TYPES[code].upper()})
+        elif code == TYPE_SECTION:
+            section = geometrie.sections_details[i_section]
+
             # Lisses
-            lh_p1 = Vec2(start_x, start_y + hauteur_totale - lisse_haute_ep); lh_p2 = Vec2(end_x, end_y + hauteur_totale - lisse_haute_ep); lh_p3 = Vec2(end_x, end_y + hauteur_totale); lh_p4 = Vec2(start_x, start_y + hauteur_totale)
-            msp.add_lwpolyline([lh_p1, lh_p2, lh_p3, lh_p4], close=True, dxfattribs={"layer": "LISSE"})
-            lb_p1 = Vec2(start_x, start_y + hauteur_lisse_basse); lb_p2 = Vec2(end_x, end_y + hauteur_lisse_basse); lb_p3 = Vec2(end_x, end_y + hauteur_lisse_basse + lisse_basse_ep); lb_p4 = Vec2(start_x, start_y + hauteur_lisse_basse + lisse_basse_ep)
-            msp.add_lwpolyline([lb_p1, lb_p2, lb_p3, lb_p4], close=True, dxfattribs={"layer": "LISSE"})
+            for x0, x1, y0_bas, y0_haut, y1_bas, y1_haut in lisses[2 * i_section:2 * i_section + 2]:
+                msp.add_lwpolyline([origin + (x0, y0_bas), origin + (x1, y1_bas), origin + (x1, y1_haut), origin + (x0, y0_haut)], close=True, dxfattribs={"layer": "LISSE"})
 
             # Barreaux
-            if section.get('nombre_barreaux', 0) > 0:
-                barreau_ep = get_deduction_dimension(all_data['barreau_dims'])
-                hauteur_barreau = hauteur_totale - hauteur_lisse_basse - lisse_haute_ep - lisse_basse_ep
-                espacement_rampe = section.get('vide_entre_barreaux_mm', 0)
-                jeu_depart_rampe = section.get('jeu_depart_mm', 0)
-
-                for j in range(section['nombre_barreaux']):
-                    pos_x_rampe = jeu_depart_rampe + j * (barreau_ep + espacement_rampe)
-                    pos_x_horiz = start_x + pos_x_rampe * cos_angle
-                    pos_y_denivele = pos_x_rampe * sin_angle
-                    barreau_y_start = start_y + hauteur_lisse_basse + lisse_basse_ep + pos_y_denivele
-                    barreau_p1 = Vec2(pos_x_horiz, barreau_y_start)
-                    msp.add_lwpolyline([barreau_p1, barreau_p1 + (barreau_ep, 0), barreau_p1 + (barreau_ep, hauteur_barreau), barreau_p1 + (0, hauteur_barreau)], close=True, dxfattribs={"layer": "BARREAU"})
+            nombre_barreaux = geometrie.barreaux_par_section[i_section]
+            for x, y_bas, barreau_ep, hauteur_barreau in barreaux[i_barreau:i_barreau + nombre_barreaux]:
+                barreau_p1 = origin + (x, y_bas)
+                msp.add_lwpolyline([barreau_p1, barreau_p1 + (barreau_ep, 0), barreau_p1 + (barreau_ep, hauteur_barreau), barreau_p1 + (0, hauteur_barreau)], close=True, dxfattribs={"layer": "BARREAU"})
             
             # Annotation pour le barreaudage
+            start_x, start_y, longueur_horiz_libre, denivele_section = geometrie.sections[i_section].tolist()
             annot_text = f"{section['nombre_barreaux']} barreaux / Ecart: {section['vide_entre_barreaux_mm']:.1f}mm"
-            annot_pos = Vec2(start_x + longueur_horiz_libre / 2, start_y + denivele_section / 2 + hauteur_totale + 100)
+            annot_pos = origin + (start_x + longueur_horiz_libre / 2, start_y + denivele_section / 2 + hauteur_totale + 100)
             add_annotation(msp, annot_text, annot_pos, height=50, layer="TEXTE", align=TextEntityAlignment.BOTTOM_CENTER)
 
-            x_cursor_horiz, y_cursor_vert = end_x, end_y
-    
-    key_points.append({'x': x_cursor_horiz, 'y': y_cursor_vert, 'type': 'fin'})
+            i_barreau += nombre_barreaux
+            i_section += 1
 
     # --- 2. DESSIN DES COTES ---
     p1_h = Vec2(origin.x, origin.y); p2_h = Vec2(origin.x, origin.y + hauteur_totale)
-    msp.add_linear_dim(base=p1_h + (-150, hauteur_totale / 2), p1=p1_h, p2=p2_h, angle=90, text=f"{hauteur_totale}", dimstyle=dim_style, dxfattribs={"layer": "COTES"}).render()
+    finaliser_cote(msp.add_linear_dim(base=p1_h + (-150, hauteur_totale / 2), p1=p1_h, p2=p2_h, angle=90, text=f"{hauteur_totale}", dimstyle=dim_style, dxfattribs={"layer": "COTES"}), cotes)
 
     p2_hsl = Vec2(origin.x, origin.y + hauteur_lisse_basse)
-    msp.add_linear_dim(base=p1_h + (-250, hauteur_lisse_basse / 2), p1=p1_h, p2=p2_hsl, angle=90, text=f"{hauteur_lisse_basse}", dimstyle=dim_style, dxfattribs={"layer": "COTES"}).render()
-
-    p1_total = Vec2(key_points[0]['x'], key_points[0]['y'])
-    p2_total = Vec2(key_points[-1]['x'], key_points[-1]['y'])
-    add_aligned_dim_with_mask(msp, p1_total, p2_total, -350, f"Longueur Totale: {longueur_rampante_totale:.0f}", dim_style, layer="COTES_TOTAL")
-
-    section_details_iterator_dim = iter(morceau['sections_details'])
-    for i in range(len(structure_items)):
-        if structure_items[i]['type'] == 'section':
-            section = next(section_details_iterator_dim)
-            elem_gauche = structure_items[i-1]; elem_droit = structure_items[i+1]
-            is_gauche_extremite = (i-1 == 0); is_droit_extremite = (i+1 == len(structure_items) - 1)
-            ep_gauche = dims_map_visuel.get(elem_gauche['type'], 0); ep_droit = dims_map_visuel.get(elem_droit['type'], 0)
-            
-            pt_gauche_sec = key_points[i-1]; offset_gauche = 0 if is_gauche_extremite else ep_gauche / 2
-            p1_sec = Vec2(pt_gauche_sec['x'] + offset_gauche, pt_gauche_sec['y'] + offset_gauche * sin_angle)
-            pt_droit_sec = key_points[i+1]; offset_droit = ep_droit if is_droit_extremite else ep_droit / 2
-            p2_sec = Vec2(pt_droit_sec['x'] + offset_droit, pt_droit_sec['y'] + offset_droit * sin_angle)
-            add_aligned_dim_with_mask(msp, p1_sec, p2_sec, -150, f"{section['longueur_section']:.0f}", dim_style, layer="COTES_SECTION")
-
-            pt_debut_vide = key_points[i]
-            p1_vide = Vec2(pt_debut_vide['x'], pt_debut_vide['y']); p2_vide = Vec2(key_points[i+1]['x'], key_points[i+1]['y'])
-            add_aligned_dim_with_mask(msp, p1_vide, p2_vide, -250, f"Vide: {section['longueur_libre']:.0f}", dim_style, layer="COTES_VIDE")
-
-def creer_plan_dxf(data: Dict[str, Any]) -> Optional[Drawing]:
-    """Génère un plan de garde-corps complet au format DXF, propre et organisé."""
+    finaliser_cote(msp.add_linear_dim(base=p1_h + (-250, hauteur_lisse_basse / 2), p1=p1_h, p2=p2_hsl, angle=90, text=f"{hauteur_lisse_basse}", dimstyle=dim_style, dxfattribs={"layer": "COTES"}), cotes)
+
+    p1_total = origin + geometrie.points_cles[0].tolist()
+    p2_total = origin + geometrie.points_cles[-1].tolist()
+    add_aligned_dim_with_mask(msp, p1_total, p2_total, -350, f"Longueur Totale: {longueur_rampante_totale:.0f}", dim_style, layer="COTES_TOTAL", cotes=cotes)
+
+    for section, (x1_sec, y1_sec, x2_sec, y2_sec, x1_vide, y1_vide, x2_vide, y2_vide) in zip(geometrie.sections_details, geometrie.cotes_sections.tolist()):
+        add_aligned_dim_with_mask(msp, origin + (x1_sec, y1_sec), origin + (x2_sec, y2_sec), -150, f"{section['longueur_section']:.0f}", dim_style, layer="COTES_SECTION", cotes=cotes)
+        add_aligned_dim_with_mask(msp, origin + (x1_vide, y1_vide), origin + (x2_vide, y2_vide), -250, f"Vide: {section['longueur_libre']:.0f}", dim_style, layer="COTES_VIDE", cotes=cotes)
+
+def ranger_morceaux(geometries: List[GeometrieMorceau], origin: Vec2) -> List[Vec2]:
+    """
+    Position d'insertion de chaque morceau dans l'espace objet : côte à côte, en rangées
+    d'au plus LONGUEUR_RANGEE_MAX, les rangées étant empilées vers le bas sans se chevaucher.
+    """
+    rangees: List[List[GeometrieMorceau]] = [[]]
+    longueur_rangee = 0.0
+    for geometrie_morceau in geometries:
+        largeur = geometrie_morceau.longueur_horizontale + 1500
+        if rangees[-1] and longueur_rangee + largeur > LONGUEUR_RANGEE_MAX:
+            rangees.append([])
+            longueur_rangee = 0.0
+        rangees[-1].append(geometrie_morceau)
+        longueur_rangee += largeur
+
+    positions = []
+    cursor = origin
+    for numero, rangee in enumerate(rangees):
+        if numero > 0:
+            # Haut de la rangée juste sous le bas de la précédente
+            haut_rangee = max(g.bbox[3] for g in rangee) + MARGE_COTES_MORCEAU
+            cursor = Vec2(origin.x, bas_precedent - 1500 - haut_rangee)
+        for geometrie_morceau in rangee:
+            positions.append(cursor)
+            cursor += (geometrie_morceau.longueur_horizontale + 1500, 0)
+        bas_precedent = cursor.y + min(g.bbox[1] for g in rangee) - MARGE_COTES_MORCEAU
+    return positions
+
+def creer_feuilles(doc: Drawing, vues: List[Tuple[Fenetre, float]]):
+    """
+    Répartit les vues (fenêtre de l'espace objet, échelle) sur des présentations A3 « Feuille n »,
+    une fenêtre de présentation (viewport) par vue, rangées par étagères dans l'ordre du plan.
+    """
+    largeur_utile, hauteur_utile = ZONE_UTILE_FEUILLE
+    # Une vue trop grande pour la feuille est réduite (l'échelle minimale ne peut alors être tenue)
+    echelles = [min(echelle, largeur_utile / fenetre.largeur, hauteur_utile / fenetre.hauteur) for fenetre, echelle in vues]
+    tailles = [(fenetre.largeur * echelle, fenetre.hauteur * echelle) for (fenetre, _), echelle in zip(vues, echelles)]
+    feuilles = ranger_par_etageres(tailles, largeur_utile, hauteur_utile, ESPACEMENT_VUES)
+
+    for numero, placements in enumerate(feuilles, start=1):
+        layout = doc.layouts.new(f"Feuille {numero}")
+        layout.page_setup(size=FORMAT_FEUILLE, margins=(0, 0, 0, 0), units="mm")
+        for placement in placements:
+            fenetre = vues[placement.index][0]
+            largeur, hauteur = tailles[placement.index]
+            centre = (MARGE_FEUILLE + placement.x + largeur / 2, FORMAT_FEUILLE[1] - MARGE_FEUILLE - placement.y - hauteur / 2)
+            layout.add_viewport(center=centre, size=(largeur, hauteur), view_center_point=fenetre.centre, view_height=fenetre.hauteur)
+        add_annotation(layout, f"Feuille {numero}/{len(feuilles)}", Vec2(FORMAT_FEUILLE[0] - MARGE_FEUILLE, MARGE_FEUILLE / 2), height=3.5, layer="CARTOUCHE", align=TextEntityAlignment.BOTTOM_RIGHT)
+
+    # La présentation vide créée par défaut est remplacée par les feuilles
+    if feuilles and "Layout1" in doc.layouts:
+        doc.layouts.delete("Layout1")
+
+def nouveau_document() -> Drawing:
+    """Document vide avec les calques, le style de cotes et sa flèche."""
     doc: Drawing = ezdxf.new(dxfversion='AC1027')
-    msp = doc.modelspace()
-
     for name, color_index in LAYER_COLORS.items():
         doc.layers.add(name=name, color=color_index)
-
-    dim_style_name = "METALLERIE_MASQUE"
     doc.dimstyles.new(
-        name=dim_style_name,
+        name=STYLE_COTES,
         dxfattribs={
             "dimtxt": 40, "dimasz": 15, "dimblk": "ARCHTICK",
             "dimtfill": 1, "dimtfillclr": 256
         },
     )
+    # Bloc de la flèche créé d'emblée, et non au premier rendu de cote
+    doc.acquire_arrow("ARCHTICK")
+    return doc
+
+def creer_plan_dxf(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None, cotes: str = COTES_RENDUES) -> Optional[Drawing]:
+    """Génère un plan de garde-corps complet au format DXF, propre et organisé (`cotes` : voir PROFILS_COTES)."""
+    doc = nouveau_document()
+    msp = doc.modelspace()
+    dim_style_name = STYLE_COTES
+
+    # Géométrie calculée une fois (ou fournie par l'appelant quand elle est partagée avec le PDF)
+    geometrie = geometrie or calculer_geometrie(data)
+
+    # Emprise tenue à jour au fil du placement (évite un second parcours de tout le dessin)
+    emprise = BoundingBox()
 
     # Positionnement en haut à gauche pour le cartouche et la légende
     cartouche_origin = Vec2(0, 0)
-    draw_cartouche(msp, data, cartouche_origin)
+    draw_cartouche(msp, data, cartouche_origin, emprise=emprise)
     
     legend_origin = cartouche_origin + (5500, 0) # À droite du cartouche
-    draw_legend(msp, data, legend_origin)
+    draw_legend(msp, data, legend_origin, emprise=emprise)
+    # Vues à placer sur les feuilles : le cartouche et la légende d'abord
+    vues: List[Tuple[Fenetre, float]] = [(Fenetre(emprise.extmin.x - 100, emprise.extmin.y - 100, emprise.size.x + 200, emprise.size.y + 200), ECHELLE_MIN_MORCEAU)]
     
     # Positionnement de la vue d'ensemble en dessous
     vue_ensemble_origin = cartouche_origin + (0, -2500)
-    draw_vue_ensemble_dxf(msp, data, vue_ensemble_origin, dim_style_name)
-
-    # Positionnement des vues détaillées
+    draw_vue_ensemble_dxf(msp, data, vue_ensemble_origin, dim_style_name, geometrie, emprise)
+    # Chemin de la vue d'ensemble (500 sous son titre), découpé s'il est trop long pour l'échelle minimale
+    debut_chemin = vue_ensemble_origin + (0, -500)
+    segments_vue = geometrie.vue_ensemble.segments + (debut_chemin.x, debut_chemin.y) * 2
+    for fenetre in decouper_chemin(segments_vue, 400, 700, ZONE_UTILE_FEUILLE[0] / ECHELLE_MIN_VUE_ENSEMBLE, ZONE_UTILE_FEUILLE[1] / ECHELLE_MIN_VUE_ENSEMBLE, 200):
+        vues.append((fenetre, ECHELLE_MIN_VUE_ENSEMBLE))
+
+    # Positionnement des vues détaillées, en rangées successives
     detail_origin = vue_ensemble_origin + (0, -3000) # Encore plus bas
-    cursor = detail_origin
+    positions = ranger_morceaux(geometrie.morceaux, detail_origin)
     
-    for m in data['morceaux']:
-        draw_morceau_view(msp, m, data, cursor, dim_style_name)
-        longueur_horizontale_totale = m.get('longueur_totale', 0) * math.cos(math.radians(m.get('angle', 0)))
-        cursor += (longueur_horizontale_totale + 1500, 0)
+    # Chaque morceau distinct est dessiné une seule fois dans un bloc ; chaque occurrence est une insertion
+    blocs_morceaux: Dict[int, str] = {}
+    for m, geometrie_morceau in zip(data['morceaux'], geometrie.morceaux):
+        if id(geometrie_morceau) in blocs_morceaux:
+            continue
+        nom_bloc = f"{PREFIXE_BLOC_MORCEAU}{len(blocs_morceaux) + 1}"
+        blocs_morceaux[id(geometrie_morceau)] = nom_bloc
+        draw_morceau_view(doc.blocks.new(name=nom_bloc), m, data, Vec2(0, 0), dim_style_name, geometrie_morceau, cotes)
+
+    for m, geometrie_morceau, cursor in zip(data['morceaux'], geometrie.morceaux, positions):
+        nom_bloc = blocs_morceaux[id(geometrie_morceau)]
+        msp.add_blockref(nom_bloc, cursor, dxfattribs={"layer": "0"})
+        x_min, y_min, x_max, y_max = geometrie_morceau.bbox
+        etendre_emprise(emprise, cursor + (x_min - MARGE_COTES_MORCEAU, y_min - MARGE_COTES_MORCEAU), cursor + (x_max + MARGE_COTES_MORCEAU, y_max + MARGE_COTES_MORCEAU))
+        # Vue(s) du morceau sur les feuilles, découpée(s) s'il est trop long pour l'échelle minimale
+        segments_morceau = segments_chemin(geometrie_morceau.points_cles + (cursor.x, cursor.y))
+        for fenetre in decouper_chemin(segments_morceau, MARGE_COTES_MORCEAU, geometrie_morceau.hauteur_totale + MARGE_COTES_MORCEAU, ZONE_UTILE_FEUILLE[0] / ECHELLE_MIN_MORCEAU, ZONE_UTILE_FEUILLE[1] / ECHELLE_MIN_MORCEAU, MARGE_COTES_MORCEAU):
+            vues.append((fenetre, ECHELLE_MIN_MORCEAU))
+
+    creer_feuilles(doc, vues)
     
-    try:
-        final_extents = bbox.extents(msp)
-        if final_extents.has_data:
-            doc.header['$EXTMIN'] = tuple(final_extents.extmin)
-            doc.header['$EXTMAX'] = tuple(final_extents.extmax)
-    except Exception as e:
-        print(f"Avertissement : Impossible de calculer les limites du dessin. Erreur: {e}")
+    # Les limites du modèle sont recopiées dans $EXTMIN/$EXTMAX à l'écriture du document
+    msp.reset_extents(tuple(emprise.extmin), tuple(emprise.extmax))
+    doc.header['$EXTMIN'] = tuple(emprise.extmin)
+    doc.header['$EXTMAX'] = tuple(emprise.extmax)
 
     return doc
+
+def serialiser_dxf(doc: Drawing) -> bytes:
+    """Sérialise le document en DXF ASCII directement en mémoire (même contenu que `doc.saveas`)."""
+    tampon = io.BytesIO()
+    flux_texte = io.TextIOWrapper(tampon, encoding=doc.output_encoding, errors='dxfreplace')
+    doc.write(flux_texte)
+    flux_texte.flush()
+    contenu = tampon.getvalue()
+    flux_texte.detach()
+    return contenu
+
+def creer_plan_dxf_bytes(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None, cotes: str = COTES_RENDUES) -> Optional[bytes]:
+    """Génère le plan DXF et retourne son contenu, sans fichier intermédiaire."""
+    with etape("dessin_dxf"):
+        doc = creer_plan_dxf(data, geometrie, cotes)
+    if not doc:
+        return None
+    ELEMENTS_PLAN.observe(len(doc.entitydb), type="entites_dxf")
+    with etape("serialisation_dxf"):
+        return serialiser_dxf(doc)
@@ -1,15 +1,29 @@
 # dessin_pdf.py
 
-from fpdf import FPDF
-from typing import List, Dict, Any, Optional
-import json
+from fpdf import FPDF, FPDF_VERSION
+from typing import List, Dict, Any, BinaryIO, Iterator, Optional, Tuple
 import collections
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 import unicodedata
 import math
-from .utils import get_deduction_dimension, get_thickness_dimension
-
+import numpy as np
+from .profils import parse_profil, profils_du_plan
+from .colonnes import NOMS_TYPES, TYPE_LIAISON, TYPE_POTEAU, TYPE_SECTION
+from .geometrie import GeometrieMorceau, GeometriePlan, GeometrieVueEnsemble, calculer_geometrie, calculer_geometrie_morceau
+from .fusion_pdf import FusionPDF
+from .metriques import ELEMENTS_PLAN, etape
+from .mise_en_page import ECHELLE_MIN_MORCEAU, ECHELLE_MIN_VUE_ENSEMBLE, Fenetre, decouper_chemin, segments_chemin
+
+
+# Version du moteur de rendu : à incrémenter à chaque changement du dessin produit
+# (elle fait partie de la clé du cache de rendu).
+VERSION_RENDU = "2"
+# FusionPDF s'appuie sur la structure des fichiers écrits par fpdf2 : l'assemblage page par page
+# n'est utilisé qu'avec la version où il a été vérifié (voir requirements.txt et test_dessin_pdf) ;
+# avec une autre version, le plan est construit en mémoire d'un seul tenant.
+FPDF_FUSION_VERIFIEE = (2, 8)
+FUSION_PDF = tuple(int(n) for n in FPDF_VERSION.split(".")[:2]) == FPDF_FUSION_VERIFIEE
 
 # --- PALETTE DE COULEURS ---
 COLORS = {
@@ -21,6 +35,9 @@ COLORS = {
     "cote_vide": (41, 128, 185)    # Bleu pour la cote de vide
 }
 
+# Marges des pages de détail d'un morceau (mm) : gauche/droite, haut, bas
+MARGES_MORCEAU = (20, 40, 65)
+
 # --- FONCTION DE NETTOYAGE DE TEXTE ---
 def sanitize_text(text: str) -> str:
     if not isinstance(text, str):
@@ -33,6 +50,8 @@ def sanitize_text(text: str) -> str:
 class PlanPDF(FPDF):
     def __init__(self, *args, **kwargs):
         self.titre_plan = sanitize_text(kwargs.pop('titre_plan', 'Plan de Fabrication'))
+        # Numéro de la première page quand le document n'est qu'une partie du plan (rendu page par page)
+        self.premiere_page = kwargs.pop('premiere_page', 1)
         super().__init__(*args, **kwargs)
         self.show_main_header = True
 
@@ -45,38 +64,126 @@ class PlanPDF(FPDF):
     def footer(self):
         self.set_y(-15)
         self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+        self.cell(0, 10, f'Page {self.page_no() + self.premiere_page - 1}', 0, 0, 'C')
 
 # --- FONCTION PRINCIPALE ---
-def creer_plan_pdf(data: Dict[str, Any]):
-    try:
-        pdf = PlanPDF(orientation='L', unit='mm', format='A4', titre_plan=data.get('titre_plan', 'Sans Titre'))
-        
-        dessiner_page_1(pdf, data)
-        
-        pdf.show_main_header = False 
+def nouveau_document(data: Dict[str, Any], premiere_page: int = 1, date_creation: Optional[datetime] = None) -> PlanPDF:
+    pdf = PlanPDF(orientation='L', unit='mm', format='A4', titre_plan=data.get('titre_plan', 'Sans Titre'), premiere_page=premiere_page)
+    if date_creation is not None:
+        pdf.set_creation_date(date_creation)
+    return pdf
+
+def groupes_morceaux(data: Dict[str, Any], geometrie: GeometriePlan) -> List[Tuple[Dict[str, Any], int, GeometrieMorceau]]:
+    """Morceaux à détailler : (premier morceau, nombre de répétitions, géométrie) par géométrie distincte."""
+    # Les morceaux identiques partagent la même géométrie : une page par géométrie distincte
+    grouped_morceaux = collections.defaultdict(list)
+    for morceau, geometrie_morceau in zip(data['morceaux'], geometrie.morceaux):
+        grouped_morceaux[id(geometrie_morceau)].append((morceau, geometrie_morceau))
+    return [(groupe[0][0], len(groupe), groupe[0][1]) for groupe in grouped_morceaux.values()]
+
+def construire_plan_pdf(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None) -> PlanPDF:
+    """Dessine toutes les pages du plan et retourne le document FPDF, sans l'écrire."""
+    pdf = nouveau_document(data)
+    # La géométrie (profilés analysés, positions de tous les éléments) est calculée une fois,
+    # ou fournie par l'appelant quand elle est partagée avec le rendu DXF
+    geometrie = geometrie or calculer_geometrie(data)
+    
+    with etape("dessin_pdf"):
+        dessiner_page_1(pdf, data, geometrie)
 
-        grouped_morceaux = collections.defaultdict(list)
-        for morceau in data['morceaux']:
-            structure_key = json.dumps([(s.get('type'), s.get('longueur')) for s in morceau['structure']])
-            group_key_with_angle = (morceau['angle'], structure_key)
-            grouped_morceaux[group_key_with_angle].append(morceau)
-            
-        for group_key, morceaux_group in grouped_morceaux.items():
-            dessiner_page_morceau(pdf, morceaux_group[0], data, len(morceaux_group))
+        pdf.show_main_header = False
+
+        for morceau, repetition, geometrie_morceau in groupes_morceaux(data, geometrie):
+            dessiner_page_morceau(pdf, morceau, data, repetition, geometrie_morceau)
 
         if data.get('platine_details'):
             dessiner_page_platine(pdf, data['platine_details'], data['poteau_dims'])
-            
-        sanitized_title = sanitize_text(data.get('titre_plan', 'plan')).replace(' ', '_').lower()
-        filepath = f"{sanitized_title}.pdf"
-        pdf.output(filepath)
-        return filepath
-    except Exception as e:
-        print(f"Erreur lors de la création du PDF : {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+    ELEMENTS_PLAN.observe(pdf.pages_count, type="pages_pdf")
+    return pdf
+
+def creer_plan_pdf_bytes(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None) -> bytes:
+    """
+    Génère le plan entièrement en mémoire et retourne le contenu du PDF (aucun fichier écrit).
+    Une erreur de dessin est propagée à l'appelant, qui la journalise et répond en conséquence.
+    """
+    pdf = construire_plan_pdf(data, geometrie)
+    with etape("serialisation_pdf"):
+        return bytes(pdf.output())
+
+# --- RENDU PAGE PAR PAGE ---
+# Pour les grands projets, chaque groupe de pages (synthèse, détail d'un morceau, platine) est
+# dessiné dans un document fpdf2 indépendant, puis assemblé en flux par FusionPDF : la mémoire
+# occupée ne dépend plus du nombre de pages, et les morceaux peuvent être dessinés en parallèle
+# dans le pool de rendu (voir rendu.rendre_pdf_par_parties).
+# Les tâches restent au niveau du module pour pouvoir être envoyées à un pool de processus.
+
+def rendre_partie_morceau_pdf(contexte: Dict[str, Any], morceau: Dict[str, Any], repetition: int, geometrie: GeometrieMorceau, premiere_page: int, date_creation: datetime) -> bytes:
+    """Document PDF contenant seulement les pages de détail d'un morceau."""
+    pdf = nouveau_document(contexte, premiere_page, date_creation)
+    pdf.show_main_header = False
+    dessiner_page_morceau(pdf, morceau, contexte, repetition, geometrie)
+    return bytes(pdf.output())
+
+def rendre_partie_platine_pdf(contexte: Dict[str, Any], premiere_page: int, date_creation: datetime) -> bytes:
+    """Document PDF contenant seulement la page de détail de la platine."""
+    pdf = nouveau_document(contexte, premiere_page, date_creation)
+    pdf.show_main_header = False
+    dessiner_page_platine(pdf, contexte['platine_details'], contexte['poteau_dims'])
+    return bytes(pdf.output())
+
+def preparer_parties_pdf(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None, date_creation: Optional[datetime] = None) -> Tuple[bytes, List[Tuple[Any, ...]]]:
+    """
+    Dessine la synthèse du plan et retourne son PDF, avec les tâches `(fonction, *arguments)` qui
+    dessinent chacune des parties suivantes (morceaux, platine), indépendantes les unes des autres :
+    elles peuvent s'exécuter dans d'autres processus, puis être assemblées dans l'ordre.
+    """
+    geometrie = geometrie or calculer_geometrie(data)
+    date_creation = date_creation or datetime.now(timezone.utc)
+
+    # La synthèse est dessinée d'abord : son nombre de pages (nomenclature, vue d'ensemble en
+    # feuilles) donne le numéro de la première page des morceaux
+    pdf = nouveau_document(data, date_creation=date_creation)
+    dessiner_page_1(pdf, data, geometrie)
+    largeur_page, hauteur_page = pdf.w, pdf.h
+    synthese = bytes(pdf.output())
+    premiere_page = pdf.pages_count + 1
+    del pdf
+
+    # Les autres parties ne reçoivent que les données communes, sans la liste des morceaux
+    contexte = {cle: valeur for cle, valeur in data.items() if cle != 'morceaux'}
+    taches = []
+    for morceau, repetition, geometrie_morceau in groupes_morceaux(data, geometrie):
+        taches.append((rendre_partie_morceau_pdf, contexte, morceau, repetition, geometrie_morceau, premiere_page, date_creation))
+        _, fenetres = fenetres_morceau(geometrie_morceau, data['hauteur_totale'], largeur_page, hauteur_page)
+        premiere_page += 1 if fenetres is None else len(fenetres)
+    if data.get('platine_details'):
+        taches.append((rendre_partie_platine_pdf, contexte, premiere_page, date_creation))
+    return synthese, taches
+
+def iter_plan_pdf(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None, date_creation: Optional[datetime] = None) -> Iterator[bytes]:
+    """Génère le plan page par page et produit le PDF final par blocs, au fur et à mesure."""
+    geometrie = geometrie or calculer_geometrie(data)
+    date_creation = date_creation or datetime.now(timezone.utc)
+    if not FUSION_PDF:
+        pdf = construire_plan_pdf(data, geometrie)
+        pdf.set_creation_date(date_creation)
+        yield bytes(pdf.output())
+        return
+    fusion = FusionPDF()
+    synthese, taches = preparer_parties_pdf(data, geometrie, date_creation)
+    yield from fusion.ajouter(synthese)
+    del synthese
+    for fn, *arguments in taches:
+        yield from fusion.ajouter(fn(*arguments))
+    yield from fusion.terminer()
+
+def creer_plan_pdf_flux(data: Dict[str, Any], sortie: BinaryIO, geometrie: Optional[GeometriePlan] = None) -> int:
+    """Génère le plan page par page en l'écrivant dans `sortie` ; retourne le nombre d'octets écrits."""
+    taille = 0
+    for bloc in iter_plan_pdf(data, geometrie):
+        sortie.write(bloc)
+        taille += len(bloc)
+    return taille
 
 # --- FONCTIONS DE DESSIN UTILITAIRES ---
 def draw_horizontal_dim(pdf: FPDF, x, y, width, text):
@@ -144,7 +251,38 @@ def draw_annotation(pdf: FPDF, x, y, title, detail, color, align='L'):
         pdf.text(x - detail_width - title_width, y, title_safe)
 
 # --- DESSIN DES PAGES ---
-def dessiner_vue_ensemble(pdf: FPDF, data: Dict[str, Any]):
+def dessiner_segments_vue(pdf: FPDF, vue: GeometrieVueEnsemble, origin_x: float, origin_y: float, scale: float, selection: Optional[np.ndarray] = None):
+    """Dessine les éléments du chemin de la vue d'ensemble (seulement ceux de `selection` si fournie)."""
+    # Passage en coordonnées page pour tous les segments à la fois
+    segments_page = vue.segments * scale
+    segments_page[:, 0::2] += origin_x
+    segments_page[:, 1::2] += origin_y
+    for index, ((x1, y1, x2, y2), code, angle, longueur) in enumerate(zip(segments_page.tolist(), vue.codes.tolist(), vue.angles, vue.longueurs)):
+        if selection is not None and not selection[index]:
+            continue
+        p1, p2 = (x1, y1), (x2, y2)
+        angle_rad = math.radians(angle)
+
+        thickness = 10 # Épaisseur visuelle
+        dx = thickness * math.sin(angle_rad)
+        dy = -thickness * math.cos(angle_rad)
+
+        poly_points = [p1, p2, (p2[0] + dx, p2[1] + dy), (p1[0] + dx, p1[1] + dy)]
+        
+        if code == TYPE_POTEAU or code == TYPE_LIAISON:
+            pdf.set_fill_color(*COLORS[NOMS_TYPES[code]])
+            pdf.polygon(poly_points, style='F')
+        else: # section
+            pdf.set_fill_color(230, 230, 230)
+            pdf.polygon(poly_points, style='DF')
+            
+            mid_x = (p1[0] + p2[0]) / 2
+            mid_y = (p1[1] + p2[1]) / 2
+            pdf.set_font('Arial', 'I', 8)
+            text = f"L:{longueur:.0f} A:{angle:.1f}°"
+            pdf.text(mid_x - pdf.get_string_width(text)/2, mid_y - 4, text)
+
+def dessiner_vue_ensemble(pdf: FPDF, data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None):
     pdf.set_font('Arial', 'B', 12)
     pdf.cell(0, 10, "3. Vue d'Ensemble", 0, 1, 'L')
     pdf.ln(5)
@@ -152,81 +290,54 @@ def dessiner_vue_ensemble(pdf: FPDF, data: Dict[str, Any]):
     morceaux = data['morceaux']
     if not morceaux: return
 
-    # Calcul des points du chemin
-    all_points = []
-    x_cursor, y_cursor = 0, 0
-    dims_map_visuel = {"poteau": get_deduction_dimension(data['poteau_dims']), "liaison": get_deduction_dimension(data['liaison_dims'])}
-
-    for morceau in morceaux:
-        angle_rad = math.radians(morceau['angle'])
-        cos_a, sin_a = math.cos(angle_rad), math.sin(angle_rad)
-        structure_items = [item for item in morceau['structure'] if item.get('type') != 'rien']
-        for item in structure_items:
-            all_points.append((x_cursor, y_cursor))
-            item_type = item['type']
-            longueur = dims_map_visuel.get(item_type, item.get('longueur', 0))
-            
-            x_cursor += longueur * cos_a
-            y_cursor += longueur * sin_a
-    all_points.append((x_cursor, y_cursor))
-
-    min_x = min(p[0] for p in all_points)
-    max_x = max(p[0] for p in all_points)
-    min_y = min(p[1] for p in all_points)
-    max_y = max(p[1] for p in all_points)
+    # Chemin et emprise précalculés
+    vue = (geometrie or calculer_geometrie(data)).vue_ensemble
+    min_x, min_y, max_x, max_y = vue.bbox
     
     bbox_width = max_x - min_x if max_x > min_x else 1
     
     drawing_area_width = pdf.w - 40
     scale = drawing_area_width / bbox_width if bbox_width > 0 else 1
+
+    # Installation trop longue pour rester lisible sur une page : découpage en feuilles
+    if scale < ECHELLE_MIN_VUE_ENSEMBLE:
+        dessiner_vue_ensemble_en_feuilles(pdf, vue)
+        return
     
     origin_x = 20 - min_x * scale
     origin_y = pdf.get_y() + 20 - min_y * scale
     
     pdf.set_draw_color(0,0,0)
     pdf.set_line_width(0.3)
+    dessiner_segments_vue(pdf, vue, origin_x, origin_y, scale)
+    pdf.ln(15)
 
-    # Dessin des éléments
-    x_cursor, y_cursor = 0, 0
-    for morceau in morceaux:
-        angle_rad = math.radians(morceau['angle'])
-        cos_a, sin_a = math.cos(angle_rad), math.sin(angle_rad)
-        structure_items = [item for item in morceau['structure'] if item.get('type') != 'rien']
-
-        for item in structure_items:
-            item_type = item['type']
-            start_x = x_cursor
-            start_y = y_cursor
-            
-            longueur = dims_map_visuel.get(item_type, item.get('longueur', 0))
-            
-            x_cursor += longueur * cos_a
-            y_cursor += longueur * sin_a
-            
-            p1 = (origin_x + start_x * scale, origin_y + start_y * scale)
-            p2 = (origin_x + x_cursor * scale, origin_y + y_cursor * scale)
-
-            thickness = 10 # Épaisseur visuelle
-            dx = thickness * math.sin(angle_rad)
-            dy = -thickness * math.cos(angle_rad)
+def dessiner_vue_ensemble_en_feuilles(pdf: FPDF, vue: GeometrieVueEnsemble):
+    """Vue d'ensemble répartie sur plusieurs pages, à échelle constante (au moins l'échelle minimale lisible)."""
+    zone_x, zone_y = 20, 45
+    zone_largeur, zone_hauteur = pdf.w - 2 * zone_x, pdf.h - zone_y - 25
+    # Bande autour du chemin : épaisseur des éléments et annotations de longueur (mm papier)
+    bande = 15 / ECHELLE_MIN_VUE_ENSEMBLE
+    fenetres = decouper_chemin(vue.segments, bande, bande, zone_largeur / ECHELLE_MIN_VUE_ENSEMBLE, zone_hauteur / ECHELLE_MIN_VUE_ENSEMBLE)
+    scale = min(ECHELLE_MIN_VUE_ENSEMBLE, zone_hauteur / max(fenetre.hauteur for fenetre in fenetres))
 
-            poly_points = [p1, p2, (p2[0] + dx, p2[1] + dy), (p1[0] + dx, p1[1] + dy)]
-            
-            if item_type in ['poteau', 'liaison']:
-                pdf.set_fill_color(*COLORS[item_type])
-                pdf.polygon(poly_points, style='F')
-            else: # section
-                pdf.set_fill_color(230, 230, 230)
-                pdf.polygon(poly_points, style='DF')
-                
-                mid_x = (p1[0] + p2[0]) / 2
-                mid_y = (p1[1] + p2[1]) / 2
-                pdf.set_font('Arial', 'I', 8)
-                text = f"L:{longueur:.0f} A:{morceau['angle']:.1f}°"
-                pdf.text(mid_x - pdf.get_string_width(text)/2, mid_y - 4, text)
-    pdf.ln(15)
+    pdf.set_font('Arial', '', 10)
+    pdf.cell(0, 6, f"Vue d'ensemble sur {len(fenetres)} feuilles, echelle 1:{round(1 / scale)}", 0, 1, 'L')
+    pdf.ln(5)
 
-def dessiner_page_1(pdf: FPDF, data: Dict[str, Any]):
+    x_debut = np.minimum(vue.segments[:, 0], vue.segments[:, 2])
+    x_fin = np.maximum(vue.segments[:, 0], vue.segments[:, 2])
+    for k, fenetre in enumerate(fenetres):
+        pdf.add_page()
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, f"3. Vue d'Ensemble - Feuille {k + 1}/{len(fenetres)}", 0, 1, 'L')
+        pdf.set_draw_color(0,0,0)
+        pdf.set_line_width(0.3)
+        selection = (x_fin >= fenetre.x) & (x_debut <= fenetre.x + fenetre.largeur)
+        with pdf.rect_clip(zone_x, zone_y - 5, fenetre.largeur * scale, zone_hauteur + 10):
+            dessiner_segments_vue(pdf, vue, zone_x - fenetre.x * scale, zone_y - fenetre.y * scale, scale, selection)
+
+def dessiner_page_1(pdf: FPDF, data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None):
     pdf.add_page()
     
     # 1. Cartouche
@@ -265,15 +376,15 @@ def dessiner_page_1(pdf: FPDF, data: Dict[str, Any]):
     pdf.ln(10)
     
     # 3. Vue d'ensemble
-    dessiner_vue_ensemble(pdf, data)
+    dessiner_vue_ensemble(pdf, data, geometrie)
 
-def dessiner_page_morceau(pdf: FPDF, morceau: Dict[str, Any], all_data: Dict[str, Any], repetition: int):
+def dessiner_entete_morceau(pdf: FPDF, morceau: Dict[str, Any], all_data: Dict[str, Any], repetition: int, feuille: str = ""):
     pdf.add_page()
     angle_deg = morceau['angle']
     titre = f"Detail du Morceau (Angle: {angle_deg}°)"
     if repetition > 1:
         titre += f" - (Quantite: {repetition})"
-    pdf.set_font('Arial', 'B', 12); pdf.cell(0, 8, sanitize_text(titre), 0, 1, 'C')
+    pdf.set_font('Arial', 'B', 12); pdf.cell(0, 8, sanitize_text(titre + feuille), 0, 1, 'C')
     
     barreaux_info_parts = []
     if all_data['remplissage_type'] == 'barreaudage_vertical':
@@ -291,130 +402,103 @@ def dessiner_page_morceau(pdf: FPDF, morceau: Dict[str, Any], all_data: Dict[str
     
     pdf.ln(5)
 
-    angle_rad = math.radians(angle_deg)
-    cos_angle, sin_angle = math.cos(angle_rad), math.sin(angle_rad)
-    longueur_rampante_totale = morceau['longueur_totale']
-    longueur_horizontale_totale = longueur_rampante_totale * cos_angle
-    denivele_total = longueur_rampante_totale * sin_angle
+def dessiner_legende_morceau(pdf: FPDF, all_data: Dict[str, Any]):
+    draw_annotation(pdf, 20, 20, "Poteau:", all_data['poteau_dims'], COLORS["poteau"], align='L')
+    draw_annotation(pdf, 20, 25, "Liaison:", all_data['liaison_dims'], COLORS["liaison"], align='L')
+    draw_annotation(pdf, 20, 30, "Barreau:", all_data['barreau_dims'], COLORS["barreau"], align='L')
+    draw_annotation(pdf, pdf.w - 20, 20, "Lisse Haute:", all_data['lissehaute_dims'], COLORS["lisse"], align='R')
+    draw_annotation(pdf, pdf.w - 20, 25, "Lisse Basse:", all_data['lissebasse_dims'], COLORS["lisse"], align='R')
+
+def fenetres_morceau(geometrie: GeometrieMorceau, hauteur_totale: float, largeur_page: float, hauteur_page: float) -> Tuple[float, Optional[List[Fenetre]]]:
+    """
+    Échelle du dessin d'un morceau et, s'il est trop long pour rester lisible sur une page,
+    les fenêtres à dessiner sur des feuilles successives (une page par fenêtre) ; sinon None.
+    """
+    margin_x, margin_y_top, margin_y_bottom = MARGES_MORCEAU
+    drawing_width = largeur_page - 2 * margin_x
+    drawing_height = hauteur_page - margin_y_top - margin_y_bottom
+    longueur_horizontale_totale = geometrie.longueur_horizontale
+    scale = min(drawing_width / longueur_horizontale_totale, drawing_height / (hauteur_totale + abs(geometrie.denivele))) if longueur_horizontale_totale > 0 else 1
+    if scale >= ECHELLE_MIN_MORCEAU:
+        return scale, None
+    # Morceau trop long : découpage en fenêtres qui suivent la pente
+    fenetres = decouper_chemin(segments_chemin(geometrie.points_cles), 0, hauteur_totale, drawing_width / ECHELLE_MIN_MORCEAU, drawing_height / ECHELLE_MIN_MORCEAU)
+    return min(ECHELLE_MIN_MORCEAU, drawing_height / max(fenetre.hauteur for fenetre in fenetres)), fenetres
+
+def dessiner_page_morceau(pdf: FPDF, morceau: Dict[str, Any], all_data: Dict[str, Any], repetition: int, geometrie: Optional[GeometrieMorceau] = None):
+    geometrie = geometrie or calculer_geometrie_morceau(morceau, all_data, profils_du_plan(all_data))
+    longueur_horizontale_totale = geometrie.longueur_horizontale
+    denivele_total = geometrie.denivele
     hauteur_totale = all_data['hauteur_totale']
 
-    margin_x, margin_y_top, margin_y_bottom = 20, 40, 65
+    margin_x, margin_y_top, margin_y_bottom = MARGES_MORCEAU
     drawing_width = pdf.w - 2 * margin_x
     drawing_height = pdf.h - margin_y_top - margin_y_bottom
-    scale = min(drawing_width / longueur_horizontale_totale, drawing_height / (hauteur_totale + abs(denivele_total))) if longueur_horizontale_totale > 0 else 1
-    
-    origine_x = (pdf.w - longueur_horizontale_totale * scale) / 2
-    origine_y = margin_y_top + (hauteur_totale + max(0, denivele_total)) * scale
-    
+    scale, fenetres = fenetres_morceau(geometrie, hauteur_totale, pdf.w, pdf.h)
+
+    if fenetres is None:
+        dessiner_entete_morceau(pdf, morceau, all_data, repetition)
+        origine_x = (pdf.w - longueur_horizontale_totale * scale) / 2
+        origine_y = margin_y_top + (hauteur_totale + max(0, denivele_total)) * scale
+        dessiner_morceau(pdf, geometrie, all_data, origine_x, origine_y, scale)
+        dessiner_legende_morceau(pdf, all_data)
+        return
+
+    for k, fenetre in enumerate(fenetres):
+        dessiner_entete_morceau(pdf, morceau, all_data, repetition, f" - Feuille {k + 1}/{len(fenetres)}")
+        origine_x = margin_x - fenetre.x * scale
+        origine_y = margin_y_top + (fenetre.y + fenetre.hauteur) * scale
+        # La première feuille garde la place des cotes de hauteur, à gauche du dessin
+        clip_x = 0 if k == 0 else margin_x
+        with pdf.rect_clip(clip_x, margin_y_top - 5, margin_x + drawing_width - clip_x, pdf.h - margin_y_top - 15):
+            dessiner_morceau(pdf, geometrie, all_data, origine_x, origine_y, scale, cotes_hauteur=(k == 0))
+        dessiner_legende_morceau(pdf, all_data)
+
+def dessiner_morceau(pdf: FPDF, geometrie: GeometrieMorceau, all_data: Dict[str, Any], origine_x: float, origine_y: float, scale: float, cotes_hauteur: bool = True):
+    """Dessine la géométrie et les cotes d'un morceau ; `origine_*` place son origine sur la page (y vers le bas)."""
+    longueur_rampante_totale = geometrie.longueur_totale
+    denivele_total = geometrie.denivele
+    hauteur_totale = all_data['hauteur_totale']
     pdf.set_line_width(0.3)
-    
-    key_points = []
-    x_cursor_horiz, y_cursor_vert = 0.0, 0.0
-    
-    structure_items = [item for item in morceau['structure'] if item.get('type') != 'rien']
-    dims_map_visuel = {"poteau": get_deduction_dimension(all_data['poteau_dims']), "liaison": get_deduction_dimension(all_data['liaison_dims']), "barreau": get_deduction_dimension(all_data['barreau_dims'])}
-    dims_map_epaisseur = {"lissehaute": get_thickness_dimension(all_data['lissehaute_dims']), "lissebasse": get_thickness_dimension(all_data['lissebasse_dims'])}
-    
-    section_details_iterator = iter(morceau['sections_details'])
-    for item in structure_items:
-        key_points.append({'x': x_cursor_horiz, 'y': y_cursor_vert, 'type': item['type']})
-        item_type = item['type']
-        ep_visuelle = dims_map_visuel.get(item_type, 0)
-        
-        if item_type in ['poteau', 'liaison']:
-            pdf.set_draw_color(*COLORS[item_type])
-            pdf.rect(origine_x + x_cursor_horiz * scale, origine_y - (y_cursor_vert + hauteur_totale) * scale, ep_visuelle * scale, hauteur_totale * scale, 'D')
-            x_cursor_horiz += ep_visuelle
-        elif item_type == 'section':
-            section = next(section_details_iterator)
-            longueur_rampante_libre = section['longueur_libre']
-            longueur_horiz_libre = longueur_rampante_libre * cos_angle
-            denivele_section = longueur_rampante_libre * sin_angle
-            start_x, start_y = x_cursor_horiz, y_cursor_vert
-            end_x, end_y = start_x + longueur_horiz_libre, start_y + denivele_section
-            lisse_haute_ep, lisse_basse_ep = dims_map_epaisseur['lissehaute'], dims_map_epaisseur['lissebasse']
+
+    # Émission des primitives précalculées, dans l'ordre de la structure (repère page : y vers le bas)
+    poteaux, lisses, barreaux, barreaux_horizontaux = (geometrie.poteaux.tolist(), geometrie.lisses.tolist(), geometrie.barreaux.tolist(), geometrie.barreaux_horizontaux.tolist())
+    nb_horizontaux = geometrie.nb_barreaux_horizontaux
+    i_poteau = i_section = i_barreau = 0
+    for code in geometrie.codes.tolist():
+        if code == TYPE_POTEAU or code == TYPE_LIAISON:
+            x, y, ep_visuelle, hauteur = poteaux[i_poteau]; i_poteau += 1
+            pdf.set_draw_color(*COLORS[NOMS_TYPES[code]])
+            pdf.rect(origine_x + x * scale, origine_y - (y + hauteur) * scale, ep_visuelle * scale, hauteur * scale, 'D')
+        elif code == TYPE_SECTION:
             pdf.set_draw_color(*COLORS["lisse"])
-            lh_p1 = (origine_x + start_x * scale, origine_y - (start_y + hauteur_totale) * scale); lh_p2 = (origine_x + end_x * scale, origine_y - (end_y + hauteur_totale) * scale); lh_p3 = (origine_x + end_x * scale, origine_y - (end_y + hauteur_totale - lisse_haute_ep) * scale); lh_p4 = (origine_x + start_x * scale, origine_y - (start_y + hauteur_totale - lisse_haute_ep) * scale)
-            pdf.polygon([lh_p1, lh_p2, lh_p3, lh_p4], style='D')
-            lb_p1 = (origine_x + start_x * scale, origine_y - (start_y + all_data['hauteur_lisse_basse'] + lisse_basse_ep) * scale); lb_p2 = (origine_x + end_x * scale, origine_y - (end_y + all_data['hauteur_lisse_basse'] + lisse_basse_ep) * scale); lb_p3 = (origine_x + end_x * scale, origine_y - (end_y + all_data['hauteur_lisse_basse']) * scale); lb_p4 = (origine_x + start_x * scale, origine_y - (start_y + all_data['hauteur_lisse_basse']) * scale)
-            pdf.polygon([lb_p1, lb_p2, lb_p3, lb_p4], style='D')
+            for x0, x1, y0_bas, y0_haut, y1_bas, y1_haut in lisses[2 * i_section:2 * i_section + 2]:
+                pdf.polygon([(origine_x + x0 * scale, origine_y - y0_haut * scale), (origine_x + x1 * scale, origine_y - y1_haut * scale), (origine_x + x1 * scale, origine_y - y1_bas * scale), (origine_x + x0 * scale, origine_y - y0_bas * scale)], style='D')
             
-            if all_data['remplissage_type'] == 'barreaudage_vertical' and section['nombre_barreaux'] > 0:
+            nombre_barreaux = geometrie.barreaux_par_section[i_section]
+            if all_data['remplissage_type'] == 'barreaudage_vertical' and nombre_barreaux > 0:
                 pdf.set_draw_color(*COLORS["barreau"])
-                barreau_ep_visuel = dims_map_visuel.get('barreau', 0)
-                hauteur_barreau = hauteur_totale - all_data['hauteur_lisse_basse'] - lisse_haute_ep - lisse_basse_ep
-                for k in range(section['nombre_barreaux']):
-                    pos_rampe = section['jeu_depart_mm'] + k * (section['vide_entre_barreaux_mm'] + get_deduction_dimension(all_data['barreau_dims']))
-                    pos_horiz, pos_vert_denivele = pos_rampe * cos_angle, pos_rampe * sin_angle
-                    x_barreau = origine_x + (start_x + pos_horiz) * scale
-                    y_barreau_top = origine_y - (start_y + pos_vert_denivele + all_data['hauteur_lisse_basse'] + lisse_basse_ep + hauteur_barreau) * scale
-                    pdf.rect(x_barreau, y_barreau_top, barreau_ep_visuel * scale, hauteur_barreau * scale, 'D')
+                for x, y_bas, ep_visuelle, hauteur in barreaux[i_barreau:i_barreau + nombre_barreaux]:
+                    pdf.rect(origine_x + x * scale, origine_y - (y_bas + hauteur) * scale, ep_visuelle * scale, hauteur * scale, 'D')
             
-            elif all_data['remplissage_type'] == 'barreaudage_horizontal' and all_data.get('remplissage_details'):
-                details = all_data['remplissage_details']
-                if details['nombre_barreaux'] > 0:
-                    pdf.set_draw_color(*COLORS["barreau"])
-                    barreau_ep_visuel = get_thickness_dimension(all_data['barreau_dims'])
-                    for k in range(details['nombre_barreaux']):
-                        y_pos = details['jeu_depart_mm'] + k * (details['vide_entre_barreaux_mm'] + barreau_ep_visuel)
-                        p1 = (origine_x + start_x * scale, origine_y - (start_y + all_data['hauteur_lisse_basse'] + lisse_basse_ep + y_pos) * scale)
-                        p2 = (origine_x + end_x * scale, origine_y - (end_y + all_data['hauteur_lisse_basse'] + lisse_basse_ep + y_pos) * scale)
-                        pdf.line(p1[0], p1[1], p2[0], p2[1])
-
-            x_cursor_horiz, y_cursor_vert = end_x, end_y
-    key_points.append({'x': x_cursor_horiz, 'y': y_cursor_vert, 'type': 'fin'})
-
-    draw_vertical_dim(pdf, origine_x - 5, origine_y - (denivele_total if denivele_total < 0 else 0) * scale, hauteur_totale * scale, str(hauteur_totale))
-    draw_vertical_dim(pdf, origine_x - 15, origine_y, all_data['hauteur_lisse_basse'] * scale, str(all_data['hauteur_lisse_basse']))
+            elif all_data['remplissage_type'] == 'barreaudage_horizontal' and nb_horizontaux > 0:
+                pdf.set_draw_color(*COLORS["barreau"])
+                for x0, y0, x1, y1 in barreaux_horizontaux[i_section * nb_horizontaux:(i_section + 1) * nb_horizontaux]:
+                    pdf.line(origine_x + x0 * scale, origine_y - y0 * scale, origine_x + x1 * scale, origine_y - y1 * scale)
+
+            i_barreau += nombre_barreaux
+            i_section += 1
+
+    if cotes_hauteur:
+        draw_vertical_dim(pdf, origine_x - 5, origine_y - (denivele_total if denivele_total < 0 else 0) * scale, hauteur_totale * scale, str(hauteur_totale))
+        draw_vertical_dim(pdf, origine_x - 15, origine_y, all_data['hauteur_lisse_basse'] * scale, str(all_data['hauteur_lisse_basse']))
     
-    p1_total_x = origine_x + key_points[0]['x'] * scale; p1_total_y = origine_y - key_points[0]['y'] * scale
-    p2_total_x = origine_x + key_points[-1]['x'] * scale; p2_total_y = origine_y - key_points[-1]['y'] * scale
-    draw_aligned_dim(pdf, p1_total_x, p1_total_y, p2_total_x, p2_total_y, f"L. Totale: {longueur_rampante_totale:.0f}", 35, color=COLORS["cote_total"])
-
-    section_details_iterator_dim = iter(morceau['sections_details'])
-    for i in range(len(structure_items)):
-        if structure_items[i]['type'] == 'section':
-            section = next(section_details_iterator_dim)
-            
-            elem_gauche = structure_items[i-1]
-            elem_droit = structure_items[i+1]
-            
-            is_gauche_extremite = (i-1 == 0)
-            is_droit_extremite = (i+1 == len(structure_items) - 1)
-            
-            ep_gauche = dims_map_visuel.get(elem_gauche['type'], 0)
-            ep_droit = dims_map_visuel.get(elem_droit['type'], 0)
-            
-            pt_gauche = key_points[i-1]
-            pt_droit = key_points[i+1]
-            
-            offset_gauche = 0 if is_gauche_extremite else ep_gauche / 2
-            offset_droit = ep_droit if is_droit_extremite else ep_droit / 2
-            
-            p1_sec_x_virtuel = pt_gauche['x'] + offset_gauche
-            p1_sec_y_virtuel = pt_gauche['y'] + offset_gauche * sin_angle
-            
-            p2_sec_x_virtuel = pt_droit['x'] + offset_droit
-            p2_sec_y_virtuel = pt_droit['y'] + offset_droit * sin_angle
-            
-            p1_sec_x = origine_x + p1_sec_x_virtuel * scale
-            p1_sec_y = origine_y - p1_sec_y_virtuel * scale
-            p2_sec_x = origine_x + p2_sec_x_virtuel * scale
-            p2_sec_y = origine_y - p2_sec_y_virtuel * scale
-            draw_aligned_dim(pdf, p1_sec_x, p1_sec_y, p2_sec_x, p2_sec_y, f"Section: {section['longueur_section']:.0f}", 15, color=COLORS["cote_section"])
-
-            pt_debut_vide = key_points[i]
-            p1_vide_x = origine_x + pt_debut_vide['x'] * scale
-            p1_vide_y = origine_y - pt_debut_vide['y'] * scale
-            p2_vide_x = origine_x + pt_droit['x'] * scale
-            p2_vide_y = origine_y - pt_droit['y'] * scale
-            draw_aligned_dim(pdf, p1_vide_x, p1_vide_y, p2_vide_x, p2_vide_y, f"Vide: {section['longueur_libre']:.0f}", 25, color=COLORS["cote_vide"])
-            
-    draw_annotation(pdf, 20, 20, "Poteau:", all_data['poteau_dims'], COLORS["poteau"], align='L')
-    draw_annotation(pdf, 20, 25, "Liaison:", all_data['liaison_dims'], COLORS["liaison"], align='L')
-    draw_annotation(pdf, 20, 30, "Barreau:", all_data['barreau_dims'], COLORS["barreau"], align='L')
-    draw_annotation(pdf, pdf.w - 20, 20, "Lisse Haute:", all_data['lissehaute_dims'], COLORS["lisse"], align='R')
-    draw_annotation(pdf, pdf.w - 20, 25, "Lisse Basse:", all_data['lissebasse_dims'], COLORS["lisse"], align='R')
+    (x_debut, y_debut), (x_fin, y_fin) = geometrie.points_cles[0].tolist(), geometrie.points_cles[-1].tolist()
+    draw_aligned_dim(pdf, origine_x + x_debut * scale, origine_y - y_debut * scale, origine_x + x_fin * scale, origine_y - y_fin * scale, f"L. Totale: {longueur_rampante_totale:.0f}", 35, color=COLORS["cote_total"])
+
+    for section, (x1_sec, y1_sec, x2_sec, y2_sec, x1_vide, y1_vide, x2_vide, y2_vide) in zip(geometrie.sections_details, geometrie.cotes_sections.tolist()):
+        draw_aligned_dim(pdf, origine_x + x1_sec * scale, origine_y - y1_sec * scale, origine_x + x2_sec * scale, origine_y - y2_sec * scale, f"Section: {section['longueur_section']:.0f}", 15, color=COLORS["cote_section"])
+        draw_aligned_dim(pdf, origine_x + x1_vide * scale, origine_y - y1_vide * scale, origine_x + x2_vide * scale, origine_y - y2_vide * scale, f"Vide: {section['longueur_libre']:.0f}", 25, color=COLORS["cote_vide"])
 
 def dessiner_page_platine(pdf: FPDF, platine: Dict[str, Any], poteau_dims: str):
     pdf.add_page()
@@ -422,7 +506,7 @@ def dessiner_page_platine(pdf: FPDF, platine: Dict[str, Any], poteau_dims: str):
     pdf.set_font('Arial', 'BU', 10); pdf.cell(0, 10, 'Vue de dessus', 0, 1, 'C'); pdf.ln(5)
     p_l, p_w = platine['longueur'], platine['largeur']; center_x, center_y = pdf.w / 2, 80
     pdf.set_draw_color(*COLORS['platine']); pdf.set_line_width(0.5); pdf.rect(center_x - p_l / 2, center_y - p_w / 2, p_l, p_w)
-    po_l, po_w = get_thickness_dimension(poteau_dims), get_deduction_dimension(poteau_dims)
+    poteau = parse_profil(poteau_dims); po_l, po_w = poteau.epaisseur, poteau.deduction
     pdf.set_draw_color(*COLORS['poteau']); pdf.set_line_width(0.3); pdf.rect(center_x - po_l / 2, center_y - po_w / 2, po_l, po_w)
     e_l, e_w, trou_d = platine['entraxe_longueur'], platine['entraxe_largeur'], platine['diametre_trous']
     pdf.set_draw_color(0,0,0); pdf.set_line_width(0.2)
@@ -0,0 +1,178 @@
+# extraction.py
+# Extraction par règles (expressions régulières) des champs du formulaire à partir d'une description
+# au format habituel, par exemple « garde-corps de 7m en 2 morceaux, poteaux 40x40, barreaux 20x20,
+# écart 110 ». Les désignations de profilés sont lues comme partout ailleurs (profils.parse_profil).
+# La confiance est la part des nombres de la description expliqués par les règles : /api/parse-text
+# n'appelle le modèle que si elle est insuffisante ou si un champ évoqué n'a pas pu être résolu.
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from .profils import parse_profil
+
+NOMBRE = r"\d+(?:\.\d+)?"
+MOTIF_NOMBRE = re.compile(NOMBRE)
+# Désignation de profilé : au moins deux dimensions ("40x40", "Plat 50x8"), ou un rond ("Ø20", "Ø42.4x2")
+PROFIL = rf"(?:ø\s*{NOMBRE}(?:\s*x\s*{NOMBRE})?|(?:plat\s+)?{NOMBRE}(?:\s*x\s*{NOMBRE}){{1,2}})"
+UNITES_MM = {None: 1, "mm": 1, "cm": 10, "m": 1000}
+# Hauteur sans unité : « hauteur 1,10 » est en mètres, « hauteur 110 » en centimètres, au-delà en millimètres
+HAUTEUR_MAX_SANS_UNITE = (("m", 10), ("cm", 300))
+# Écart admis entre la longueur totale et la somme des longueurs de morceaux annoncées
+TOLERANCE_LONGUEUR_MM = 10
+NOMBRES_EN_LETTRES = {"un": 1, "une": 1, "deux": 2, "trois": 3, "quatre": 4, "cinq": 5, "six": 6, "sept": 7, "huit": 8, "neuf": 9, "dix": 10}
+EFFECTIF = rf"(?:\d+|{'|'.join(NOMBRES_EN_LETTRES)})"
+
+# Éléments et champs `<nom>_dims` qu'ils renseignent (les lisses sans précision renseignent les deux)
+ELEMENTS_PROFILES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    (r"lisses?\s+hautes?", ("lissehaute_dims",)),
+    (r"lisses?\s+basses?", ("lissebasse_dims",)),
+    (r"lisses?(?!\s+(?:hautes?|basses?))", ("lissehaute_dims", "lissebasse_dims")),
+    (r"poteaux?", ("poteau_dims",)),
+    (r"liaisons?", ("liaison_dims",)),
+    (r"barreaux?", ("barreau_dims",)),
+)
+# Mots qui signalent qu'un champ est évoqué dans la description : s'il n'est pas résolu, le modèle est appelé
+MOTS_CHAMPS = {
+    "nom_client": r"\bclient", "date_chantier": r"\bdate\b", "titre_plan": r"\btitre\b",
+    "hauteur_totale": r"\bhaut(?:eur)?\b", "ecart_barreaux": r"\b(?:[ée]cart|espacement)",
+    "poteau_dims": r"\bpoteau", "liaison_dims": r"\bliaison", "barreau_dims": r"\bbarreau(?:x|dage)?\b(?!\s+(?:vertical|horizontal))",
+    "lissehaute_dims": r"\blisses?\b(?!\s+basse)", "lissebasse_dims": r"\blisses?\b(?!\s+haute)",
+    "nombre_morceaux": r"\b(?:morceau|tron[çc]on)", "morceaux": r"\b(?:longueur|sections?)\b",
+}
+
+
+@dataclass
+class Extraction:
+    """Champs de ParsedFormData résolus par les règles, confiance (0 à 1) et champs évoqués mais non résolus."""
+    champs: Dict[str, Any]
+    confiance: float
+    non_resolus: List[str] = field(default_factory=list)
+
+    def suffisante(self, seuil: float) -> bool:
+        """Le formulaire peut être renvoyé sans appel au modèle."""
+        return bool(self.champs) and self.confiance >= seuil and not self.non_resolus
+
+
+class _Lecteur:
+    """Recherches successives dans le texte ; un passage déjà expliqué par une règle n'est pas relu."""
+
+    def __init__(self, texte: str):
+        self.texte = texte
+        self.lus: List[Tuple[int, int]] = []
+
+    def chercher(self, motif: str) -> Optional[re.Match]:
+        for correspondance in re.finditer(motif, self.texte, re.IGNORECASE):
+            debut, fin = correspondance.span()
+            if not any(debut < f and d < fin for d, f in self.lus):
+                self.lus.append((debut, fin))
+                return correspondance
+        return None
+
+    def part_expliquee(self) -> float:
+        """Part des nombres du texte situés dans un passage lu (0 s'il n'y a aucun nombre)."""
+        nombres = [m.span() for m in MOTIF_NOMBRE.finditer(self.texte)]
+        if not nombres:
+            return 0.0
+        expliques = sum(any(d <= debut and fin <= f for d, f in self.lus) for debut, fin in nombres)
+        return expliques / len(nombres)
+
+
+def _mm(valeur: str, unite: Optional[str]) -> float:
+    return float(valeur) * UNITES_MM[unite.lower() if unite else None]
+
+def _hauteur_mm(valeur: str, unite: Optional[str]) -> float:
+    """Hauteur en millimètres ; sans unité, celle-ci est déduite de l'ordre de grandeur de la valeur."""
+    if not unite:
+        unite = next((u for u, maximum in HAUTEUR_MAX_SANS_UNITE if float(valeur) < maximum), "mm")
+    return _mm(valeur, unite)
+
+def _effectif(mot: str) -> int:
+    return int(mot) if mot.isdigit() else NOMBRES_EN_LETTRES[mot.lower()]
+
+def designation_profil(texte: str) -> Optional[str]:
+    """Désignation normalisée ("40x40", "Ø42.4x2", "Plat 50x8") d'un profilé lu dans une description."""
+    profil = parse_profil(re.sub(r"\s+", "", texte.lower()).replace("plat", "plat "))
+    if not profil.dimensions:
+        return None
+    dimensions = "x".join(f"{d:g}" for d in profil.dimensions)
+    return {"rond": f"Ø{dimensions}", "plat": f"Plat {dimensions}"}.get(profil.forme, dimensions)
+
+def construire_morceaux(longueur_morceau: float, nombre: int, sections: int, angle: float) -> List[Dict[str, Any]]:
+    """Morceaux droits ou rampants de sections égales, entre deux poteaux, les sections reliées par des liaisons."""
+    structure: List[Dict[str, Any]] = [{"type": "poteau"}]
+    for s in range(sections):
+        structure.append({"type": "section", "longueur": round(longueur_morceau / sections, 1)})
+        structure.append({"type": "poteau" if s == sections - 1 else "liaison"})
+    return [{"nombre_sections": sections, "structure": [dict(item) for item in structure], "angle": angle} for _ in range(nombre)]
+
+
+def extraire_formulaire(description: str) -> Extraction:
+    """Applique les règles à la description et retourne les champs résolus avec leur confiance."""
+    # Virgule décimale et signe de multiplication : « 1,10 m », « 40×40 »
+    texte = re.sub(r"(?<=\d),(?=\d)", ".", description).replace("×", "x").replace("*", "x")
+    lecteur = _Lecteur(texte)
+    champs: Dict[str, Any] = {}
+
+    m = lecteur.chercher(r"\b(?:titre|projet|chantier)\s*:\s*(?P<titre>[^,;\n]+)")
+    if m:
+        champs["titre_plan"] = m["titre"].strip()
+    m = lecteur.chercher(r"\bclient\s*(?::|=)?\s*(?P<nom>[^,;\n]+)") or lecteur.chercher(r"\bpour\s+(?:m\.|mr\.?|mme|monsieur|madame)\s*(?P<nom>[^\W\d_][\w'-]*)")
+    if m:
+        champs["nom_client"] = m["nom"].strip()
+    m = lecteur.chercher(r"\b(?P<j>\d{1,2})[/.-](?P<m>\d{1,2})[/.-](?P<a>\d{4})\b") or lecteur.chercher(r"\b(?P<a>\d{4})-(?P<m>\d{1,2})-(?P<j>\d{1,2})\b")
+    if m:
+        try:
+            champs["date_chantier"] = date(int(m["a"]), int(m["m"]), int(m["j"])).isoformat()
+        except ValueError:
+            pass
+
+    for element, noms_champs in ELEMENTS_PROFILES:
+        m = lecteur.chercher(rf"\b{element}\s*(?:en\s+|de\s+|:\s*)?(?P<profil>{PROFIL})")
+        if m and designation_profil(m["profil"]):
+            for nom in noms_champs:
+                champs.setdefault(nom, designation_profil(m["profil"]))
+
+    m = lecteur.chercher(rf"\b(?:[ée]cart(?:ement)?|espacement)(?:\s+(?:des|entre(?:\s+les)?)\s+barreaux)?\s*(?:de\s+|:\s*|=\s*)?(?P<n>{NOMBRE})\s*(?P<u>mm|cm)?\b")
+    if m:
+        champs["ecart_barreaux"] = round(_mm(m["n"], m["u"]))
+    m = (lecteur.chercher(rf"\b(?:hauteur\s+(?:de\s+(?:la\s+)?)?lisse\s+basse|lisse\s+basse\s+(?:à|a))\s*(?:de\s+|:\s*|=\s*)?(?P<n>{NOMBRE})\s*(?P<u>mm|cm|m)?\b"))
+    if m:
+        champs["hauteur_lisse_basse"] = round(_hauteur_mm(m["n"], m["u"]))
+    m = (lecteur.chercher(rf"\b(?:hauteur(?:\s+totale)?|h)\s*(?:de\s+|:\s*|=\s*)?(?P<n>{NOMBRE})\s*(?P<u>mm|cm|m)?\b")
+         or lecteur.chercher(rf"\b(?P<n>{NOMBRE})\s*(?P<u>mm|cm|m)\s+de\s+haut(?:eur)?\b"))
+    if m:
+        champs["hauteur_totale"] = round(_hauteur_mm(m["n"], m["u"]))
+
+    # Découpage : nombre de morceaux (et longueur de chacun), sections par morceau, longueur totale, angle
+    longueur_morceau = None
+    m = lecteur.chercher(rf"\b(?:en\s+)?(?:un\s+seul|(?P<n>{EFFECTIF}))\s+(?:morceaux?|tron[çc]ons?|parties)(?:\s+de\s+(?P<l>{NOMBRE})\s*(?P<u>mm|cm|m)\b)?")
+    if m:
+        champs["nombre_morceaux"] = _effectif(m["n"]) if m["n"] else 1
+        if m["l"]:
+            longueur_morceau = _mm(m["l"], m["u"])
+    m = lecteur.chercher(r"\b(?:identiques?|tous\s+pareils)\b")
+    if m:
+        champs["morceaux_identiques"] = "oui"
+    m = lecteur.chercher(rf"\b(?P<n>{EFFECTIF})\s+sections?\b")
+    sections = _effectif(m["n"]) if m else 1
+    m = lecteur.chercher(rf"\b(?:longueur(?:\s+totale)?\s*(?:de\s+|:\s*|=\s*)?|de\s+)(?P<l>{NOMBRE})\s*(?P<u>mm|cm|m)\b")
+    longueurs_incoherentes = False
+    if m and longueur_morceau is None:
+        longueur_morceau = _mm(m["l"], m["u"]) / champs.get("nombre_morceaux", 1)
+    elif m:
+        # « de 7m en 2 morceaux de 3m » : ni la longueur totale ni celle des morceaux n'est sûre
+        longueurs_incoherentes = abs(_mm(m["l"], m["u"]) - longueur_morceau * champs["nombre_morceaux"]) > TOLERANCE_LONGUEUR_MM
+    m = lecteur.chercher(rf"\b(?P<a>{NOMBRE})\s*(?:°|degr[ée]s?)")
+    angle = float(m["a"]) if m else 0.0
+    if longueur_morceau and sections > 0 and not longueurs_incoherentes:
+        champs["morceaux"] = construire_morceaux(longueur_morceau, champs.get("nombre_morceaux", 1), sections, angle)
+        champs.setdefault("nombre_morceaux", 1)
+
+    # Sans aucune cote, la description n'est pas au format habituel : le modèle reste consulté
+    confiance = lecteur.part_expliquee()
+    non_resolus = [nom for nom, mot in MOTS_CHAMPS.items() if nom not in champs and re.search(mot, texte, re.IGNORECASE)]
+    if longueurs_incoherentes and "morceaux" not in non_resolus:
+        non_resolus.append("morceaux")
+    return Extraction(champs=champs, confiance=round(confiance, 3), non_resolus=non_resolus)
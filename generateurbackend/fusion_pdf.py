@@ -0,0 +1,172 @@
+# fusion_pdf.py
+# Assemblage en flux de documents PDF produits par fpdf2 (un document par groupe de pages).
+# Seule la structure écrite par fpdf2 est prise en charge : table xref classique, objets non
+# compressés (hors contenu des flux), arbre de pages à un seul niveau.
+
+import hashlib
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+MOTIF_STARTXREF = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+MOTIF_DEBUT_OBJET = re.compile(rb"(\d+) 0 obj\s*")
+MOTIF_DEBUT_FLUX = re.compile(rb">>\s*stream\r?\n")
+MOTIF_REFERENCE = re.compile(rb"\b(\d+) 0 R\b")
+MOTIF_PARENT = re.compile(rb"/Parent \d+ 0 R")
+MOTIF_VERSION = re.compile(rb"%PDF-(\d+\.\d+)")
+
+
+class PartiePDF:
+    """Un document fpdf2 découpé en objets : numéro -> contenu (entre `obj` et `endobj`)."""
+
+    def __init__(self, contenu: bytes):
+        self.version = MOTIF_VERSION.match(contenu).group(1).decode()
+        debut_xref = int(MOTIF_STARTXREF.search(contenu).group(1))
+        table, _, trailer = contenu[debut_xref:].partition(b"trailer")
+        positions = []
+        lignes = table.split(b"\n")[1:]
+        i = 0
+        while i < len(lignes) and lignes[i].strip():
+            premier, nombre = (int(v) for v in lignes[i].split())
+            for k, entree in enumerate(lignes[i + 1:i + 1 + nombre]):
+                position, _, etat = entree.split()[:3]
+                if etat == b"n":
+                    positions.append((int(position), premier + k))
+            i += 1 + nombre
+        positions.sort()
+
+        self.objets: Dict[int, bytes] = {}
+        for k, (position, numero) in enumerate(positions):
+            fin = positions[k + 1][0] if k + 1 < len(positions) else debut_xref
+            brut = contenu[position:fin]
+            corps = brut[MOTIF_DEBUT_OBJET.match(brut).end():].rstrip()
+            self.objets[numero] = corps[:-len(b"endobj")].rstrip() if corps.endswith(b"endobj") else corps
+
+        self.racine = self._reference(trailer, b"/Root")
+        self.info = self._reference(trailer, b"/Info")
+        self.arbre_pages = self._reference(self.objets[self.racine], b"/Pages")
+        arbre = self.objets[self.arbre_pages]
+        kids = arbre[arbre.index(b"/Kids"):]
+        self.pages = [int(n) for n in MOTIF_REFERENCE.findall(kids[:kids.index(b"]")])]
+        mediabox = re.search(rb"/MediaBox \[[^\]]*\]", arbre)
+        self.mediabox = mediabox.group(0) if mediabox else b""
+
+    @staticmethod
+    def _reference(dictionnaire: bytes, cle: bytes) -> Optional[int]:
+        trouve = re.search(re.escape(cle) + rb" (\d+) 0 R", dictionnaire)
+        return int(trouve.group(1)) if trouve else None
+
+
+class FusionPDF:
+    """
+    Assemble des documents PDF successifs en un seul, en produisant le résultat par blocs :
+    chaque partie est renumérotée et écrite dès qu'elle est fournie, seuls la table des
+    positions et le numéro de ses pages sont conservés. Les polices identiques ne sont écrites qu'une fois.
+    L'objet 1 (arbre des pages) et l'objet 2 (catalogue) sont écrits à la fin, comme le fait fpdf2.
+    """
+
+    def __init__(self):
+        self.positions: Dict[int, int] = {}
+        self.pages: List[int] = []
+        self.position = 0
+        self.prochain_numero = 3
+        self.mediabox = b""
+        self.version = self.version_entete = ""
+        self.info: Optional[bytes] = None
+        self._polices: Dict[bytes, int] = {}
+        self._empreinte = hashlib.md5()
+
+    @property
+    def nb_pages(self) -> int:
+        return len(self.pages)
+
+    def _ecrire(self, donnees: bytes) -> bytes:
+        self.position += len(donnees)
+        self._empreinte.update(donnees)
+        return donnees
+
+    def _objet(self, numero: int, corps: bytes) -> bytes:
+        self.positions[numero] = self.position
+        return self._ecrire(b"%d 0 obj\n%s\nendobj\n" % (numero, corps))
+
+    def ajouter(self, contenu: bytes) -> Iterator[bytes]:
+        """Ajoute les pages d'un document PDF et produit les blocs à écrire."""
+        partie = PartiePDF(contenu)
+        if not self.positions:
+            # L'en-tête (version et commentaire binaire) reprend celui de la première partie
+            self.version = self.version_entete = partie.version
+            self.mediabox = partie.mediabox
+            fin_entete = contenu.index(b"\n", contenu.index(b"\n") + 1) + 1
+            yield self._ecrire(contenu[:fin_entete])
+        elif partie.version > self.version:
+            self.version = partie.version
+        if self.info is None and partie.info is not None:
+            self.info = partie.objets[partie.info]
+
+        ignores = {partie.racine, partie.arbre_pages, partie.info}
+        correspondance: Dict[int, int] = {}
+        for numero, corps in partie.objets.items():
+            if numero in ignores:
+                continue
+            if corps.startswith(b"<<") and b"/Type /Font" in corps and not MOTIF_REFERENCE.search(corps):
+                if corps in self._polices:
+                    correspondance[numero] = self._polices[corps]
+                    continue
+                self._polices[corps] = self.prochain_numero
+            correspondance[numero] = self.prochain_numero
+            self.prochain_numero += 1
+
+        def renumeroter(m: re.Match) -> bytes:
+            return b"%d 0 R" % correspondance.get(int(m.group(1)), int(m.group(1)))
+
+        pages = set(partie.pages)
+        for numero, corps in partie.objets.items():
+            nouveau = correspondance.get(numero)
+            if numero in ignores or (nouveau in self.positions):
+                continue
+            flux = MOTIF_DEBUT_FLUX.search(corps)
+            dictionnaire, reste = (corps[:flux.start()], corps[flux.start():]) if flux else (corps, b"")
+            dictionnaire = MOTIF_REFERENCE.sub(renumeroter, dictionnaire)
+            if numero in pages:
+                dictionnaire = MOTIF_PARENT.sub(b"/Parent 1 0 R", dictionnaire)
+                if partie.mediabox != self.mediabox and b"/MediaBox" not in dictionnaire:
+                    dictionnaire = dictionnaire.replace(b"/Type /Page", partie.mediabox + b"\n/Type /Page", 1)
+            yield self._objet(nouveau, dictionnaire + reste)
+        self.pages += [correspondance[numero] for numero in partie.pages]
+
+    def terminer(self) -> Iterator[bytes]:
+        """Écrit l'arbre des pages, le catalogue, les métadonnées, la table xref et le trailer."""
+        if not self.pages:
+            raise ValueError("Aucune page à assembler.")
+        kids = b"\n".join(b"%d 0 R" % numero for numero in self.pages)
+        yield self._objet(1, b"<<\n/Count %d\n/Kids [%s]\n%s\n/Type /Pages\n>>" % (len(self.pages), kids, self.mediabox))
+        # Une partie d'une version plus récente que l'en-tête est signalée dans le catalogue
+        version = b"/Version /%s\n" % self.version.encode() if self.version != self.version_entete else b""
+        yield self._objet(2, b"<<\n/OpenAction [%d 0 R /FitH null]\n/PageLayout /OneColumn\n/Pages 1 0 R\n/Type /Catalog\n%s>>" % (self.pages[0], version))
+        numero_info = None
+        if self.info is not None:
+            numero_info = self.prochain_numero
+            yield self._objet(numero_info, self.info)
+        taille = max(self.positions) + 1
+
+        debut_xref = self.position
+        lignes = [b"xref", b"0 %d" % taille, b"0000000000 65535 f "]
+        for numero in range(1, taille):
+            if numero in self.positions:
+                lignes.append(b"%010d 00000 n " % self.positions[numero])
+            else:
+                lignes.append(b"0000000000 65535 f ")
+        # Identifiant déterministe : empreinte de tout ce qui a été écrit
+        identifiant = self._empreinte.hexdigest().upper().encode()
+        trailer = b"trailer\n<<\n/Size %d\n/Root 2 0 R\n" % taille
+        if numero_info is not None:
+            trailer += b"/Info %d 0 R\n" % numero_info
+        trailer += b"/ID [<%s><%s>]\n>>\nstartxref\n%d\n%%%%EOF\n" % (identifiant, identifiant, debut_xref)
+        yield b"\n".join(lignes) + b"\n" + trailer
+
+
+def fusionner_pdf(parties: Iterable[bytes]) -> Iterator[bytes]:
+    """Assemble des documents PDF dans l'ordre fourni et produit le document final par blocs."""
+    fusion = FusionPDF()
+    for contenu in parties:
+        yield from fusion.ajouter(contenu)
+    yield from fusion.terminer()
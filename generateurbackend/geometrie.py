@@ -0,0 +1,228 @@
+# geometrie.py
+
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .colonnes import TYPE_AUTRE, TYPE_LIAISON, TYPE_POTEAU, TYPE_RIEN, TYPE_SECTION, SectionsColonnes, StructureColonnes, VueMorceau
+from .metriques import etape
+from .profils import ProfileDims, profils_du_plan
+
+# Toutes les coordonnées sont en mm, y vers le haut. Chaque morceau a son propre repère
+# (origine au pied du premier élément) ; c'est à chaque moteur de rendu (PDF, DXF) d'appliquer
+# sa mise à l'échelle, son inversion d'axe ou sa translation.
+
+
+def cle_morceau(morceau: Dict[str, Any]) -> Tuple[float, str]:
+    """Clé d'identité d'un morceau : deux morceaux de même clé ont exactement le même dessin."""
+    return (morceau['angle'], json.dumps([(s.get('type'), s.get('longueur')) for s in morceau['structure']]))
+
+
+@dataclass
+class GeometrieMorceau:
+    """
+    Primitives d'un morceau, dans son repère local.
+    - codes : code de type (colonnes.TYPE_*) de chaque élément dessiné, dans l'ordre de la structure ; `elements` : leurs noms
+    - poteaux : [x, y, largeur, hauteur] (poteaux et liaisons, type dans `types_poteaux`)
+    - lisses : [x0, x1, y0_bas, y0_haut, y1_bas, y1_haut] (quadrilatère rampant ; haute puis basse pour chaque section)
+    - sections : [x0, y0, dx, dy] (partie libre de chaque section)
+    - barreaux : [x, y_bas, largeur, hauteur] (barreaudage vertical), `barreaux_par_section` pour les compter
+    - barreaux_horizontaux : [x0, y0, x1, y1], `nb_barreaux_horizontaux` par section
+    - cotes_sections : [x1, y1, x2, y2] cote de section puis [x1, y1, x2, y2] cote de vide, par section
+    - points_cles : [x, y] début de chaque élément puis fin du morceau
+    - bbox : (x_min, y_min, x_max, y_max)
+    """
+    angle: float
+    cos_angle: float
+    sin_angle: float
+    longueur_totale: float
+    longueur_horizontale: float
+    denivele: float
+    hauteur_totale: float
+    hauteur_lisse_basse: float
+    codes: np.ndarray
+    elements: List[str]
+    poteaux: np.ndarray
+    types_poteaux: List[str]
+    lisses: np.ndarray
+    sections: np.ndarray
+    sections_details: List[Dict[str, Any]]
+    barreaux: np.ndarray
+    barreaux_par_section: List[int]
+    barreaux_horizontaux: np.ndarray
+    nb_barreaux_horizontaux: int
+    cotes_sections: np.ndarray
+    points_cles: np.ndarray
+    bbox: Tuple[float, float, float, float]
+
+
+@dataclass
+class GeometrieVueEnsemble:
+    """Chemin de la vue d'ensemble : un segment [x0, y0, x1, y1] par élément, tous morceaux confondus."""
+    segments: np.ndarray
+    codes: np.ndarray
+    types: List[str]
+    angles: List[float]
+    longueurs: List[float]
+    bbox: Tuple[float, float, float, float]
+
+
+@dataclass
+class GeometriePlan:
+    """Géométrie complète d'un plan, calculée une seule fois et partagée par les rendus PDF et DXF."""
+    profils: Dict[str, ProfileDims]
+    vue_ensemble: GeometrieVueEnsemble
+    # Une entrée par morceau du plan ; les morceaux identiques partagent le même objet
+    morceaux: List[GeometrieMorceau] = field(default_factory=list)
+
+
+def _deductions(profils: Dict[str, ProfileDims]) -> np.ndarray:
+    """Épaisseur visuelle de chaque type d'élément (indexée par code, voir colonnes.py)."""
+    deductions = np.zeros(TYPE_AUTRE + 1)
+    deductions[TYPE_POTEAU], deductions[TYPE_LIAISON] = profils['poteau'].deduction, profils['liaison'].deduction
+    return deductions
+
+def _cumul(deplacements: np.ndarray) -> np.ndarray:
+    """Positions successives d'un curseur parti de 0 (sommes dans l'ordre, comme une boucle)."""
+    return np.cumsum(np.concatenate(([0.0], deplacements)))
+
+def calculer_vue_ensemble(structure: StructureColonnes, profils: Dict[str, ProfileDims]) -> GeometrieVueEnsemble:
+    """Chemin de tous les morceaux (segments et emprise), calculé sur les colonnes de la structure."""
+    deductions = _deductions(profils)
+    lignes = np.flatnonzero(structure.types != TYPE_RIEN)
+    codes = structure.types[lignes]
+    morceau_de = np.searchsorted(structure.debuts, lignes, side='right') - 1
+    # cos/sin par morceau avec `math`, pour des valeurs identiques au calcul élément par élément
+    angles = structure.angles.tolist()
+    cos_morceaux = np.array([math.cos(math.radians(a)) for a in angles]).reshape(-1)
+    sin_morceaux = np.array([math.sin(math.radians(a)) for a in angles]).reshape(-1)
+
+    est_jonction = (codes == TYPE_POTEAU) | (codes == TYPE_LIAISON)
+    longueurs = np.where(est_jonction, deductions[codes], np.nan_to_num(structure.longueurs[lignes]))
+    xs = _cumul(longueurs * cos_morceaux[morceau_de])
+    ys = _cumul(longueurs * sin_morceaux[morceau_de])
+    segments = np.column_stack([xs[:-1], ys[:-1], xs[1:], ys[1:]])
+    bbox = (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max())) if len(segments) else (0.0, 0.0, 0.0, 0.0)
+    return GeometrieVueEnsemble(
+        segments=segments, codes=codes, types=structure.noms_types(lignes),
+        angles=structure.angles[morceau_de].tolist(), longueurs=longueurs.tolist(), bbox=bbox,
+    )
+
+def calculer_geometrie_morceau(morceau: Dict[str, Any], data: Dict[str, Any], profils: Dict[str, ProfileDims],
+                               vue: Optional[VueMorceau] = None, sections: Optional[SectionsColonnes] = None) -> GeometrieMorceau:
+    """
+    Place poteaux, lisses, barreaux et points d'accroche des cotes d'un morceau.
+    `vue` et `sections` : colonnes du plan entier déjà construites (sinon, construites pour ce seul morceau).
+    """
+    if vue is None:
+        vue, sections = StructureColonnes.depuis_morceaux([morceau]).morceau(0), SectionsColonnes.depuis_morceaux([morceau])
+    hauteur_totale = data['hauteur_totale']
+    hauteur_lisse_basse = data['hauteur_lisse_basse']
+    angle_deg = vue.angle
+    angle_rad = math.radians(angle_deg)
+    cos_angle, sin_angle = math.cos(angle_rad), math.sin(angle_rad)
+    longueur_totale = morceau.get('longueur_totale', 0)
+
+    deductions = _deductions(profils)
+    lisse_haute_ep, lisse_basse_ep = profils['lissehaute'].epaisseur, profils['lissebasse'].epaisseur
+    barreau_ep = profils['barreau'].deduction
+    hauteur_barreau = hauteur_totale - hauteur_lisse_basse - lisse_haute_ep - lisse_basse_ep
+    details_horizontaux = data.get('remplissage_details') if data.get('remplissage_type') == 'barreaudage_horizontal' else None
+    nb_barreaux_horizontaux = max(details_horizontaux['nombre_barreaux'], 0) if details_horizontaux else 0
+
+    # Éléments dessinés (hors « rien ») et sections du morceau, en colonnes
+    lignes = np.flatnonzero(vue.types != TYPE_RIEN)
+    codes = vue.types[lignes]
+    debut, fin = int(sections.debuts[vue.index]), int(sections.debuts[vue.index + 1])
+    est_section = codes == TYPE_SECTION
+    nb_sections = int(np.count_nonzero(est_section))
+    if nb_sections > fin - debut:
+        raise ValueError("Le morceau compte plus de sections que de sections calculées.")
+    libres = sections.longueur_libre[debut:debut + nb_sections]
+    nombres = sections.nombre_barreaux[debut:debut + nb_sections]
+
+    # Déplacement du curseur sur chaque élément : épaisseur d'une jonction, partie libre d'une section
+    dx = np.where((codes == TYPE_POTEAU) | (codes == TYPE_LIAISON), deductions[codes], 0.0)
+    dy = np.zeros(len(codes))
+    dx[est_section], dy[est_section] = libres * cos_angle, libres * sin_angle
+    xs, ys = _cumul(dx), _cumul(dy)
+    points_cles = np.column_stack([xs, ys])
+
+    est_poteau = (codes == TYPE_POTEAU) | (codes == TYPE_LIAISON)
+    poteaux = np.column_stack([xs[:-1][est_poteau], ys[:-1][est_poteau], dx[est_poteau], np.full(int(est_poteau.sum()), float(hauteur_totale))])
+
+    start_x, start_y = xs[:-1][est_section], ys[:-1][est_section]
+    end_x, end_y = xs[1:][est_section], ys[1:][est_section]
+    sections_tableau = np.column_stack([start_x, start_y, dx[est_section], dy[est_section]])
+    lisses = np.empty((2 * nb_sections, 6))
+    lisses[0::2] = np.column_stack([start_x, end_x, start_y + hauteur_totale - lisse_haute_ep, start_y + hauteur_totale, end_y + hauteur_totale - lisse_haute_ep, end_y + hauteur_totale])
+    lisses[1::2] = np.column_stack([start_x, end_x, start_y + hauteur_lisse_basse, start_y + hauteur_lisse_basse + lisse_basse_ep, end_y + hauteur_lisse_basse, end_y + hauteur_lisse_basse + lisse_basse_ep])
+
+    # Positions de tous les barreaux du morceau en un seul calcul
+    par_section = np.maximum(nombres, 0)
+    section_de = np.repeat(np.arange(nb_sections), par_section)
+    rang = np.arange(len(section_de)) - np.repeat(np.cumsum(par_section) - par_section, par_section)
+    pas = sections.vide_entre_barreaux_mm[debut:debut + nb_sections] + barreau_ep
+    pos_rampe = sections.jeu_depart_mm[debut:debut + nb_sections][section_de] + rang * pas[section_de]
+    barreaux = np.empty((len(section_de), 4))
+    barreaux[:, 0] = start_x[section_de] + pos_rampe * cos_angle
+    barreaux[:, 1] = start_y[section_de] + pos_rampe * sin_angle + hauteur_lisse_basse + lisse_basse_ep
+    barreaux[:, 2] = barreau_ep
+    barreaux[:, 3] = hauteur_barreau
+
+    if nb_barreaux_horizontaux > 0:
+        barreau_h_ep = profils['barreau'].epaisseur
+        y_pos = details_horizontaux['jeu_depart_mm'] + np.arange(nb_barreaux_horizontaux) * (details_horizontaux['vide_entre_barreaux_mm'] + barreau_h_ep)
+        base_debut = (start_y + hauteur_lisse_basse + lisse_basse_ep)[:, None] + y_pos
+        base_fin = (end_y + hauteur_lisse_basse + lisse_basse_ep)[:, None] + y_pos
+        barreaux_horizontaux = np.stack([np.repeat(start_x, nb_barreaux_horizontaux), base_debut.ravel(), np.repeat(end_x, nb_barreaux_horizontaux), base_fin.ravel()], axis=1)
+    else:
+        barreaux_horizontaux = np.empty((0, 4))
+
+    # Points d'accroche des cotes de section (entre axes des jonctions) et de vide (entre faces)
+    i = np.flatnonzero(est_section)
+    n = len(codes)
+    ep_gauche, ep_droit = deductions[codes[i - 1]], deductions[codes[i + 1]]
+    offset_gauche = np.where(i - 1 == 0, 0.0, ep_gauche / 2)
+    offset_droit = np.where(i + 1 == n - 1, ep_droit, ep_droit / 2)
+    pt_gauche, pt_debut_vide, pt_droit = points_cles[i - 1], points_cles[i], points_cles[i + 1]
+    cotes_sections = np.column_stack([
+        pt_gauche[:, 0] + offset_gauche, pt_gauche[:, 1] + offset_gauche * sin_angle,
+        pt_droit[:, 0] + offset_droit, pt_droit[:, 1] + offset_droit * sin_angle,
+        pt_debut_vide[:, 0], pt_debut_vide[:, 1], pt_droit[:, 0], pt_droit[:, 1],
+    ]).reshape(-1, 8)
+
+    y_min = min(0.0, float(ys.min()))
+    y_max = float(ys.max()) + hauteur_totale
+    bbox = (float(xs.min()), y_min, float(xs.max()), y_max)
+
+    return GeometrieMorceau(
+        angle=angle_deg, cos_angle=cos_angle, sin_angle=sin_angle,
+        longueur_totale=longueur_totale, longueur_horizontale=longueur_totale * cos_angle, denivele=longueur_totale * sin_angle,
+        hauteur_totale=hauteur_totale, hauteur_lisse_basse=hauteur_lisse_basse,
+        codes=codes, elements=vue.noms_types(lignes),
+        poteaux=poteaux.reshape(-1, 4), types_poteaux=vue.noms_types(lignes[est_poteau]), lisses=lisses,
+        sections=sections_tableau.reshape(-1, 4), sections_details=list(morceau['sections_details']),
+        barreaux=barreaux, barreaux_par_section=par_section.tolist(),
+        barreaux_horizontaux=barreaux_horizontaux, nb_barreaux_horizontaux=nb_barreaux_horizontaux, cotes_sections=cotes_sections,
+        points_cles=points_cles, bbox=bbox,
+    )
+
+def calculer_geometrie(data: Dict[str, Any], profils: Optional[Dict[str, ProfileDims]] = None) -> GeometriePlan:
+    """Calcule une fois toute la géométrie d'un plan (`FinalPlanData.model_dump()`)."""
+    with etape("geometrie"):
+        profils = profils or profils_du_plan(data)
+        # Un seul parcours du plan pour remplir les colonnes ; tout le reste travaille dessus
+        structure = StructureColonnes.depuis_morceaux(data['morceaux'])
+        sections = SectionsColonnes.depuis_morceaux(data['morceaux'])
+        geometrie = GeometriePlan(profils=profils, vue_ensemble=calculer_vue_ensemble(structure, profils))
+        deja_calcules: Dict[tuple, GeometrieMorceau] = {}
+        for morceau, vue in zip(data['morceaux'], structure):
+            cle = vue.cle()
+            if cle not in deja_calcules:
+                deja_calcules[cle] = calculer_geometrie_morceau(morceau, data, profils, vue, sections)
+            geometrie.morceaux.append(deja_calcules[cle])
+    return geometrie
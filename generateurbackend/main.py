@@ -2,43 +2,91 @@
 # 1. SECTION DES IMPORTS
 # ===============================================
 import os
+import io
 import json
 import base64
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request, File, UploadFile, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Request, File, UploadFile, BackgroundTasks, Depends, Query
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, ValidationError
+from typing import Annotated, BinaryIO, List, Optional, Dict, Any, Tuple, Union
 import re
-import math
+import zlib
+import zipfile
+import asyncio
 from pathlib import Path
-import subprocess
+from urllib.parse import parse_qs, quote
 import tempfile
-import time
 import shutil
 
-try:
-    import google.generativeai as genai
-    from PIL import Image
-    import io
-except ImportError:
-    genai = None
-    Image = None
-    io = None
-
-from .dessin_pdf import creer_plan_pdf
-from .dessin_dxf import creer_plan_dxf
-from .utils import get_deduction_dimension, get_thickness_dimension
+from .cache_ia import cle_description, creer_cache_analyses_depuis_env
+from .cache_rendu import cle_rendu, creer_cache_depuis_env
+from .calcul import FinalPlanData, MorceauData, ProjectData, calculer_plan_et_mesurer
+from .chargement import demarrer_prechauffage
+from .client_ia import MODULE_GENAI, MODULE_IMAGE, ServiceIAError, creer_client_ia_depuis_env
+from .cotes import COTES_RENDUES, PROFILS_COTES
+from .extraction import extraire_formulaire
+from .geometrie import cle_morceau
+from .metriques import ANALYSES_TEXTE, CACHE_ANALYSES, CACHE_RENDU, OCTETS_ENVOYES, OCTETS_PRODUITS, MiddlewareMetriques, etape, fin_validation, registre
+from .plans import creer_stock_depuis_env
+from .profilage import creer_stock_profils_depuis_env, jeton_valide, profil_en_cours, profiler
+from .reponses import DECIMALES_MAX, ReponseJSON, corps_json, schema_corps
+from .rendu import ERREURS_RENDU, RenduSatureError, creer_executeur_depuis_env, rendre_pdf_par_parties, tache_batch_projet, tache_rendu_pdf, tache_rendu_pdf_fichier, tache_rendu_dxf, version_rendu
 
 # ===============================================
 # 2. CONFIGURATION INITIALE ET CHARGEMENT DES VARIABLES
 # ===============================================
 load_dotenv()
 
-app = FastAPI(title="API Garde-Corps v25 (Phase 1)", version="25.0.0")
+# Pool de processus dédié aux rendus PDF/DXF (taille: RENDU_WORKERS, file d'attente: RENDU_FILE_MAX)
+executeur_rendu = creer_executeur_depuis_env()
+# Cache disque des fichiers déjà générés (dossier: RENDU_CACHE_DIR, taille: RENDU_CACHE_MAX_MO)
+cache_rendu = creer_cache_depuis_env()
+# Plans calculés, retrouvables par leur identifiant aléatoire (nombre: PLANS_MAX, durée de vie: PLANS_TTL)
+stock_plans = creer_stock_depuis_env()
+# Grands plans, à partir de RENDU_GRAND_PLAN_MORCEAUX morceaux distincts : PDF généré page par page
+# directement dans un fichier. Avec RENDU_WORKERS_MORCEAUX > 0, ses parties (pages de chaque morceau)
+# sont dessinées en parallèle dans le pool de rendu, RENDU_WORKERS_MORCEAUX à la fois au plus, avec un
+# résultat identique au rendu en série
+RENDU_GRAND_PLAN_MORCEAUX = int(os.getenv("RENDU_GRAND_PLAN_MORCEAUX", "50"))
+RENDU_WORKERS_MORCEAUX = int(os.getenv("RENDU_WORKERS_MORCEAUX", "0"))
+# Profilage d'une requête à la demande (X-Profilage: 1), avec le jeton d'administration PROFILAGE_JETON ;
+# profils enregistrés dans PROFILAGE_DIR (PROFILAGE_MAX au plus)
+PROFILAGE_JETON = os.getenv("PROFILAGE_JETON")
+stock_profils = creer_stock_profils_depuis_env()
+# Analyses IA (parse-text, analyze-schema) : backend IA_BACKEND (gemini, local), IA_CONCURRENCE appels
+# simultanés au plus, IA_DELAI secondes par tentative, IA_TENTATIVES essais
+client_ia = creer_client_ia_depuis_env()
+# Formulaires déjà obtenus pour une description identique aux espaces et à la casse près
+# (nombre: IA_CACHE_MAX, durée de vie: IA_CACHE_TTL, base SQLite facultative: IA_CACHE_FICHIER)
+cache_analyses = creer_cache_analyses_depuis_env()
+# Descriptions au format habituel lues par règles, sans appel au modèle, si la part des cotes expliquées
+# atteint IA_REGLES_SEUIL et qu'aucun champ évoqué ne reste à résoudre (un seuil supérieur à 1 désactive les règles)
+IA_REGLES_SEUIL = float(os.getenv("IA_REGLES_SEUIL", "0.8"))
+
+# Le SDK Gemini, PIL, fpdf et ezdxf sont importés à la première requête qui en a besoin ; avec
+# PRECHAUFFAGE=1 (défaut), ils le sont en arrière-plan dès le démarrage, pendant que le serveur répond déjà
+PRECHAUFFAGE = os.getenv("PRECHAUFFAGE", "1") == "1"
+MODULES_RENDU = (f"{__package__}.dessin_pdf", f"{__package__}.dessin_dxf")
+MODULES_PRECHAUFFES = (*MODULES_RENDU, MODULE_GENAI, MODULE_IMAGE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Processus de rendu lancés dès le démarrage, avant les threads d'arrière-plan (préchauffage compris)
+    executeur_rendu.demarrer(MODULES_RENDU if PRECHAUFFAGE else ())
+    if PRECHAUFFAGE:
+        demarrer_prechauffage(MODULES_PRECHAUFFES)
+    yield
+    executeur_rendu.fermer()
+    await client_ia.fermer()
+    cache_analyses.fermer()
+
+app = FastAPI(title="API Garde-Corps v25 (Phase 1)", version="25.0.0", lifespan=lifespan, default_response_class=ReponseJSON)
 
 # Le chemin du convertisseur DWG est spécifique à Windows.
 # Il est mis en commentaire pour que le déploiement sur Render (Linux) fonctionne.
@@ -48,89 +96,17 @@ app = FastAPI(title="API Garde-Corps v25 (Phase 1)", version="25.0.0")
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # ===============================================
-# 3. MODÈLES DE DONNÉES (PYDANTIC)
+# 3. MODÈLES DE DONNÉES (PYDANTIC) ; projet et plan : voir calcul.py
 # ===============================================
-class StructureItem(BaseModel):
-    type: str
-    longueur: Optional[float] = None
-
-class MorceauData(BaseModel):
-    nombre_sections: int
-    structure: List[StructureItem]
-    angle: Optional[float] = 0.0
-
-class PlatineDetails(BaseModel):
-    longueur: float
-    largeur: float
-    epaisseur: float
-    nombre_trous: int
-    diametre_trous: float
-    entraxe_longueur: float
-    entraxe_largeur: float
-
-class ProjectData(BaseModel):
-    titre_plan: str
-    nom_client: str
-    date_chantier: str
-    hauteur_totale: int
-    hauteur_lisse_basse: int
-    poteau_dims: str
-    liaison_dims: str
-    lissehaute_dims: str
-    lissebasse_dims: str
-    barreau_dims: str
-    ecart_barreaux: int
-    type_fixation: str
-    remplissage_type: str
-    platine_dimensions: Optional[str] = None
-    platine_trous: Optional[str] = None
-    platine_entraxes: Optional[str] = None
-    nombre_morceaux: int
-    morceaux_identiques: str
-    morceaux: List[MorceauData]
-
-class NomenclatureItem(BaseModel):
-    item: str
-    details: str
-    quantite: int
-    longueur_unitaire_mm: int
-
-class SectionPlan(BaseModel):
-    longueur_section: float
-    longueur_libre: float
-    nombre_barreaux: int
-    vide_entre_barreaux_mm: float
-    jeu_depart_mm: float
-
-class MorceauPlan(BaseModel):
-    id: int
-    longueur_totale: float
-    angle: float
-    structure: List[StructureItem]
-    sections_details: List[SectionPlan]
-
-class RepartitionResult(BaseModel):
-    nombre_barreaux: int
-    vide_entre_barreaux_mm: float
-    jeu_depart_mm: float
-
-class FinalPlanData(BaseModel):
-    titre_plan: str
-    nom_client: str
-    date_chantier: str
-    description_projet: str
-    nomenclature: List[NomenclatureItem]
-    morceaux: List[MorceauPlan]
-    hauteur_totale: int
-    hauteur_lisse_basse: int
-    poteau_dims: str
-    liaison_dims: str
-    lissehaute_dims: str
-    lissebasse_dims: str
-    barreau_dims: str
-    platine_details: Optional[PlatineDetails] = None
-    remplissage_type: str
-    remplissage_details: Optional[RepartitionResult] = None
+class ReponsePlan(BaseModel):
+    """Réponse de process-data et de /api/plans/{plan_id} (schéma de la documentation, la réponse est encodée directement)."""
+    status: str
+    plan_id: str
+    data: FinalPlanData
+
+class BatchRequest(BaseModel):
+    projets: List[ProjectData]
+    formats: List[str] = ["pdf", "dxf"]
 
 class DescriptionData(BaseModel):
     description: str
@@ -159,14 +135,21 @@ class ParsedFormData(BaseModel):
 # 4. MIDDLEWARE ET GESTION DES ERREURS
 # ===============================================
 
-# Drapeau global pour suivre l'état de la configuration de l'API
-is_gemini_configured = False
-
 # Gestionnaire d'erreurs de validation personnalisé
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return JSONResponse(status_code=422, content={"detail": f"Erreur de validation: {exc.errors()}"})
 
+# Le pool de rendu est plein : on demande au client de réessayer plus tard
+@app.exception_handler(RenduSatureError)
+async def rendu_sature_handler(request: Request, exc: RenduSatureError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+# L'analyse IA a échoué (service absent, saturé, trop lent ou réponse inexploitable)
+@app.exception_handler(ServiceIAError)
+async def service_ia_handler(request: Request, exc: ServiceIAError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
 # Configuration CORS
 origins = ["http://127.0.0.1:5500", "http://localhost:5500", "null", "http://127.0.0.1:8000"]
 app.add_middleware(
@@ -175,46 +158,238 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Plan-Id"],
 )
+# Nombre et durée des requêtes par route (METRIQUES_ACTIVES=0 pour désactiver les mesures)
+app.add_middleware(MiddlewareMetriques)
+registre.jauge("garde_corps_cache_rendu_octets", "Taille totale des fichiers du cache de rendu.", lambda: {(): cache_rendu.stats()["octets"]})
+registre.jauge("garde_corps_cache_rendu_entrees", "Nombre de fichiers dans le cache de rendu.", lambda: {(): cache_rendu.stats()["entrees"]})
+registre.jauge("garde_corps_rendus_en_cours", "Rendus en cours ou en attente dans le pool de rendu.", lambda: {(): executeur_rendu.en_cours})
 
 
 # ===============================================
 # 5. FONCTIONS AUXILIAIRES
 # ===============================================
 
-def calculate_repartition(longueur_libre: float, epaisseur_barreau: float, ecart_maximal: float) -> RepartitionResult:
-    if longueur_libre <= 0 or epaisseur_barreau <= 0 or ecart_maximal <= 0:
-        return RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
-    nombre_blocs = longueur_libre / (epaisseur_barreau + ecart_maximal)
-    nombre_barreaux = math.ceil(nombre_blocs - 1)
-    if nombre_barreaux < 0:
-        nombre_barreaux = 0
-    nombre_espaces = nombre_barreaux + 1
-    if nombre_espaces == 0:
-        return RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
-    longueur_totale_barreaux = nombre_barreaux * epaisseur_barreau
-    espacement_reel = (longueur_libre - longueur_totale_barreaux) / nombre_espaces
-    if espacement_reel > (ecart_maximal + 1e-9):
-        nombre_barreaux += 1
-        nombre_espaces = nombre_barreaux + 1
-        longueur_totale_barreaux = nombre_barreaux * epaisseur_barreau
-        espacement_reel = (longueur_libre - longueur_totale_barreaux) / nombre_espaces
-    if nombre_barreaux <= 0:
-        return RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
-    return RepartitionResult(nombre_barreaux=nombre_barreaux, vide_entre_barreaux_mm=espacement_reel, jeu_depart_mm=espacement_reel)
-
-def parse_platine_data(platine_string: str) -> Optional[PlatineDetails]:
-    if not platine_string:
-        return None
+TAILLE_BLOC_REPONSE = 64 * 1024
+
+def iter_blocs(source: Union[bytes, BinaryIO]):
+    """Découpe un contenu (en mémoire ou fichier du cache déjà ouvert) en blocs pour l'envoyer progressivement."""
+    if not isinstance(source, bytes):
+        with source:
+            while bloc := source.read(TAILLE_BLOC_REPONSE):
+                yield bloc
+        return
+    vue = memoryview(source)
+    for debut in range(0, len(vue), TAILLE_BLOC_REPONSE):
+        yield bytes(vue[debut:debut + TAILLE_BLOC_REPONSE])
+
+def iter_blocs_compresses(blocs, wbits: int):
+    """Compresse le flux bloc par bloc (gzip: wbits=31, deflate: wbits=15) sans tout garder en mémoire."""
+    compresseur = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    for bloc in blocs:
+        donnees = compresseur.compress(bloc)
+        if donnees:
+            yield donnees
+    yield compresseur.flush()
+
+def choisir_encodage(accept_encoding: Optional[str]) -> Optional[str]:
+    """Retourne 'gzip' ou 'deflate' si le client l'accepte (gzip en priorité), sinon None."""
+    acceptes = set()
+    for partie in (accept_encoding or "").split(','):
+        nom, _, parametres = partie.partition(';')
+        parametres = parametres.replace(' ', '')
+        try:
+            q = float(parametres[2:]) if parametres.startswith('q=') else 1.0
+        except ValueError:
+            q = 0.0
+        if q > 0:
+            acceptes.add(nom.strip().lower())
+    for encodage in ('gzip', 'deflate'):
+        if encodage in acceptes:
+            return encodage
+    return None
+
+def content_disposition(filename: str) -> str:
+    filename_quoted = quote(filename)
+    if filename_quoted != filename:
+        return f"attachment; filename*=utf-8''{filename_quoted}"
+    return f'attachment; filename="{filename}"'
+
+def reponse_telechargement(source: Union[bytes, BinaryIO], media_type: str, filename: str, accept_encoding: Optional[str] = None, background: Optional[BackgroundTask] = None) -> StreamingResponse:
+    """
+    Renvoie un fichier généré (en mémoire ou depuis le cache) sous forme de réponse en flux.
+    Si `accept_encoding` est fourni et accepte gzip/deflate, le flux est compressé à la volée.
+    `background` est exécutée une fois la réponse envoyée (suppression d'un fichier temporaire).
+    """
+    headers = {"Content-Disposition": content_disposition(filename)}
+    encodage = choisir_encodage(accept_encoding)
+    blocs = iter_blocs(source)
+    if encodage:
+        headers["Content-Encoding"] = encodage
+        headers["Vary"] = "Accept-Encoding"
+        blocs = iter_blocs_compresses(blocs, 31 if encodage == 'gzip' else 15)
+    else:
+        taille = len(source) if isinstance(source, bytes) else os.fstat(source.fileno()).st_size
+        headers["Content-Length"] = str(taille)
+    if registre.actif:
+        blocs = iter_blocs_mesures(blocs, filename.rsplit('.', 1)[-1].lower())
+    return StreamingResponse(blocs, media_type=media_type, headers=headers, background=background)
+
+def iter_blocs_mesures(blocs, format_sortie: str):
+    """Compte les octets envoyés et mesure la durée de l'envoi en flux (étape « envoi »)."""
+    with etape("envoi"):
+        for bloc in blocs:
+            OCTETS_ENVOYES.inc(len(bloc), format=format_sortie)
+            yield bloc
+
+# Formats de sortie : tâche de rendu, type MIME, compression HTTP utile, message d'échec
+FORMATS_RENDU = {
+    "pdf": {"tache": tache_rendu_pdf, "media_type": 'application/pdf', "compressible": False, "erreur": ERREURS_RENDU["pdf"]},
+    "dxf": {"tache": tache_rendu_dxf, "media_type": 'application/vnd.dxf', "compressible": True, "erreur": ERREURS_RENDU["dxf"]},
+}
+
+class FluxZip(io.RawIOBase):
+    """Destination non « seekable » pour zipfile : les octets écrits sont récupérés au fur et à mesure."""
+
+    def __init__(self):
+        super().__init__()
+        self._tampon = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._tampon += b
+        return len(b)
+
+    def vider(self) -> bytes:
+        octets = bytes(self._tampon)
+        self._tampon.clear()
+        return octets
+
+def nom_fichier_sur(titre: str) -> str:
+    return re.sub(r'[\\/*?:"<>|]', "", titre).replace(" ", "_") or "plan"
+
+async def generer_zip_batch(projets: List[ProjectData], formats: List[str]):
+    """
+    Lance le calcul et le rendu de tous les projets en parallèle dans le pool, puis construit
+    l'archive ZIP dans l'ordre du lot en envoyant chaque entrée dès qu'elle est prête.
+    Un projet en erreur n'interrompt pas le lot : il est signalé dans `rapport.json`.
+    """
+    # Le lot se limite au nombre de workers pour laisser des places aux autres requêtes
+    limite = asyncio.Semaphore(max(1, executeur_rendu.nb_workers))
+
+    async def traiter(projet: ProjectData):
+        async with limite:
+            return await executeur_rendu.executer(tache_batch_projet, projet.model_dump(), formats, attendre=True)
+
+    taches = [asyncio.ensure_future(traiter(projet)) for projet in projets]
+    flux = FluxZip()
+    rapport = []
+    try:
+        with zipfile.ZipFile(flux, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for index, (projet, tache) in enumerate(zip(projets, taches)):
+                nom_base = f"{index + 1:03d}_{nom_fichier_sur(projet.titre_plan)}"
+                try:
+                    fichiers = await tache
+                except Exception as e:
+                    rapport.append({"index": index, "titre_plan": projet.titre_plan, "status": "error", "detail": str(e)})
+                else:
+                    noms = []
+                    for format_sortie, contenu in fichiers.items():
+                        archive.writestr(f"{nom_base}.{format_sortie}", contenu)
+                        noms.append(f"{nom_base}.{format_sortie}")
+                    rapport.append({"index": index, "titre_plan": projet.titre_plan, "status": "success", "fichiers": noms})
+                yield flux.vider()
+            archive.writestr("rapport.json", json.dumps(rapport, ensure_ascii=False, indent=2))
+        yield flux.vider()
+    finally:
+        for tache in taches:
+            tache.cancel()
+
+async def rendre_pdf_en_flux(plan: Dict[str, Any], cle: str) -> Tuple[BinaryIO, Optional[BackgroundTask]]:
+    """
+    Génère un grand plan PDF page par page dans un fichier, sans le garder en mémoire, puis l'ajoute
+    au cache. Si le cache est désactivé, le fichier temporaire est supprimé après l'envoi.
+    Le fichier est ouvert avant d'entrer dans le cache, où une éviction pourrait le supprimer.
+    """
+    chemin = await asyncio.to_thread(cache_rendu.chemin_temporaire)
+    try:
+        if RENDU_WORKERS_MORCEAUX > 0:
+            await rendre_pdf_par_parties(executeur_rendu, plan, str(chemin), RENDU_WORKERS_MORCEAUX)
+        else:
+            await executeur_rendu.executer(tache_rendu_pdf_fichier, plan, str(chemin))
+    except RenduSatureError:
+        chemin.unlink(missing_ok=True)
+        raise
+    except Exception as e:
+        chemin.unlink(missing_ok=True)
+        print(f"Erreur lors de la création du PDF : {e}")
+        raise HTTPException(status_code=500, detail=FORMATS_RENDU["pdf"]["erreur"])
+    fichier = await asyncio.to_thread(open, chemin, 'rb')
+    OCTETS_PRODUITS.inc(os.fstat(fichier.fileno()).st_size, format="pdf")
     try:
-        parts = {p.split(':')[0].strip().lower(): p.split(':')[1].strip() for p in platine_string.split('/') if ':' in p}
-        dims_part = next((p.strip() for p in platine_string.split('/') if ':' not in p), "")
-        dims = [float(d) for d in re.findall(r'(\d+\.?\d*)', dims_part)]
-        trous = [float(t) for t in re.findall(r'(\d+\.?\d*)', parts.get('trous', ''))]
-        entraxes = [float(e) for e in re.findall(r'(\d+\.?\d*)', parts.get('entraxes', ''))]
-        return PlatineDetails(longueur=dims[0], largeur=dims[1], epaisseur=dims[2], nombre_trous=int(trous[0]), diametre_trous=trous[1], entraxe_longueur=entraxes[0], entraxe_largeur=entraxes[1])
-    except (IndexError, ValueError, KeyError):
-        return None
+        adopte = await asyncio.to_thread(cache_rendu.adopter, cle, chemin)
+    except Exception as e:
+        # Le rendu a réussi : un cache en échec ne doit pas empêcher l'envoi du fichier
+        print(f"ERREUR lors de la mise en cache du rendu {cle}: {e}")
+        adopte = None
+    if adopte is None:
+        return fichier, BackgroundTask(chemin.unlink, missing_ok=True)
+    return fichier, None
+
+async def rendre_plan(plan: Dict[str, Any], format_sortie: str, accept_encoding: Optional[str] = None, cotes: str = COTES_RENDUES) -> StreamingResponse:
+    """Dessine un plan dans le format demandé (via le cache puis le pool de rendu) et renvoie le fichier en flux."""
+    rendu = FORMATS_RENDU[format_sortie]
+    version, arguments = version_rendu(format_sortie), (plan,)
+    # Profil de cotes DXF non standard : il fait partie de la clé du cache
+    if format_sortie == 'dxf' and cotes != COTES_RENDUES:
+        version, arguments = f"{version}-{cotes}", (plan, None, cotes)
+    # Empreinte de tout le plan (sérialisation + SHA-256) : calculée hors de la boucle d'événements
+    cle = await asyncio.to_thread(cle_rendu, plan, format_sortie, version)
+    # Une requête profilée refait toujours le rendu : un fichier lu dans le cache n'apprendrait rien
+    profilage = profil_en_cours() is not None
+    # Accès disque du cache dans le pool de threads ; un fichier trouvé est renvoyé déjà ouvert
+    source, nettoyage = (None if profilage else await asyncio.to_thread(cache_rendu.get, cle)), None
+    if cache_rendu.actif and not profilage:
+        CACHE_RENDU.inc(format=format_sortie, resultat="hit" if source is not None else "miss")
+    grand_plan = len({cle_morceau(m) for m in plan['morceaux']}) >= RENDU_GRAND_PLAN_MORCEAUX
+    if source is None and grand_plan and format_sortie == 'pdf':
+        source, nettoyage = await rendre_pdf_en_flux(plan, cle)
+    elif source is None:
+        source = await executeur_rendu.executer(rendu["tache"], *arguments)
+        if not source:
+            raise HTTPException(status_code=500, detail=rendu["erreur"])
+        try:
+            await asyncio.to_thread(cache_rendu.put, cle, source)
+        except Exception as e:
+            # Le rendu a réussi : un cache en échec ne doit pas empêcher l'envoi du fichier
+            print(f"ERREUR lors de la mise en cache du rendu {cle}: {e}")
+        OCTETS_PRODUITS.inc(len(source), format=format_sortie)
+    # Le DXF est du texte : il se compresse très bien si le client l'accepte
+    return reponse_telechargement(source, rendu["media_type"], f"{plan['titre_plan']}.{format_sortie}", accept_encoding if rendu["compressible"] else None, nettoyage)
+
+def get_format_rendu(format_sortie: str) -> str:
+    format_sortie = format_sortie.lower()
+    if format_sortie not in FORMATS_RENDU:
+        raise HTTPException(status_code=404, detail=f"Format inconnu: {format_sortie}. Formats possibles: pdf, dxf.")
+    return format_sortie
+
+def get_profil_cotes(cotes: str) -> str:
+    """Valide le profil de cotes DXF demandé (paramètre `cotes`)."""
+    if cotes not in PROFILS_COTES:
+        raise HTTPException(status_code=422, detail=f"Profil de cotes inconnu: {cotes}. Profils possibles: {', '.join(PROFILS_COTES)}.")
+    return cotes
+
+def demande_profilage(request: Request) -> bool:
+    """Profilage demandé (en-tête X-Profilage: 1 ou ?profilage=1) ; refusé sans jeton d'administration valide."""
+    parametres = parse_qs(request.scope.get("query_string", b"").decode("latin-1"))
+    if request.headers.get("x-profilage") != "1" and parametres.get("profilage") != ["1"]:
+        return False
+    if not jeton_valide(request.headers.get("x-profilage-jeton"), PROFILAGE_JETON):
+        raise HTTPException(status_code=403, detail="Profilage refusé : jeton d'administration absent ou invalide.")
+    return True
 
 def cleanup_temp_dir(temp_dir: str):
     try:
@@ -228,161 +403,155 @@ def cleanup_temp_dir(temp_dir: str):
 # 6. ROUTES DE L'API (ENDPOINTS)
 # ===============================================
 
-@app.post("/api/process-data")
-async def process_data(data: ProjectData):
+@app.post("/api/process-data", response_model=ReponsePlan)
+async def process_data(data: ProjectData, request: Request, decimales: Annotated[Optional[int], Query(ge=0, le=DECIMALES_MAX)] = None):
+    """Calcule le plan ; `?decimales=n` arrondit les flottants de la réponse (le plan conservé garde toute sa précision)."""
+    fin_validation()
+    profilage = demande_profilage(request)
     try:
-        final_morceaux = []
-        dims_map = {"poteau": get_deduction_dimension(data.poteau_dims), "liaison": get_deduction_dimension(data.liaison_dims)}
-        
-        if data.remplissage_type == 'barreaudage_vertical':
-            barreau_epaisseur_repartition = get_deduction_dimension(data.barreau_dims)
-        elif data.remplissage_type == 'barreaudage_horizontal':
-            barreau_epaisseur_repartition = get_thickness_dimension(data.barreau_dims)
+        if profilage:
+            # Calcul profilé hors de la boucle d'événements, comme un rendu
+            with profiler("process-data") as profil:
+                final_data = await executeur_rendu.executer(calculer_plan_et_mesurer, data)
         else:
-            barreau_epaisseur_repartition = 0
-
-        for i, morceau_data in enumerate(data.morceaux):
-            sections_details = []
-            structure_items = [item for item in morceau_data.structure if item.type != 'rien']
-            if len(structure_items) < 2: continue
-            
-            for idx, item in enumerate(structure_items):
-                if item.type != 'section': continue
-                longueur_section = item.longueur
-                deduction_gauche, deduction_droite = 0, 0
-                if idx > 0:
-                    jonction_gauche = structure_items[idx-1]
-                    is_extremite_gauche = (idx - 1 == 0)
-                    deduction_gauche = dims_map.get(jonction_gauche.type, 0) / (1 if is_extremite_gauche else 2)
-                if idx < len(structure_items) - 1:
-                    jonction_droite = structure_items[idx+1]
-                    is_extremite_droite = (idx + 1 == len(structure_items) - 1)
-                    deduction_droite = dims_map.get(jonction_droite.type, 0) / (1 if is_extremite_droite else 2)
-                
-                longueur_libre = longueur_section - deduction_gauche - deduction_droite
-                
-                repartition = RepartitionResult(nombre_barreaux=0, vide_entre_barreaux_mm=0, jeu_depart_mm=longueur_libre)
-                if data.remplissage_type == 'barreaudage_vertical':
-                    repartition = calculate_repartition(longueur_libre, barreau_epaisseur_repartition, data.ecart_barreaux)
-
-                sections_details.append(SectionPlan(longueur_section=longueur_section, longueur_libre=longueur_libre, **repartition.model_dump()))
-            
-            final_morceaux.append(MorceauPlan(id=i, longueur_totale=sum(s.longueur for s in morceau_data.structure if s.type == 'section' and s.longueur is not None), angle=morceau_data.angle, structure=morceau_data.structure, sections_details=sections_details))
-        
-        nomenclature = []
-        total_poteaux, total_liaisons = 0, 0
-        for m in data.morceaux:
-            for s_item in m.structure:
-                if s_item.type == 'poteau': total_poteaux +=1
-                elif s_item.type == 'liaison': total_liaisons +=1
-        if total_poteaux > 0: nomenclature.append(NomenclatureItem(item="Poteaux", details=data.poteau_dims, quantite=total_poteaux, longueur_unitaire_mm=data.hauteur_totale))
-        if total_liaisons > 0: nomenclature.append(NomenclatureItem(item="Liaisons", details=data.liaison_dims, quantite=total_liaisons, longueur_unitaire_mm=data.hauteur_totale))
-        total_longueur_lisses = sum(s.longueur_libre for m in final_morceaux for s in m.sections_details)
-        if total_longueur_lisses > 0 and len(final_morceaux) > 0:
-            nomenclature.append(NomenclatureItem(item="Lisse Haute", details=data.lissehaute_dims, quantite=len(final_morceaux), longueur_unitaire_mm=round(total_longueur_lisses/len(final_morceaux))))
-            nomenclature.append(NomenclatureItem(item="Lisse Basse", details=data.lissebasse_dims, quantite=len(final_morceaux), longueur_unitaire_mm=round(total_longueur_lisses/len(final_morceaux))))
-        
-        remplissage_details = None
-        if data.remplissage_type == 'barreaudage_vertical':
-            total_barreaux = sum(s.nombre_barreaux for m in final_morceaux for s in m.sections_details)
-            if total_barreaux > 0:
-                epaisseur_lisse_haute = get_thickness_dimension(data.lissehaute_dims)
-                epaisseur_lisse_basse = get_thickness_dimension(data.lissebasse_dims)
-                longueur_unitaire_barreau = data.hauteur_totale - data.hauteur_lisse_basse - epaisseur_lisse_haute - epaisseur_lisse_basse
-                nomenclature.append(NomenclatureItem(item="Barreaux", details=data.barreau_dims, quantite=total_barreaux, longueur_unitaire_mm=round(longueur_unitaire_barreau)))
-        
-        elif data.remplissage_type == 'barreaudage_horizontal':
-            hauteur_disponible = data.hauteur_totale - data.hauteur_lisse_basse - get_thickness_dimension(data.lissehaute_dims) - get_thickness_dimension(data.lissebasse_dims)
-            remplissage_details = calculate_repartition(hauteur_disponible, barreau_epaisseur_repartition, data.ecart_barreaux)
-            
-            if remplissage_details and remplissage_details.nombre_barreaux > 0:
-                barreaux_par_longueur = {}
-                for m in final_morceaux:
-                    for s in m.sections_details:
-                        longueur = round(s.longueur_libre)
-                        if longueur > 0:
-                            barreaux_par_longueur[longueur] = barreaux_par_longueur.get(longueur, 0) + 1
-                
-                for longueur, nb_sections in barreaux_par_longueur.items():
-                    nomenclature.append(NomenclatureItem(item=f"Barreaux L={longueur}mm", details=data.barreau_dims, quantite=remplissage_details.nombre_barreaux * nb_sections, longueur_unitaire_mm=longueur))
-        
-        platine_details = None
-        if data.type_fixation == 'platine' and data.platine_dimensions and data.platine_trous and data.platine_entraxes:
-            full_platine_string = f"{data.platine_dimensions} / Trous:{data.platine_trous} / Entraxes:{data.platine_entraxes}"
-            platine_details = parse_platine_data(full_platine_string)
-        
-        final_data = FinalPlanData(titre_plan=data.titre_plan, nom_client=data.nom_client, date_chantier=data.date_chantier, description_projet=f"Garde-corps détaillé en {data.nombre_morceaux} morceau(x).", nomenclature=nomenclature, morceaux=final_morceaux, hauteur_totale=data.hauteur_totale, hauteur_lisse_basse=data.hauteur_lisse_basse, poteau_dims=data.poteau_dims, liaison_dims=data.liaison_dims, lissehaute_dims=data.lissehaute_dims, lissebasse_dims=data.lissebasse_dims, barreau_dims=data.barreau_dims, platine_details=platine_details, remplissage_type=data.remplissage_type, remplissage_details=remplissage_details)
-        return {"status": "success", "data": final_data.model_dump()}
+            final_data = calculer_plan_et_mesurer(data)
+        plan_id = stock_plans.ajouter(final_data)
+    except RenduSatureError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur de traitement: {str(e)}")
+    # Le plan est déjà au format JSON : réponse encodée directement, sans jsonable_encoder
+    reponse = ReponseJSON({"status": "success", "plan_id": plan_id, "data": final_data}, decimales=decimales)
+    if profilage:
+        reponse.headers["X-Profil-Id"] = await asyncio.to_thread(stock_profils.enregistrer, profil, data.model_dump(), plan=final_data)
+    return reponse
+
+@app.post("/api/batch-plans")
+async def batch_plans(data: BatchRequest):
+    fin_validation()
+    formats_inconnus = [f for f in data.formats if f not in FORMATS_RENDU]
+    if formats_inconnus or not data.formats:
+        raise HTTPException(status_code=422, detail=f"Formats non supportés: {formats_inconnus or data.formats}. Formats possibles: pdf, dxf.")
+    if not data.projets:
+        raise HTTPException(status_code=422, detail="Le lot ne contient aucun projet.")
+    formats = list(dict.fromkeys(data.formats))
+    return StreamingResponse(generer_zip_batch(data.projets, formats), media_type='application/zip', headers={"Content-Disposition": content_disposition("plans.zip")})
+
+def formulaire_depuis_ia(champs: Dict[str, Any]) -> ParsedFormData:
+    """Formulaire rempli avec les champs extraits par l'analyse IA."""
+    try:
+        return ParsedFormData(**champs)
+    except ValidationError:
+        raise ServiceIAError("Réponse du service d'analyse IA non conforme au formulaire.")
 
 @app.post("/api/parse-text", response_model=ParsedFormData)
 async def parse_text_to_form(data: DescriptionData):
-    global is_gemini_configured
-    if not genai:
-        raise HTTPException(status_code=503, detail="Le service d'analyse IA n'est pas disponible (module non installé).")
-
-    if not is_gemini_configured:
-        api_key = os.getenv("MA_CLE_GEMINI")
-        if not api_key:
-            raise HTTPException(status_code=503, detail="La clé d'API MA_CLE_GEMINI n'est pas configurée sur le serveur.")
-        try:
-            genai.configure(api_key=api_key)
-            is_gemini_configured = True
-            print("API Gemini configurée avec succès.")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Erreur lors de la configuration de l'API Gemini: {e}")
-    
-    # Ici, vous mettriez votre logique pour appeler le modèle Gemini avec le texte
-    # Pour l'instant, c'est un placeholder
-    print(f"Analyse du texte demandée: {data.description}")
-    return ParsedFormData() # Retourne un formulaire vide pour l'exemple
+    """
+    Pré-remplit le formulaire à partir de la description libre du projet : lecture par règles d'abord,
+    modèle (analyses mises en cache) pour ce que les règles ne résolvent pas. Les champs lus par les
+    règles priment ; si le modèle est indisponible, ils sont renvoyés seuls.
+    """
+    extraction = extraire_formulaire(data.description)
+    if extraction.suffisante(IA_REGLES_SEUIL):
+        ANALYSES_TEXTE.inc(source="regles")
+        return ParsedFormData(**extraction.champs)
+    cle = cle_description(data.description, client_ia.backend.identite)
+    champs = cache_analyses.get(cle)
+    if cache_analyses.actif:
+        CACHE_ANALYSES.inc(resultat="hit" if champs is not None else "miss")
+    if champs is not None:
+        ANALYSES_TEXTE.inc(source="cache")
+        return ParsedFormData(**champs)
+    try:
+        champs_ia = await client_ia.analyser_texte(data.description, ParsedFormData.model_json_schema())
+    except ServiceIAError:
+        if not extraction.champs:
+            raise
+        ANALYSES_TEXTE.inc(source="regles_sans_ia")
+        return ParsedFormData(**extraction.champs)
+    formulaire = formulaire_depuis_ia({**champs_ia, **extraction.champs})
+    # Écriture éventuelle dans la base SQLite : hors de la boucle d'événements
+    await asyncio.to_thread(cache_analyses.put, cle, formulaire.model_dump())
+    ANALYSES_TEXTE.inc(source="ia")
+    return formulaire
 
 @app.post("/api/analyze-schema", response_model=ParsedFormData)
 async def analyze_schema(data: SchemaData):
-    global is_gemini_configured
-    if not genai or not Image or not io:
-        raise HTTPException(status_code=503, detail="Le service d'analyse d'image n'est pas disponible (modules manquants).")
-
-    if not is_gemini_configured:
-        api_key = os.getenv("MA_CLE_GEMINI")
-        if not api_key:
-            raise HTTPException(status_code=503, detail="La clé d'API MA_CLE_GEMINI n'est pas configurée sur le serveur.")
-        try:
-            genai.configure(api_key=api_key)
-            is_gemini_configured = True
-            print("API Gemini configurée avec succès.")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Erreur lors de la configuration de l'API Gemini: {e}")
+    """Pré-remplit le formulaire à partir d'un schéma (image en base64)."""
+    return formulaire_depuis_ia(await client_ia.analyser_image(data.image_data, ParsedFormData.model_json_schema()))
 
-    # Ici, vous mettriez votre logique pour appeler le modèle Gemini avec l'image
-    # Pour l'instant, c'est un placeholder
-    print("Analyse du schéma demandée.")
-    return ParsedFormData() # Retourne un formulaire vide pour l'exemple
-
-@app.post("/api/draw-pdf")
-async def draw_pdf_plan(data: FinalPlanData):
+@app.post("/api/draw-pdf", openapi_extra=schema_corps(FinalPlanData))
+async def draw_pdf_plan(data: Annotated[FinalPlanData, Depends(corps_json(FinalPlanData))], request: Request):
+    fin_validation()
+    plan = data.model_dump()
     try:
-        filepath = creer_plan_pdf(data.model_dump())
-        if filepath:
-            return FileResponse(path=filepath, media_type='application/pdf', filename=f"{data.titre_plan}.pdf")
-        raise HTTPException(status_code=500, detail="La création du PDF a échoué.")
+        with profiler("draw-pdf", demande_profilage(request)) as profil:
+            reponse = await rendre_plan(plan, 'pdf')
+    except (HTTPException, RenduSatureError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du dessin PDF: {str(e)}")
-
-@app.post("/api/draw-dxf")
-async def draw_dxf_plan(data: FinalPlanData):
+    if profil is not None:
+        reponse.headers["X-Profil-Id"] = await asyncio.to_thread(stock_profils.enregistrer, profil, plan)
+    return reponse
+
+@app.post("/api/draw-dxf", openapi_extra=schema_corps(FinalPlanData))
+async def draw_dxf_plan(data: Annotated[FinalPlanData, Depends(corps_json(FinalPlanData))], request: Request, cotes: str = COTES_RENDUES):
+    """Dessine le plan DXF ; `?cotes=natives` partage un même bloc de géométrie entre les cotes de même forme."""
+    fin_validation()
+    cotes = get_profil_cotes(cotes)
+    plan = data.model_dump()
     try:
-        doc = creer_plan_dxf(data.model_dump())
-        if not doc:
-            raise HTTPException(status_code=500, detail="La création du document DXF a échoué.")
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".dxf") as tmpfile:
-            doc.saveas(tmpfile.name)
-            return FileResponse(path=tmpfile.name, media_type='application/vnd.dxf', filename=f"{data.titre_plan}.dxf")
-            
+        with profiler("draw-dxf", demande_profilage(request)) as profil:
+            reponse = await rendre_plan(plan, 'dxf', request.headers.get("accept-encoding"), cotes)
+    except (HTTPException, RenduSatureError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du plan DXF: {str(e)}")
+    if profil is not None:
+        reponse.headers["X-Profil-Id"] = await asyncio.to_thread(stock_profils.enregistrer, profil, plan, {"cotes": cotes})
+    return reponse
+
+@app.post("/api/render/{format_sortie}")
+async def process_and_render(format_sortie: str, data: ProjectData, request: Request):
+    """Calcule le plan et le dessine dans le format demandé en une seule requête (identifiant du plan dans X-Plan-Id)."""
+    fin_validation()
+    format_sortie = get_format_rendu(format_sortie)
+    try:
+        plan = calculer_plan_et_mesurer(data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur de traitement: {str(e)}")
+    plan_id = stock_plans.ajouter(plan)
+    try:
+        reponse = await rendre_plan(plan, format_sortie, request.headers.get("accept-encoding"))
+    except (HTTPException, RenduSatureError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors du rendu {format_sortie.upper()}: {str(e)}")
+    reponse.headers["X-Plan-Id"] = plan_id
+    return reponse
+
+@app.get("/api/plans/{plan_id}", response_model=ReponsePlan)
+async def get_plan(plan_id: str, decimales: Annotated[Optional[int], Query(ge=0, le=DECIMALES_MAX)] = None):
+    plan = stock_plans.get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Plan introuvable ou expiré.")
+    return ReponseJSON({"status": "success", "plan_id": plan_id, "data": plan}, decimales=decimales)
+
+@app.get("/api/plans/{plan_id}/{format_sortie}")
+async def render_stored_plan(plan_id: str, format_sortie: str, request: Request, cotes: str = COTES_RENDUES):
+    """Redessine un plan déjà calculé à partir de son identifiant, sans renvoyer le plan complet."""
+    format_sortie = get_format_rendu(format_sortie)
+    cotes = get_profil_cotes(cotes)
+    plan = stock_plans.get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail="Plan introuvable ou expiré.")
+    try:
+        return await rendre_plan(plan, format_sortie, request.headers.get("accept-encoding"), cotes)
+    except (HTTPException, RenduSatureError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors du rendu {format_sortie.upper()}: {str(e)}")
 
 # La fonctionnalité DWG est désactivée pour le déploiement car elle dépend d'un programme Windows
 # @app.post("/api/draw-dwg")
@@ -447,6 +616,13 @@ async def draw_dxf_plan(data: FinalPlanData):
 # 7. SERVIR LE FRONTEND (à la toute fin)
 # ===============================================
 
+@app.get("/metrics")
+async def metrics():
+    """Métriques du service au format texte de Prometheus."""
+    if not registre.actif:
+        raise HTTPException(status_code=404, detail="Les métriques sont désactivées (METRIQUES_ACTIVES=0).")
+    return PlainTextResponse(registre.exposer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def read_root():
     """Sert la page d'accueil de l'application."""
@@ -0,0 +1,247 @@
+# metriques.py
+# Mesures internes du service (durées par étape, compteurs) exposées au format texte de Prometheus
+# sur /metrics. Désactivées (METRIQUES_ACTIVES=0), les mesures ne coûtent qu'un test de booléen.
+
+import bisect
+import contextlib
+import contextvars
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bornes des histogrammes : durées (s) et nombres d'éléments par plan
+BORNES_DUREE = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BORNES_NOMBRE = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _echapper(valeur: Any) -> str:
+    return str(valeur).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _etiquettes(noms: Sequence[str], valeurs: Tuple, supplement: str = "") -> str:
+    paires = [f'{nom}="{_echapper(valeur)}"' for nom, valeur in zip(noms, valeurs)]
+    if supplement:
+        paires.append(supplement)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+def _nombre(valeur: float) -> str:
+    if valeur == math.inf:
+        return "+Inf"
+    return repr(float(valeur)) if isinstance(valeur, float) and not valeur.is_integer() else str(int(valeur))
+
+
+class Metrique:
+    type_prometheus = ""
+
+    def __init__(self, registre: "Registre", nom: str, aide: str, etiquettes: Sequence[str] = ()):
+        self.registre = registre
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self._verrou = threading.Lock()
+
+    def _cle(self, etiquettes: Dict[str, Any]) -> Tuple:
+        return tuple(str(etiquettes.get(nom, "")) for nom in self.etiquettes)
+
+    def _enregistrer(self, valeur: float, etiquettes: Dict[str, Any]):
+        if not self.registre.actif:
+            return
+        journal = self.registre._journal.get()
+        if journal is not None:
+            # Mesure faite dans un processus de rendu : rejouée par le processus principal
+            journal.append((self.nom, self._cle(etiquettes), valeur))
+        else:
+            self._appliquer(self._cle(etiquettes), valeur)
+
+    def _appliquer(self, cle: Tuple, valeur: float):
+        raise NotImplementedError
+
+    def lignes(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Compteur(Metrique):
+    type_prometheus = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._valeurs: Dict[Tuple, float] = {}
+
+    def inc(self, valeur: float = 1, **etiquettes):
+        self._enregistrer(valeur, etiquettes)
+
+    def _appliquer(self, cle: Tuple, valeur: float):
+        with self._verrou:
+            self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+    def valeur(self, **etiquettes) -> float:
+        return self._valeurs.get(self._cle(etiquettes), 0)
+
+    def lignes(self) -> List[str]:
+        with self._verrou:
+            return [f"{self.nom}{_etiquettes(self.etiquettes, cle)} {_nombre(valeur)}" for cle, valeur in sorted(self._valeurs.items())]
+
+
+class Histogramme(Metrique):
+    type_prometheus = "histogram"
+
+    def __init__(self, *args, bornes: Sequence[float] = BORNES_DUREE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bornes = tuple(bornes)
+        # Par jeu d'étiquettes : effectifs par intervalle (non cumulés), somme, nombre
+        self._series: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, valeur: float, **etiquettes):
+        self._enregistrer(valeur, etiquettes)
+
+    def _appliquer(self, cle: Tuple, valeur: float):
+        with self._verrou:
+            effectifs, totaux = self._series.setdefault(cle, ([0] * (len(self.bornes) + 1), [0.0, 0]))
+            effectifs[bisect.bisect_left(self.bornes, valeur)] += 1
+            totaux[0] += valeur
+            totaux[1] += 1
+
+    def nombre(self, **etiquettes) -> int:
+        serie = self._series.get(self._cle(etiquettes))
+        return serie[1][1] if serie else 0
+
+    def lignes(self) -> List[str]:
+        lignes = []
+        with self._verrou:
+            for cle, (effectifs, (somme, nombre)) in sorted(self._series.items()):
+                cumul = 0
+                for borne, effectif in zip(self.bornes + (math.inf,), effectifs):
+                    cumul += effectif
+                    le = 'le="%s"' % _nombre(borne)
+                    lignes.append(f"{self.nom}_bucket{_etiquettes(self.etiquettes, cle, le)} {cumul}")
+                lignes.append(f"{self.nom}_sum{_etiquettes(self.etiquettes, cle)} {_nombre(somme)}")
+                lignes.append(f"{self.nom}_count{_etiquettes(self.etiquettes, cle)} {nombre}")
+        return lignes
+
+
+class Registre:
+    """Ensemble des métriques du service, et valeurs calculées à la demande (jauges) au moment de l'exposition."""
+
+    def __init__(self, actif: bool = True):
+        self.actif = actif
+        self._metriques: Dict[str, Metrique] = {}
+        self._jauges: List[Tuple[str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = []
+        self._journal: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("journal_metriques", default=None)
+
+    def compteur(self, nom: str, aide: str, etiquettes: Sequence[str] = ()) -> Compteur:
+        self._metriques[nom] = Compteur(self, nom, aide, etiquettes)
+        return self._metriques[nom]
+
+    def histogramme(self, nom: str, aide: str, etiquettes: Sequence[str] = (), bornes: Sequence[float] = BORNES_DUREE) -> Histogramme:
+        self._metriques[nom] = Histogramme(self, nom, aide, etiquettes, bornes=bornes)
+        return self._metriques[nom]
+
+    def jauge(self, nom: str, aide: str, lecture: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]):
+        """Jauge lue au moment de l'exposition : `lecture()` retourne {((étiquette, valeur), ...): valeur}."""
+        self._jauges.append((nom, aide, lecture))
+
+    @contextlib.contextmanager
+    def journaliser(self) -> Iterator[list]:
+        """Les mesures faites dans ce bloc sont seulement notées, pour être rejouées ailleurs (voir `rejouer`)."""
+        journal: list = []
+        jeton = self._journal.set(journal)
+        try:
+            yield journal
+        finally:
+            self._journal.reset(jeton)
+
+    def rejouer(self, journal: Sequence[Tuple[str, Tuple, float]]):
+        for nom, cle, valeur in journal:
+            metrique = self._metriques.get(nom)
+            if metrique is not None:
+                metrique._appliquer(cle, valeur)
+
+    def exposer(self) -> str:
+        """Toutes les métriques au format texte d'exposition de Prometheus (version 0.0.4)."""
+        lignes = []
+        for metrique in self._metriques.values():
+            lignes += [f"# HELP {metrique.nom} {metrique.aide}", f"# TYPE {metrique.nom} {metrique.type_prometheus}"]
+            lignes += metrique.lignes()
+        for nom, aide, lecture in self._jauges:
+            lignes += [f"# HELP {nom} {aide}", f"# TYPE {nom} gauge"]
+            for etiquettes, valeur in sorted(lecture().items()):
+                lignes.append(f"{nom}{_etiquettes([e for e, _ in etiquettes], tuple(v for _, v in etiquettes))} {_nombre(valeur)}")
+        return "\n".join(lignes) + "\n"
+
+
+registre = Registre(actif=os.getenv("METRIQUES_ACTIVES", "1") != "0")
+
+REQUETES = registre.compteur("garde_corps_requetes_total", "Requêtes HTTP traitées, par route et statut.", ("route", "methode", "statut"))
+DUREE_REQUETES = registre.histogramme("garde_corps_requete_duree_secondes", "Durée de traitement des requêtes HTTP (hors envoi du corps en flux).", ("route",))
+DUREE_ETAPES = registre.histogramme("garde_corps_etape_duree_secondes", "Durée de chaque étape du calcul et du rendu des plans.", ("etape",))
+OCTETS_PRODUITS = registre.compteur("garde_corps_octets_produits_total", "Octets de fichiers générés, par format.", ("format",))
+OCTETS_ENVOYES = registre.compteur("garde_corps_octets_envoyes_total", "Octets envoyés dans les réponses en flux (après compression éventuelle).", ("format",))
+CACHE_RENDU = registre.compteur("garde_corps_cache_rendu_total", "Consultations du cache de rendu, par format et résultat (hit/miss).", ("format", "resultat"))
+ANALYSES_TEXTE = registre.compteur("garde_corps_analyses_texte_total", "Analyses de description par source (regles, cache, ia, regles_sans_ia).", ("source",))
+CACHE_ANALYSES = registre.compteur("garde_corps_cache_analyses_total", "Consultations du cache des analyses de description (hit/miss).", ("resultat",))
+ELEMENTS_PLAN = registre.histogramme("garde_corps_elements_par_plan", "Nombre d'éléments par plan : morceaux, sections, pages PDF, entités DXF.", ("type",), bornes=BORNES_NOMBRE)
+
+_NUL = contextlib.nullcontext()
+
+
+class _Chrono:
+    __slots__ = ("nom", "debut")
+
+    def __init__(self, nom: str):
+        self.nom = nom
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        DUREE_ETAPES.observe(time.perf_counter() - self.debut, etape=self.nom)
+        return False
+
+def etape(nom: str):
+    """Mesure la durée du bloc `with etape(...)` (rien si les métriques sont désactivées)."""
+    return _Chrono(nom) if registre.actif else _NUL
+
+def executer_et_journaliser(fn: Callable[..., Any], *args: Any) -> Tuple[Any, list]:
+    """Exécute `fn(*args)` (dans un processus de rendu) en notant les mesures faites pendant l'appel."""
+    with registre.journaliser() as journal:
+        resultat = fn(*args)
+    return resultat, journal
+
+
+# --- DÉBUT DE REQUÊTE ET VALIDATION ---
+# Le corps des requêtes est validé par FastAPI avant l'appel de la route : la durée de validation
+# est mesurée du début de la requête (middleware) jusqu'au début de la route (`fin_validation`).
+_debut_requete: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("debut_requete", default=None)
+
+def fin_validation():
+    debut = _debut_requete.get()
+    if debut is not None and registre.actif:
+        DUREE_ETAPES.observe(time.perf_counter() - debut, etape="validation")
+
+
+class MiddlewareMetriques:
+    """Middleware ASGI : nombre et durée des requêtes par route (modèle de chemin, pour borner les étiquettes)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registre.actif:
+            await self.app(scope, receive, send)
+            return
+        debut = time.perf_counter()
+        jeton = _debut_requete.set(debut)
+
+        async def envoyer(message):
+            if message["type"] == "http.response.start":
+                chemin = getattr(scope.get("route"), "path", "autre")
+                DUREE_REQUETES.observe(time.perf_counter() - debut, route=chemin)
+                REQUETES.inc(route=chemin, methode=scope["method"], statut=message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, envoyer)
+        finally:
+            _debut_requete.reset(jeton)
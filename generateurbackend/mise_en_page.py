@@ -0,0 +1,103 @@
+# mise_en_page.py
+
+import math
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Échelles minimales lisibles (mm papier par mm réel) : en dessous, le dessin est découpé en feuilles
+ECHELLE_MIN_VUE_ENSEMBLE = 1 / 200
+ECHELLE_MIN_MORCEAU = 1 / 50
+
+
+@dataclass
+class Fenetre:
+    """Zone rectangulaire du modèle (mm, y vers le haut) à montrer sur une feuille."""
+    x: float
+    y: float
+    largeur: float
+    hauteur: float
+
+    @property
+    def centre(self) -> Tuple[float, float]:
+        return (self.x + self.largeur / 2, self.y + self.hauteur / 2)
+
+
+@dataclass
+class Placement:
+    """Position d'un élément sur une feuille : coin haut gauche (mm) dans la zone utile, y vers le bas."""
+    index: int
+    x: float
+    y: float
+
+
+def decouper_chemin(segments: np.ndarray, bas: float, haut: float, largeur: float, hauteur: float, marge_laterale: float = 0) -> List[Fenetre]:
+    """
+    Découpe un chemin (segments [x0, y0, x1, y1]) en fenêtres successives le long de x.
+    Chaque fenêtre contient le chemin et la bande [y - bas, y + haut] qui l'accompagne (hauteur
+    du garde-corps, cotes). La largeur est réduite sur les parties en pente pour que la montée
+    dans une fenêtre tienne dans `hauteur` (si la bande seule dépasse, la fenêtre est plus haute).
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    if len(segments) == 0:
+        return []
+    x_debut, x_fin = np.minimum(segments[:, 0], segments[:, 2]), np.maximum(segments[:, 0], segments[:, 2])
+    x_min, x_max = float(x_debut.min()), float(x_fin.max())
+
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    obliques = np.abs(dx) > 0
+    pente = float(np.max(np.abs(dy[obliques] / dx[obliques]))) if obliques.any() else 0.0
+    reste_vertical = hauteur - (bas + haut)
+    if pente > 0 and reste_vertical > 0:
+        largeur = min(largeur, reste_vertical / pente)
+    largeur = max(largeur, 1.0)
+
+    fenetres = []
+    nb_fenetres = max(1, math.ceil((x_max - x_min) / largeur - 1e-9))
+    for k in range(nb_fenetres):
+        x0, x1 = x_min + k * largeur, min(x_min + (k + 1) * largeur, x_max)
+        # Portion de chaque segment comprise dans [x0, x1], puis ordonnées du chemin à ses bornes
+        bornes_basses, bornes_hautes = np.maximum(x_debut, x0), np.minimum(x_fin, x1)
+        dans_fenetre = bornes_basses <= bornes_hautes
+        if not dans_fenetre.any():
+            continue
+        ordonnees = []
+        for xa, ya, xb, yb in segments[dans_fenetre].tolist():
+            if xa == xb:
+                ordonnees += [ya, yb]
+            else:
+                for x in (max(min(xa, xb), x0), min(max(xa, xb), x1)):
+                    ordonnees.append(ya + (yb - ya) * (x - xa) / (xb - xa))
+        y_bas, y_haut = min(ordonnees) - bas, max(ordonnees) + haut
+        fenetres.append(Fenetre(x0 - marge_laterale, y_bas, x1 - x0 + 2 * marge_laterale, y_haut - y_bas))
+    return fenetres
+
+def segments_chemin(points: np.ndarray) -> np.ndarray:
+    """Segments [x0, y0, x1, y1] reliant des points successifs."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.hstack([points[:-1], points[1:]])
+
+def ranger_par_etageres(tailles: Sequence[Tuple[float, float]], largeur: float, hauteur: float, espacement: float = 0) -> List[List[Placement]]:
+    """
+    Range des rectangles (largeur, hauteur) sur des feuilles de taille donnée, par étagères
+    successives et dans l'ordre fourni (l'ordre de lecture du plan est conservé).
+    Un rectangle plus grand que la feuille commence une nouvelle étagère (l'appelant réduit son échelle).
+    """
+    feuilles: List[List[Placement]] = []
+    feuille: List[Placement] = []
+    x = y = hauteur_etagere = 0.0
+    for index, (l, h) in enumerate(tailles):
+        if feuille and x + l > largeur:
+            # Étagère pleine : on passe à la suivante
+            x, y, hauteur_etagere = 0.0, y + hauteur_etagere + espacement, 0.0
+        if feuille and y + h > hauteur:
+            feuilles.append(feuille)
+            feuille, x, y, hauteur_etagere = [], 0.0, 0.0, 0.0
+        feuille.append(Placement(index, x, y))
+        x += l + espacement
+        hauteur_etagere = max(hauteur_etagere, h)
+    if feuille:
+        feuilles.append(feuille)
+    return feuilles
@@ -0,0 +1,52 @@
+# plans.py
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Octets aléatoires de l'identifiant (128 bits, 32 caractères hexadécimaux)
+OCTETS_PLAN_ID = 16
+
+
+class StockPlans:
+    """
+    Conserve en mémoire les plans calculés (`FinalPlanData.model_dump()`) sous un identifiant aléatoire,
+    pour pouvoir les redessiner dans un autre format sans que le client ne renvoie le plan.
+    L'identifiant ne coûte aucun parcours du plan (pas d'empreinte) et ne risque pas de collision.
+    Les plans expirent après `ttl` secondes et les moins récemment utilisés sont oubliés
+    au-delà de `max_plans` entrées.
+    """
+
+    def __init__(self, max_plans: int, ttl: float):
+        self.max_plans = max_plans
+        self.ttl = ttl
+        self._plans: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def ajouter(self, plan: Dict[str, Any]) -> str:
+        plan_id = secrets.token_hex(OCTETS_PLAN_ID)
+        with self._verrou:
+            self._plans[plan_id] = (time.monotonic() + self.ttl, plan)
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan_id
+
+    def get(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        with self._verrou:
+            entree = self._plans.get(plan_id)
+            if entree is None:
+                return None
+            expiration, plan = entree
+            if expiration < time.monotonic():
+                del self._plans[plan_id]
+                return None
+            self._plans.move_to_end(plan_id)
+            return plan
+
+
+def creer_stock_depuis_env() -> StockPlans:
+    """Construit le stock à partir de PLANS_MAX et PLANS_TTL (en secondes)."""
+    return StockPlans(max_plans=int(os.getenv("PLANS_MAX", "500")), ttl=float(os.getenv("PLANS_TTL", "3600")))
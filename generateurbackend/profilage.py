@@ -0,0 +1,203 @@
+# profilage.py
+# Profilage à la demande d'une requête lente (cProfile), réservé aux administrateurs :
+# en-tête `X-Profilage: 1` (ou `?profilage=1`) et jeton `X-Profilage-Jeton` égal à PROFILAGE_JETON.
+# Le profil est conservé avec le plan anonymisé, pour rejouer la requête à l'identique :
+#   python -m generateurbackend.profilage <dossier du profil> --repetitions 5
+
+import argparse
+import contextlib
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Champs identifiant le client ou le chantier, remplacés avant d'enregistrer un plan
+CHAMPS_ANONYMISES = {"titre_plan": "Plan anonyme", "nom_client": "Client anonyme", "date_chantier": "2000-01-01"}
+
+# Sous Python 3.12+, un seul profileur peut être actif à la fois dans un processus (tous threads confondus)
+_verrou_profileur = threading.Lock()
+
+
+class _StatsBrutes:
+    """Statistiques d'un profil (dictionnaire de cProfile) présentées comme un profil, pour `pstats.Stats`."""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def executer_profile(fn: Callable[..., Any], *args: Any) -> Tuple[Any, Dict]:
+    """Exécute `fn(*args)` (dans un processus de rendu) sous cProfile ; retourne le résultat et les statistiques brutes."""
+    profileur = cProfile.Profile()
+    with _verrou_profileur:
+        profileur.enable()
+        try:
+            resultat = fn(*args)
+        finally:
+            profileur.disable()
+    profileur.create_stats()
+    return resultat, profileur.stats
+
+
+class Profil:
+    """Profil d'une requête : statistiques des exécutions profilées pendant son traitement, cumulées."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.debut = time.perf_counter()
+        self._stats: List[Dict] = []
+
+    def ajouter(self, stats: Dict):
+        self._stats.append(stats)
+
+    def statistiques(self) -> Optional[pstats.Stats]:
+        if not self._stats:
+            return None
+        return pstats.Stats(*(_StatsBrutes(stats) for stats in self._stats))
+
+
+_profil_en_cours: contextvars.ContextVar[Optional[Profil]] = contextvars.ContextVar("profil_en_cours", default=None)
+
+def profil_en_cours() -> Optional[Profil]:
+    """Profil de la requête en cours de traitement, ou None (cas normal)."""
+    return _profil_en_cours.get()
+
+@contextlib.contextmanager
+def profiler(route: str, actif: bool = True) -> Iterator[Optional[Profil]]:
+    """
+    Dans ce bloc, les exécutions confiées à l'exécuteur de rendu sont profilées (voir `executer_profile`).
+    Sans effet si `actif` est faux.
+    """
+    if not actif:
+        yield None
+        return
+    profil = Profil(route)
+    jeton = _profil_en_cours.set(profil)
+    try:
+        yield profil
+    finally:
+        _profil_en_cours.reset(jeton)
+
+
+def jeton_valide(jeton: Optional[str], attendu: Optional[str]) -> bool:
+    """Le profilage est désactivé tant qu'aucun jeton d'administration n'est configuré."""
+    return bool(attendu) and jeton is not None and hmac.compare_digest(jeton.encode(), attendu.encode())
+
+def anonymiser(donnees: Dict[str, Any]) -> Dict[str, Any]:
+    """Copie d'un plan (ou d'un projet) sans titre, client ni date de chantier ; la géométrie est conservée."""
+    return {**donnees, **{champ: valeur for champ, valeur in CHAMPS_ANONYMISES.items() if champ in donnees}}
+
+
+class StockProfils:
+    """
+    Profils enregistrés sur disque, un dossier par requête profilée :
+    `profil.prof` (lisible par pstats / snakeviz), `entree.json` (données anonymisées de la requête),
+    `infos.json` (route, options, durée). Au-delà de `max_profils`, les plus anciens sont supprimés.
+    """
+
+    def __init__(self, dossier: Path, max_profils: int):
+        self.dossier = Path(dossier)
+        self.max_profils = max_profils
+        self._verrou = threading.Lock()
+
+    def enregistrer(self, profil: Profil, entree: Dict[str, Any], options: Optional[Dict[str, Any]] = None, plan: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Enregistre le profil avec l'entrée de la requête (et le plan calculé pour process-data), anonymisés.
+        Retourne l'identifiant du profil.
+        """
+        duree = time.perf_counter() - profil.debut
+        identifiant = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+        dossier = self.dossier / identifiant
+        dossier.mkdir(parents=True)
+        stats = profil.statistiques()
+        if stats is not None:
+            stats.dump_stats(dossier / "profil.prof")
+        (dossier / "entree.json").write_text(json.dumps(anonymiser(entree), ensure_ascii=False), encoding="utf-8")
+        if plan is not None:
+            (dossier / "plan.json").write_text(json.dumps(anonymiser(plan), ensure_ascii=False), encoding="utf-8")
+        infos = {"route": profil.route, "options": options or {}, "duree_s": round(duree, 6), "date": datetime.now().isoformat(timespec="seconds")}
+        (dossier / "infos.json").write_text(json.dumps(infos, ensure_ascii=False, indent=2), encoding="utf-8")
+        self._evincer()
+        return identifiant
+
+    def _evincer(self):
+        with self._verrou:
+            dossiers = sorted(d for d in self.dossier.iterdir() if d.is_dir())
+            for dossier in dossiers[:max(0, len(dossiers) - self.max_profils)]:
+                shutil.rmtree(dossier, ignore_errors=True)
+
+
+def creer_stock_profils_depuis_env() -> StockProfils:
+    """Construit le stock à partir des variables PROFILAGE_DIR et PROFILAGE_MAX."""
+    dossier = os.getenv("PROFILAGE_DIR") or os.path.join(tempfile.gettempdir(), "garde_corps_profils")
+    max_profils = int(os.getenv("PROFILAGE_MAX", "20"))
+    return StockProfils(Path(dossier), max_profils)
+
+
+# --- REJEU D'UN PROFIL ---
+
+def tache_rejeu(dossier: Path) -> Callable[[], Any]:
+    """Fonction qui refait le traitement de la requête enregistrée dans `dossier`."""
+    from .cotes import COTES_RENDUES
+    from .rendu import tache_rendu_dxf, tache_rendu_pdf
+    infos = json.loads((dossier / "infos.json").read_text(encoding="utf-8"))
+    entree = json.loads((dossier / "entree.json").read_text(encoding="utf-8"))
+    route, options = infos["route"], infos["options"]
+    if route == "process-data":
+        from .calcul import ProjectData, calculer_plan_dict
+        return lambda: calculer_plan_dict(ProjectData(**entree))
+    if route == "draw-pdf":
+        return lambda: tache_rendu_pdf(entree)
+    if route == "draw-dxf":
+        return lambda: tache_rendu_dxf(entree, None, options.get("cotes", COTES_RENDUES))
+    raise ValueError(f"Route inconnue dans le profil : {route}")
+
+def rejouer(dossier: Path, repetitions: int = 3) -> List[float]:
+    """Rejoue la requête enregistrée `repetitions` fois et retourne les durées (s)."""
+    tache = tache_rejeu(Path(dossier))
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        tache()
+        durees.append(time.perf_counter() - debut)
+    return durees
+
+def resume_profil(dossier: Path, tri: str = "cumulative", lignes: int = 25) -> str:
+    """Fonctions les plus coûteuses du profil enregistré, au format de pstats."""
+    sortie = io.StringIO()
+    pstats.Stats(str(Path(dossier) / "profil.prof"), stream=sortie).sort_stats(tri).print_stats(lignes)
+    return sortie.getvalue()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Rejoue une requête profilée et affiche son profil.")
+    parser.add_argument("dossier", type=Path, help="Dossier du profil (PROFILAGE_DIR/<identifiant>).")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--tri", default="cumulative", help="Ordre du résumé pstats (cumulative, tottime, ...).")
+    parser.add_argument("--lignes", type=int, default=25)
+    args = parser.parse_args(argv)
+
+    infos = json.loads((args.dossier / "infos.json").read_text(encoding="utf-8"))
+    print(f"Route: {infos['route']}  options: {infos['options']}  durée en production: {infos['duree_s']:.3f} s")
+    durees = rejouer(args.dossier, args.repetitions)
+    print(f"Rejeu ({args.repetitions}x): min {min(durees):.3f} s, médiane {statistics.median(durees):.3f} s")
+    if (args.dossier / "profil.prof").is_file():
+        print(resume_profil(args.dossier, args.tri, args.lignes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# profils.py
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# Nombres entiers ou décimaux dans une désignation de profilé ("40x40", "Plat 50x8", "Ø42.4x2"...)
+MOTIF_NOMBRE = re.compile(r'(\d+\.?\d*)')
+
+# Profilés décrits dans un plan : préfixe des champs `<nom>_dims` de ProjectData / FinalPlanData
+CHAMPS_PROFILS = ('poteau', 'liaison', 'lissehaute', 'lissebasse', 'barreau')
+
+
+@dataclass(frozen=True)
+class ProfileDims:
+    """Désignation de profilé analysée : forme reconnue et dimensions dans l'ordre d'écriture."""
+    designation: str
+    forme: str
+    dimensions: Tuple[float, ...]
+
+    @property
+    def epaisseur(self) -> float:
+        """Première dimension (souvent l'épaisseur). Ex: "40x40x3" -> 40, "Ø42.4x2" -> 42.4"""
+        return self.dimensions[0] if self.dimensions else 0
+
+    @property
+    def deduction(self) -> float:
+        """Deuxième dimension (ou la seule). Ex: "40x40" -> 40, "Plat 50x8" -> 8"""
+        if len(self.dimensions) >= 2:
+            return self.dimensions[1]
+        return self.dimensions[0] if self.dimensions else 0
+
+
+PROFIL_VIDE = ProfileDims(designation="", forme="inconnu", dimensions=())
+
+
+def _forme(designation: str, dimensions: Tuple[float, ...]) -> str:
+    texte = designation.strip().lower()
+    if texte.startswith(('ø', 'rond', 'diam')):
+        return "rond"
+    if texte.startswith('plat'):
+        return "plat"
+    if len(dimensions) >= 2:
+        return "carre" if dimensions[0] == dimensions[1] else "rectangulaire"
+    return "inconnu"
+
+@lru_cache(maxsize=256)
+def parse_profil(designation: Optional[str]) -> ProfileDims:
+    """Analyse une désignation de profilé ; le résultat est mis en cache (LRU borné)."""
+    if not designation:
+        return PROFIL_VIDE
+    dimensions = tuple(float(n) for n in MOTIF_NOMBRE.findall(designation))
+    return ProfileDims(designation=designation, forme=_forme(designation, dimensions), dimensions=dimensions)
+
+def profils_du_plan(data: Any) -> Dict[str, ProfileDims]:
+    """Résout en une fois tous les profilés d'un projet ou d'un plan (dict ou modèle Pydantic)."""
+    if isinstance(data, Mapping):
+        return {nom: parse_profil(data.get(f"{nom}_dims")) for nom in CHAMPS_PROFILS}
+    return {nom: parse_profil(getattr(data, f"{nom}_dims", None)) for nom in CHAMPS_PROFILS}
@@ -0,0 +1,258 @@
+# rendu.py
+
+import asyncio
+import importlib
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .calcul import ProjectData, calculer_plan_et_mesurer
+from .chargement import prechauffer
+from .cotes import COTES_RENDUES
+from .fusion_pdf import FusionPDF
+from .geometrie import GeometriePlan, calculer_geometrie
+from .metriques import executer_et_journaliser, registre
+from .profilage import executer_profile, profil_en_cours
+
+
+class RenduSatureError(Exception):
+    """Levée quand l'exécuteur de rendu a atteint sa profondeur de file maximale."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Le service de rendu est saturé, réessayez plus tard.")
+        self.retry_after = retry_after
+
+
+def contexte_processus(methode: Optional[str] = None) -> multiprocessing.context.BaseContext:
+    """
+    Contexte de création des processus de rendu : RENDU_CONTEXTE (forkserver par défaut, spawn là où
+    forkserver n'existe pas). Jamais fork : le serveur a déjà des threads (préchauffage, pool de threads
+    de la boucle, cache SQLite) et un processus forké pendant qu'un d'eux tient un verrou (d'import,
+    par exemple) resterait bloqué sur ce verrou.
+    """
+    methode = methode or os.getenv("RENDU_CONTEXTE") or ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+    if methode == "fork":
+        raise ValueError("RENDU_CONTEXTE=fork n'est pas supporté : utilisez forkserver ou spawn.")
+    contexte = multiprocessing.get_context(methode)
+    if methode == "forkserver":
+        # Le serveur de fork importe une fois les tâches de rendu ; chaque processus en hérite
+        contexte.set_forkserver_preload([__name__])
+    return contexte
+
+def version_rendu(format_sortie: str) -> str:
+    """Version du moteur de rendu d'un format (VERSION_RENDU de dessin_pdf ou dessin_dxf)."""
+    return importlib.import_module(f".dessin_{format_sortie}", __package__).VERSION_RENDU
+
+
+# --- TÂCHES EXÉCUTÉES DANS LES PROCESSUS DE RENDU ---
+# Ces fonctions doivent rester au niveau du module pour pouvoir être sérialisées (pickle)
+# vers les processus du pool. Les modules de dessin (fpdf, ezdxf) ne sont importés qu'au premier rendu.
+# Une tâche ne crée jamais elle-même de processus : un rendu découpé en parties (rendre_pdf_par_parties)
+# soumet chaque partie au pool partagé, dans la limite de sa file.
+
+def tache_rendu_pdf(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None) -> bytes:
+    """Génère le plan PDF en mémoire et retourne son contenu."""
+    from .dessin_pdf import creer_plan_pdf_bytes
+    return creer_plan_pdf_bytes(data, geometrie)
+
+def tache_rendu_pdf_fichier(data: Dict[str, Any], chemin: str) -> int:
+    """Génère le plan PDF page par page directement dans le fichier `chemin` (grands projets) ; retourne sa taille."""
+    from .dessin_pdf import creer_plan_pdf_flux
+    with open(chemin, 'wb') as sortie:
+        return creer_plan_pdf_flux(data, sortie)
+
+def tache_parties_pdf(data: Dict[str, Any], date_creation: Optional[datetime] = None) -> Optional[Tuple[bytes, List[Tuple[Any, ...]]]]:
+    """Synthèse du plan PDF et tâches des parties suivantes (voir dessin_pdf.preparer_parties_pdf), ou None si l'assemblage n'est pas disponible."""
+    from .dessin_pdf import FUSION_PDF, preparer_parties_pdf
+    if not FUSION_PDF:
+        return None
+    return preparer_parties_pdf(data, date_creation=date_creation)
+
+def tache_rendu_dxf(data: Dict[str, Any], geometrie: Optional[GeometriePlan] = None, cotes: str = COTES_RENDUES) -> Optional[bytes]:
+    """Génère le plan DXF en mémoire et retourne son contenu."""
+    from .dessin_dxf import creer_plan_dxf_bytes
+    return creer_plan_dxf_bytes(data, geometrie, cotes)
+
+# Message d'échec d'un rendu, par format
+ERREURS_RENDU = {"pdf": "La création du PDF a échoué.", "dxf": "La création du document DXF a échoué."}
+
+def tache_batch_projet(projet: Dict[str, Any], formats: List[str]) -> Dict[str, bytes]:
+    """
+    Calcule puis dessine un projet du lot dans un processus de rendu.
+    Retourne le contenu de chaque format demandé ; lève une exception si une étape échoue.
+    """
+    plan = calculer_plan_et_mesurer(ProjectData(**projet))
+    # Géométrie calculée une fois et partagée par tous les formats demandés
+    geometrie = calculer_geometrie(plan)
+    taches = {"pdf": tache_rendu_pdf, "dxf": tache_rendu_dxf}
+    fichiers = {}
+    for format_sortie in formats:
+        contenu = taches[format_sortie](plan, geometrie)
+        if not contenu:
+            raise ValueError(ERREURS_RENDU[format_sortie])
+        fichiers[format_sortie] = contenu
+    return fichiers
+
+
+
+# --- EXÉCUTEUR DE RENDU ---
+
+class ExecuteurRendu:
+    """
+    Pool de processus borné pour les rendus CPU (PDF/DXF).
+    Au-delà de `nb_workers + file_max` rendus en cours, les nouvelles demandes sont refusées
+    avec RenduSatureError plutôt que de s'accumuler indéfiniment.
+    Avec nb_workers=0, les rendus s'exécutent dans le pool de threads de la boucle asyncio
+    (utile pour les tests et les environnements sans fork).
+    """
+
+    def __init__(self, nb_workers: int, file_max: int, retry_after: int = 5, contexte: Optional[multiprocessing.context.BaseContext] = None):
+        self.nb_workers = max(0, nb_workers)
+        self.file_max = max(0, file_max)
+        self.retry_after = retry_after
+        self.contexte = contexte
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._en_cours = 0
+        self._verrou = threading.Lock()
+        # Demandes en attente d'une place (attendre=True), réveillées une à une quand un rendu se termine
+        self._attente: Deque[asyncio.Future] = deque()
+
+    @property
+    def capacite(self) -> int:
+        return max(1, self.nb_workers) + self.file_max
+
+    @property
+    def en_cours(self) -> int:
+        return self._en_cours
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.nb_workers == 0:
+            return None
+        with self._verrou:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.nb_workers, mp_context=self.contexte or contexte_processus())
+            return self._pool
+
+    def demarrer(self, modules: Iterable[str] = ()):
+        """
+        Crée le pool et lance ses processus au démarrage du serveur, qui y importent en arrière-plan
+        les `modules` (modules de dessin) pour que le premier rendu ne paie pas leur import.
+        """
+        pool = self._get_pool()
+        if pool is not None:
+            for _ in range(self.nb_workers):
+                pool.submit(prechauffer, tuple(modules))
+
+    def _reveiller_suivant(self):
+        """Réveille la première demande encore en attente (appelé sous self._verrou)."""
+        while self._attente:
+            place = self._attente.popleft()
+            if not place.done():
+                place.get_loop().call_soon_threadsafe(lambda p=place: p.done() or p.set_result(None))
+                return
+
+    async def _reserver(self, attendre: bool):
+        while True:
+            with self._verrou:
+                if self._en_cours < self.capacite:
+                    self._en_cours += 1
+                    return
+                if not attendre:
+                    raise RenduSatureError(self.retry_after)
+                place = asyncio.get_running_loop().create_future()
+                self._attente.append(place)
+            try:
+                await place
+            except asyncio.CancelledError:
+                with self._verrou:
+                    if place in self._attente:
+                        self._attente.remove(place)
+                    else:
+                        # La place libérée pour cette demande revient à la suivante
+                        self._reveiller_suivant()
+                raise
+
+    def _liberer(self):
+        with self._verrou:
+            self._en_cours -= 1
+            self._reveiller_suivant()
+
+    async def executer(self, fn: Callable[..., Any], *args: Any, attendre: bool = False) -> Any:
+        """
+        Exécute `fn(*args)` hors de la boucle d'événements.
+        Si la file est pleine, lève RenduSatureError, ou patiente jusqu'à ce qu'une place se libère
+        lorsque `attendre=True` (utilisé par les traitements par lot).
+        """
+        await self._reserver(attendre)
+        try:
+            loop = asyncio.get_running_loop()
+            # Requête profilée : le rendu s'exécute sous cProfile et ses statistiques reviennent avec le résultat
+            profil = profil_en_cours()
+            if profil is not None:
+                fn, args = executer_profile, (fn, *args)
+            if not registre.actif:
+                resultat = await loop.run_in_executor(self._get_pool(), fn, *args)
+            else:
+                # Les mesures faites pendant le rendu (autre processus) sont rejouées ici
+                resultat, journal = await loop.run_in_executor(self._get_pool(), executer_et_journaliser, fn, *args)
+                registre.rejouer(journal)
+            if profil is not None:
+                resultat, stats = resultat
+                profil.ajouter(stats)
+            return resultat
+        finally:
+            self._liberer()
+
+    def fermer(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+async def rendre_pdf_par_parties(executeur: ExecuteurRendu, data: Dict[str, Any], chemin: str, avance: int, date_creation: Optional[datetime] = None) -> int:
+    """
+    Génère un grand plan PDF dans le fichier `chemin` en dessinant ses parties (synthèse, puis pages de
+    chaque morceau et de la platine) dans le pool partagé de l'exécuteur, `avance` parties à la fois au plus,
+    et en les assemblant dans l'ordre au fur et à mesure (fichier identique au rendu en série).
+    Retourne la taille du fichier.
+    """
+    parties = await executeur.executer(tache_parties_pdf, data, date_creation)
+    if parties is None:
+        return await executeur.executer(tache_rendu_pdf_fichier, data, chemin)
+    synthese, taches = parties
+    fusion = FusionPDF()
+    sortie = await asyncio.to_thread(open, chemin, 'wb')
+
+    def ecrire(blocs: Iterable[bytes]) -> int:
+        return sum(sortie.write(bloc) for bloc in blocs)
+
+    en_cours: Deque[asyncio.Future] = deque()
+    try:
+        taille = await asyncio.to_thread(lambda: ecrire(fusion.ajouter(synthese)))
+        for fn, *arguments in taches:
+            # Les parties attendent leur place dans la file du pool, comme les projets d'un lot
+            en_cours.append(asyncio.ensure_future(executeur.executer(fn, *arguments, attendre=True)))
+            if len(en_cours) >= max(1, avance):
+                contenu = await en_cours.popleft()
+                taille += await asyncio.to_thread(lambda: ecrire(fusion.ajouter(contenu)))
+        while en_cours:
+            contenu = await en_cours.popleft()
+            taille += await asyncio.to_thread(lambda: ecrire(fusion.ajouter(contenu)))
+        taille += await asyncio.to_thread(lambda: ecrire(fusion.terminer()))
+        return taille
+    finally:
+        for tache in en_cours:
+            tache.cancel()
+        await asyncio.to_thread(sortie.close)
+
+
+def creer_executeur_depuis_env() -> ExecuteurRendu:
+    """Construit l'exécuteur à partir des variables RENDU_WORKERS, RENDU_FILE_MAX, RENDU_RETRY_AFTER et RENDU_CONTEXTE."""
+    nb_workers = int(os.getenv("RENDU_WORKERS", str(min(4, os.cpu_count() or 1))))
+    file_max = int(os.getenv("RENDU_FILE_MAX", "8"))
+    retry_after = int(os.getenv("RENDU_RETRY_AFTER", "5"))
+    return ExecuteurRendu(nb_workers=nb_workers, file_max=file_max, retry_after=retry_after)
@@ -0,0 +1,39 @@
+# repartition.py
+
+from typing import Tuple
+
+import numpy as np
+
+# Tolérance utilisée par calculate_repartition pour décider s'il faut ajouter un barreau
+TOLERANCE_ECART = 1e-9
+
+
+def calculate_repartition_batch(longueurs_libres, epaisseurs_barreau, ecarts_maximaux) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Version vectorisée de `calculate_repartition` pour un grand nombre de sections.
+    Les trois paramètres sont des tableaux (ou des scalaires, diffusés par NumPy).
+    Retourne (nombre_barreaux, vide_entre_barreaux_mm, jeu_depart_mm), avec exactement les mêmes
+    valeurs que la version scalaire, y compris les cas limites (arrondi supérieur, écart tombant juste).
+    """
+    longueurs, epaisseurs, ecarts = np.broadcast_arrays(
+        np.asarray(longueurs_libres, dtype=np.float64),
+        np.asarray(epaisseurs_barreau, dtype=np.float64),
+        np.asarray(ecarts_maximaux, dtype=np.float64),
+    )
+    invalide = (longueurs <= 0) | (epaisseurs <= 0) | (ecarts <= 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        nombre_blocs = longueurs / (epaisseurs + ecarts)
+        nombre_barreaux = np.maximum(np.ceil(nombre_blocs - 1), 0)
+        espacement_reel = (longueurs - nombre_barreaux * epaisseurs) / (nombre_barreaux + 1)
+
+        # Si l'espacement dépasse l'écart maximal, on ajoute un barreau et on recalcule
+        trop_large = espacement_reel > (ecarts + TOLERANCE_ECART)
+        nombre_barreaux = np.where(trop_large, nombre_barreaux + 1, nombre_barreaux)
+        espacement_reel = np.where(trop_large, (longueurs - nombre_barreaux * epaisseurs) / (nombre_barreaux + 1), espacement_reel)
+
+    sans_barreau = invalide | (nombre_barreaux <= 0)
+    nombre_barreaux = np.where(sans_barreau, 0, nombre_barreaux).astype(np.int64)
+    vide = np.where(sans_barreau, 0.0, espacement_reel)
+    jeu_depart = np.where(sans_barreau, longueurs, espacement_reel)
+    return nombre_barreaux, vide, jeu_depart
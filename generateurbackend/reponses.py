@@ -0,0 +1,87 @@
+# reponses.py
+# Encodage et décodage JSON des gros plans, sans détour par jsonable_encoder ni par json :
+# les réponses sont encodées par orjson (json de la bibliothèque standard s'il n'est pas installé),
+# les corps de requête sont validés par Pydantic directement depuis les octets reçus.
+
+import json
+import math
+from typing import Any, Callable, Optional, Type
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Nombre de décimales maximal accepté pour l'arrondi des réponses (paramètre `decimales`)
+DECIMALES_MAX = 6
+
+
+def arrondir_flottants(contenu: Any, decimales: int) -> Any:
+    """Copie de `contenu` (dictionnaires, listes) dont chaque flottant est arrondi à `decimales` décimales."""
+    if isinstance(contenu, float):
+        return round(contenu, decimales)
+    if isinstance(contenu, dict):
+        return {cle: arrondir_flottants(valeur, decimales) for cle, valeur in contenu.items()}
+    if isinstance(contenu, (list, tuple)):
+        return [arrondir_flottants(valeur, decimales) for valeur in contenu]
+    return contenu
+
+def remplacer_non_finis(contenu: Any) -> Any:
+    """Copie de `contenu` dont chaque flottant NaN ou infini est remplacé par None."""
+    if isinstance(contenu, float):
+        return contenu if math.isfinite(contenu) else None
+    if isinstance(contenu, dict):
+        return {cle: remplacer_non_finis(valeur) for cle, valeur in contenu.items()}
+    if isinstance(contenu, (list, tuple)):
+        return [remplacer_non_finis(valeur) for valeur in contenu]
+    return contenu
+
+def encoder_json(contenu: Any) -> bytes:
+    """
+    JSON compact (UTF-8) d'un contenu déjà composé de types JSON. NaN et infinis sont écrits `null`,
+    comme le fait orjson, y compris sans lui : une vérification préalable de tout le contenu coûterait
+    plusieurs fois son encodage.
+    """
+    if orjson is not None:
+        return orjson.dumps(contenu)
+    try:
+        return json.dumps(contenu, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        return encoder_json(remplacer_non_finis(contenu))
+
+class ReponseJSON(JSONResponse):
+    """
+    Réponse JSON encodée par orjson. Renvoyée directement par une route, elle évite à FastAPI
+    de reparcourir le contenu avec jsonable_encoder. `decimales` arrondit les flottants du contenu.
+    """
+
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[dict] = None, decimales: Optional[int] = None, **kwargs):
+        if decimales is not None:
+            content = arrondir_flottants(content, decimales)
+        super().__init__(content, status_code=status_code, headers=headers, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return encoder_json(content)
+
+
+def corps_json(modele: Type[BaseModel]) -> Callable:
+    """
+    Dépendance FastAPI qui valide le corps de la requête en `modele` directement depuis les octets
+    (`model_validate_json`), plus rapide que json.loads suivi de la validation des dictionnaires.
+    Le schéma du corps est à déclarer dans `openapi_extra` (voir `schema_corps`).
+    """
+    async def lire(request: Request) -> BaseModel:
+        try:
+            return modele.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise RequestValidationError([{**erreur, "loc": ("body", *erreur["loc"])} for erreur in e.errors(include_url=False)])
+    return lire
+
+def schema_corps(modele: Type[BaseModel]) -> dict:
+    """Description OpenAPI d'un corps JSON lu par `corps_json` (le modèle doit figurer dans les schémas de l'API)."""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{modele.__name__}"}}}}}
@@ -0,0 +1,16 @@
+# test_benchmark.py
+from generateurbackend.benchmark import ETAPES, comparer, mesurer_scenario
+
+
+def test_mesure_scenario_minimal():
+    """Chaque étape d'un petit scénario produit une latence, un pic mémoire et une taille de sortie."""
+    lignes = mesurer_scenario({"morceaux": 1, "sections": 2, "remplissage": "barreaudage_horizontal", "platine": True}, repetitions=1)
+    assert [ligne["etape"] for ligne in lignes] == list(ETAPES)
+    assert all(ligne["secondes"] > 0 and ligne["octets"] > 0 and ligne["memoire_max"] > 0 for ligne in lignes)
+
+def test_comparaison_detecte_les_regressions():
+    scenario = {"morceaux": 1, "sections": 1, "remplissage": "barreaudage_vertical", "platine": False, "etape": "pdf"}
+    reference = {"resultats": [{**scenario, "secondes": 1.0, "memoire_max": 100, "octets": 1000}]}
+    rapport = {"resultats": [{**scenario, "secondes": 1.5, "memoire_max": 110, "octets": 1000}]}
+    regressions = comparer(rapport, reference, seuil=1.2)
+    assert [(r["mesure"], r["ratio"]) for r in regressions] == [("secondes", 1.5)]
@@ -0,0 +1,68 @@
+# test_cache_ia.py
+import asyncio
+
+from generateurbackend.cache_ia import CacheAnalyses, cle_description
+
+
+def test_cle_normalisee():
+    """Espaces et casse n'entrent pas dans la clé ; l'analyseur, si."""
+    cle = cle_description("Garde-corps  de 7m\n en 2 morceaux", "local")
+    assert cle_description("  garde-corps de 7M en 2 MORCEAUX ", "local") == cle
+    assert cle_description("garde-corps de 7m en 3 morceaux", "local") != cle
+    assert cle_description("garde-corps de 7m en 2 morceaux", "gemini:modele") != cle
+
+def test_expiration_et_lru():
+    cache = CacheAnalyses(max_entrees=10, ttl=-1)
+    cache.put("a", {"nom_client": "A"})
+    assert cache.get("a") is None
+
+    cache = CacheAnalyses(max_entrees=2, ttl=60)
+    cache.put("a", {"nom_client": "A"})
+    cache.put("b", {"nom_client": "B"})
+    cache.get("a")
+    cache.put("c", {"nom_client": "C"})
+    assert cache.get("b") is None and cache.get("a") == {"nom_client": "A"}
+    assert CacheAnalyses(max_entrees=0, ttl=60).get("a") is None
+
+def test_persistance_sqlite(tmp_path):
+    """Les entrées survivent à un redémarrage ; les moins récemment utilisées restent évincées."""
+    fichier = tmp_path / "analyses.sqlite"
+    cache = CacheAnalyses(max_entrees=2, ttl=60, fichier=fichier)
+    cache.put("a", {"nom_client": "A", "morceaux": []})
+    cache.put("b", {"nom_client": "B"})
+    cache.get("a")
+    cache.put("c", {"nom_client": "C"})
+    cache.fermer()
+
+    recharge = CacheAnalyses(max_entrees=2, ttl=60, fichier=fichier)
+    assert recharge.get("a") == {"nom_client": "A", "morceaux": []}
+    assert recharge.get("b") is None and recharge.get("c") == {"nom_client": "C"}
+    recharge.fermer()
+
+def test_lecture_sans_ecriture_sqlite(tmp_path):
+    """Un accès ne touche pas la base : sa date est écrite au put suivant ou à la fermeture."""
+    fichier = tmp_path / "analyses.sqlite"
+    cache = CacheAnalyses(max_entrees=2, ttl=60, fichier=fichier)
+    cache.put("a", {"nom_client": "A"})
+    cache.put("b", {"nom_client": "B"})
+    requetes = []
+    cache._base.set_trace_callback(requetes.append)
+    assert cache.get("a") == {"nom_client": "A"}
+    assert requetes == []
+    cache.fermer()
+
+    # L'accès reporté à la fermeture fait de « b » l'entrée la moins récente
+    recharge = CacheAnalyses(max_entrees=1, ttl=60, fichier=fichier)
+    assert recharge.get("a") == {"nom_client": "A"} and recharge.get("b") is None
+    recharge.fermer()
+
+def test_parse_text_en_cache(monkeypatch):
+    from generateurbackend import main
+    from generateurbackend.client_ia import BackendLocal, ClientIA
+    backend = BackendLocal({"nom_client": "Dupont"})
+    monkeypatch.setattr(main, "client_ia", ClientIA(backend))
+    monkeypatch.setattr(main, "cache_analyses", CacheAnalyses(max_entrees=10, ttl=60))
+    for description in ("Garde-corps pour M. Dupont", "garde-corps  pour m. dupont"):
+        formulaire = asyncio.run(main.parse_text_to_form(main.DescriptionData(description=description)))
+        assert formulaire.nom_client == "Dupont"
+    assert backend.appels == 1
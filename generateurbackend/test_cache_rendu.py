@@ -0,0 +1,129 @@
+# test_cache_rendu.py
+import asyncio
+import json
+
+from starlette.requests import Request
+
+from generateurbackend.cache_rendu import CacheRendu, cle_rendu
+from generateurbackend.rendu import ExecuteurRendu
+
+
+def test_cle_rendu_canonique():
+    """La clé ne dépend pas de l'ordre des champs, mais bien du format et de la version."""
+    a = cle_rendu({"x": 1, "y": [1, 2]}, "pdf", "1")
+    assert a == cle_rendu({"y": [1, 2], "x": 1}, "pdf", "1")
+    assert a != cle_rendu({"x": 1, "y": [1, 2]}, "dxf", "1")
+    assert a != cle_rendu({"x": 1, "y": [1, 2]}, "pdf", "2")
+
+def lire(cache: CacheRendu, cle: str):
+    """Contenu de l'entrée (descripteur refermé), ou None."""
+    fichier = cache.get(cle)
+    if fichier is None:
+        return None
+    with fichier:
+        return fichier.read()
+
+def test_cache_hits_et_misses(tmp_path):
+    """Un rendu stocké est retrouvé, et les compteurs suivent les accès."""
+    cache = CacheRendu(tmp_path / "cache", taille_max=1000)
+    assert cache.get("a") is None
+    chemin = cache.put("a", b"x" * 10)
+    with cache.get("a") as fichier:
+        assert fichier.name == str(chemin) and fichier.read() == b"x" * 10
+    assert [f.name for f in (tmp_path / "cache").iterdir()] == ["a"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_cache_eviction_lru(tmp_path):
+    """Au-delà de la taille maximale, l'entrée la moins récemment utilisée est supprimée."""
+    cache = CacheRendu(tmp_path / "cache", taille_max=250)
+    cache.put("a", b"x" * 100)
+    cache.put("b", b"x" * 100)
+    lire(cache, "a")
+    cache.put("c", b"x" * 100)
+    assert lire(cache, "b") is None
+    assert lire(cache, "a") is not None and lire(cache, "c") is not None
+    assert cache.stats()["octets"] == 200
+
+def test_eviction_pendant_la_lecture(tmp_path):
+    """Un fichier évincé pendant son envoi reste lisible jusqu'au bout par le descripteur déjà ouvert."""
+    cache = CacheRendu(tmp_path / "cache", taille_max=150)
+    cache.put("a", b"a" * 100)
+    fichier = cache.get("a")
+    cache.put("b", b"b" * 100)
+    assert not (tmp_path / "cache" / "a").exists()
+    with fichier:
+        assert fichier.read() == b"a" * 100
+
+def test_cache_rechargement_disque(tmp_path):
+    """Les entrées survivent à la recréation du cache sur le même dossier."""
+    CacheRendu(tmp_path / "cache", taille_max=1000).put("a", b"x" * 10)
+    assert lire(CacheRendu(tmp_path / "cache", taille_max=1000), "a") == b"x" * 10
+
+def test_draw_dxf_utilise_le_cache(tmp_path, monkeypatch, projet_exemple):
+    """Le second appel identique est servi depuis le cache, sans nouveau rendu."""
+    from generateurbackend import main
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=10**8))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    requete = Request({"type": "http", "headers": []})
+    plan = main.FinalPlanData(**json.loads(asyncio.run(main.process_data(main.ProjectData(**projet_exemple), requete)).body)["data"])
+    asyncio.run(main.draw_dxf_plan(plan, requete))
+
+    def rendu_interdit(data):
+        raise AssertionError("le rendu ne devait pas être relancé")
+    monkeypatch.setattr(main, "tache_rendu_dxf", rendu_interdit)
+    asyncio.run(main.draw_dxf_plan(plan, requete))
+    stats = main.cache_rendu.stats()
+    assert (stats["hits"], stats["misses"], stats["entrees"]) == (1, 1, 1)
+
+def test_grand_plan_pdf_ecrit_en_flux_dans_le_cache(tmp_path, monkeypatch):
+    """Au-delà du seuil de morceaux distincts, le PDF est écrit page par page directement dans le cache."""
+    from generateurbackend import main
+    from generateurbackend.benchmark import plan_synthetique
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=10**8))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    monkeypatch.setattr(main, "RENDU_GRAND_PLAN_MORCEAUX", 2)
+
+    def rendu_interdit(data):
+        raise AssertionError("le rendu en mémoire ne devait pas être utilisé")
+    monkeypatch.setitem(main.FORMATS_RENDU["pdf"], "tache", rendu_interdit)
+    reponse = asyncio.run(main.rendre_plan(plan_synthetique(3, 4), "pdf"))
+    assert reponse.background is None
+    fichiers = [f for f in (tmp_path / "cache").iterdir()]
+    assert len(fichiers) == 1 and fichiers[0].read_bytes().startswith(b"%PDF-")
+    assert int(reponse.headers["Content-Length"]) == fichiers[0].stat().st_size
+
+def test_rendu_envoye_malgre_un_cache_en_echec(tmp_path, monkeypatch):
+    """Un cache qui échoue après un rendu réussi est signalé, et le fichier est envoyé quand même."""
+    import threading
+    from generateurbackend import main
+    from generateurbackend.benchmark import plan_synthetique
+
+    class CacheEnEchec(CacheRendu):
+        def put(self, cle, contenu):
+            raise OSError("disque plein")
+
+        def adopter(self, cle, chemin):
+            raise OSError("disque plein")
+
+    monkeypatch.setattr(main, "cache_rendu", CacheEnEchec(tmp_path / "cache", taille_max=10**8))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    monkeypatch.setattr(main, "RENDU_GRAND_PLAN_MORCEAUX", 3)
+    fils = []
+
+    def cle_espion(*args):
+        fils.append(threading.current_thread())
+        return cle_rendu(*args)
+    monkeypatch.setattr(main, "cle_rendu", cle_espion)
+
+    async def telecharger(plan, format_sortie):
+        reponse = await main.rendre_plan(plan, format_sortie)
+        contenu = b"".join([bloc async for bloc in reponse.body_iterator])
+        if reponse.background is not None:
+            await reponse.background()
+        return contenu
+
+    # Rendu en mémoire (put) puis grand plan écrit en flux (adopter)
+    assert asyncio.run(telecharger(plan_synthetique(2, 3), "dxf")).startswith(b"  0\nSECTION")
+    assert asyncio.run(telecharger(plan_synthetique(3, 4), "pdf")).startswith(b"%PDF-")
+    assert len(fils) == 2 and threading.main_thread() not in fils
+    assert [f for f in tmp_path.rglob("*") if f.is_file()] == []
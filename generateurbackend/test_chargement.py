@@ -0,0 +1,47 @@
+# test_chargement.py
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from generateurbackend.chargement import module_optionnel, prechauffer
+
+
+def test_demarrage_sans_dependances_lourdes():
+    """Importer l'application ne charge ni le SDK Gemini, ni PIL, ni fpdf, ni ezdxf."""
+    code = "import sys, generateurbackend.main; print(sorted(m for m in ('ezdxf', 'fpdf', 'google.generativeai', 'PIL.Image') if m in sys.modules))"
+    sortie = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent.parent)
+    assert sortie.stdout.strip() == "[]"
+
+def test_module_optionnel_et_prechauffage():
+    assert module_optionnel("module_absent_du_projet") is None
+    assert module_optionnel("json") is sys.modules["json"]
+    appels = []
+    durees = prechauffer(["generateurbackend.dessin_dxf", "module_absent_du_projet"], [lambda: appels.append(1), lambda: 1 / 0])
+    assert set(durees) == {"generateurbackend.dessin_dxf", "module_absent_du_projet"} and appels == [1]
+    assert "generateurbackend.dessin_dxf" in sys.modules
+
+SCENARIO_PRECHAUFFAGE = """
+import asyncio, json, sys
+from starlette.requests import Request
+from generateurbackend import main
+
+async def scenario():
+    requete = Request({"type": "http", "headers": []})
+    plan = main.FinalPlanData(**json.loads((await main.process_data(main.ProjectData(**json.loads(sys.argv[1])), requete)).body)["data"])
+    async with main.lifespan(main.app):
+        # Premier rendu pendant que le préchauffage importe encore les modules lourds
+        reponse = await asyncio.wait_for(main.draw_dxf_plan(plan, requete), 60)
+        print(b"".join([bloc async for bloc in reponse.body_iterator])[:12].decode().split())
+
+asyncio.run(scenario())
+"""
+
+def test_rendu_dxf_pendant_le_prechauffage(tmp_path, projet_exemple):
+    """Au démarrage avec préchauffage, le premier rendu DXF (pool de processus) aboutit."""
+    env = dict(os.environ, PRECHAUFFAGE="1", RENDU_WORKERS="1", RENDU_CACHE_MAX_MO="0", RENDU_CACHE_DIR=str(tmp_path))
+    sortie = subprocess.run([sys.executable, "-c", SCENARIO_PRECHAUFFAGE, json.dumps(projet_exemple)], capture_output=True, text=True,
+                            timeout=120, env=env, cwd=Path(__file__).resolve().parent.parent)
+    assert sortie.returncode == 0, sortie.stderr
+    assert sortie.stdout.strip() == "['0', 'SECTION']"
@@ -0,0 +1,113 @@
+# test_client_ia.py
+import asyncio
+import base64
+import threading
+
+import pytest
+
+from generateurbackend.client_ia import BackendGemini, BackendIA, BackendLocal, ClientIA, ErreurTemporaireIA, ServiceIAError, lire_json
+
+
+class BackendInstable(BackendIA):
+    """Échoue (erreur temporaire ou lenteur) sur les `echecs` premiers appels, puis répond."""
+
+    def __init__(self, echecs: int, lent: bool = False):
+        self.echecs, self.lent, self.appels = echecs, lent, 0
+
+    async def analyser_texte(self, description, schema):
+        self.appels += 1
+        if self.appels <= self.echecs:
+            if self.lent:
+                await asyncio.sleep(1)
+            raise ErreurTemporaireIA("quota dépassé")
+        return {"nom_client": description}
+
+
+def test_nouvelles_tentatives_puis_echec():
+    backend = BackendInstable(echecs=2)
+    assert asyncio.run(ClientIA(backend, tentatives=3, attente=0).analyser_texte("Dupont", {})) == {"nom_client": "Dupont"}
+    assert backend.appels == 3
+
+    with pytest.raises(ServiceIAError) as exc_info:
+        asyncio.run(ClientIA(BackendInstable(echecs=5), tentatives=2, attente=0).analyser_texte("Dupont", {}))
+    assert exc_info.value.status_code == 503
+    with pytest.raises(ServiceIAError) as exc_info:
+        asyncio.run(ClientIA(BackendInstable(echecs=5, lent=True), delai=0.01, tentatives=2, attente=0).analyser_texte("Dupont", {}))
+    assert exc_info.value.status_code == 504
+
+def test_concurrence_bornee():
+    """Au-delà de `concurrence` appels simultanés, les suivants attendent leur tour."""
+    en_cours, maximum = 0, 0
+
+    class BackendCompte(BackendLocal):
+        async def analyser_texte(self, description, schema):
+            nonlocal en_cours, maximum
+            en_cours += 1
+            maximum = max(maximum, en_cours)
+            await asyncio.sleep(0.01)
+            en_cours -= 1
+            return {}
+
+    async def scenario():
+        client = ClientIA(BackendCompte(), concurrence=2)
+        await asyncio.gather(*(client.analyser_texte("texte", {}) for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert maximum == 2
+
+def test_attente_hors_du_semaphore():
+    """Pendant l'attente avant une nouvelle tentative, la place est rendue aux autres appels."""
+    ordre = []
+
+    class BackendTrace(BackendInstable):
+        async def analyser_texte(self, description, schema):
+            ordre.append(description)
+            return await super().analyser_texte(description, schema)
+
+    async def scenario():
+        client = ClientIA(BackendTrace(echecs=1), concurrence=1, tentatives=2, attente=0.05)
+        return await asyncio.gather(client.analyser_texte("A", {}), client.analyser_texte("B", {}))
+
+    assert asyncio.run(scenario()) == [{"nom_client": "A"}, {"nom_client": "B"}]
+    assert ordre == ["A", "B", "A"]
+
+def test_modele_gemini_resolu_hors_de_la_boucle():
+    """L'import et la configuration du SDK (premier appel) ne s'exécutent pas dans le thread de la boucle."""
+    threads = []
+
+    class Modele:
+        async def generate_content_async(self, contenu):
+            return type("Reponse", (), {"text": '{"nom_client": "Dupont"}'})()
+
+    class BackendGeminiFactice(BackendGemini):
+        def _creer_modele(self):
+            threads.append(threading.current_thread())
+            self._modele = Modele()
+            return self._modele
+
+    backend = BackendGeminiFactice("cle", "modele")
+    for _ in range(2):
+        assert asyncio.run(backend.analyser_texte("Dupont", {})) == {"nom_client": "Dupont"}
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+def test_lecture_reponse_et_image():
+    assert lire_json('```json\n{"hauteur_totale": 1100}\n```') == {"hauteur_totale": 1100}
+    with pytest.raises(ServiceIAError):
+        lire_json("[1, 2]")
+    client = ClientIA(BackendLocal({"barreau_dims": "20x20"}))
+    image = "data:image/png;base64," + base64.b64encode(b"\x89PNG").decode()
+    assert asyncio.run(client.analyser_image(image, {})) == {"barreau_dims": "20x20"}
+    with pytest.raises(ServiceIAError) as exc_info:
+        asyncio.run(client.analyser_image("pas de l'image !", {}))
+    assert exc_info.value.status_code == 422
+
+def test_routes_avec_backend_local(monkeypatch):
+    from generateurbackend import main
+    backend = BackendLocal({"nom_client": "Dupont", "hauteur_totale": 1100, "champ_inconnu": 1})
+    monkeypatch.setattr(main, "client_ia", ClientIA(backend))
+    formulaire = asyncio.run(main.parse_text_to_form(main.DescriptionData(description="garde-corps pour M. Dupont")))
+    assert formulaire.nom_client == "Dupont" and formulaire.hauteur_totale == 1100 and formulaire.poteau_dims == "40x40"
+
+    backend.reponse = {"hauteur_totale": "haute"}
+    with pytest.raises(ServiceIAError):
+        asyncio.run(main.parse_text_to_form(main.DescriptionData(description="garde-corps")))
@@ -0,0 +1,67 @@
+# test_colonnes.py
+import random
+
+import numpy as np
+import pytest
+
+from generateurbackend.colonnes import TYPE_AUTRE, TYPE_LIAISON, TYPE_POTEAU, StructureColonnes, longueurs_libres
+
+DEDUCTIONS = {"poteau": 40, "liaison": 20}
+
+
+def _longueurs_libres_reference(morceaux):
+    """Calcul élément par élément : chaque section perd la moitié des jonctions voisines (tout, en extrémité)."""
+    resultat = []
+    for i, morceau in enumerate(morceaux):
+        items = [item for item in morceau["structure"] if item["type"] != "rien"]
+        if len(items) < 2:
+            continue
+        for idx, item in enumerate(items):
+            if item["type"] != "section":
+                continue
+            gauche = DEDUCTIONS.get(items[idx - 1]["type"], 0) / (1 if idx - 1 == 0 else 2) if idx > 0 else 0
+            droite = DEDUCTIONS.get(items[idx + 1]["type"], 0) / (1 if idx + 1 == len(items) - 1 else 2) if idx < len(items) - 1 else 0
+            resultat.append((i, item["longueur"] - gauche - droite))
+    return resultat
+
+def _libres(morceaux):
+    structure = StructureColonnes.depuis_morceaux(morceaux)
+    deductions = np.zeros(TYPE_AUTRE + 1)
+    deductions[TYPE_POTEAU], deductions[TYPE_LIAISON] = DEDUCTIONS["poteau"], DEDUCTIONS["liaison"]
+    retenus, _, _, libres, debuts = longueurs_libres(structure, deductions)
+    morceau_de = np.repeat(retenus, np.diff(debuts))
+    return list(zip(morceau_de.tolist(), libres.tolist()))
+
+def test_structure_en_colonnes():
+    """Types codés, longueurs absentes en NaN, types inconnus conservés et restitués à l'identique."""
+    morceaux = [
+        {"angle": 0.0, "structure": [{"type": "poteau", "longueur": None}, {"type": "section", "longueur": 1000.0}, {"type": "poteau", "longueur": None}]},
+        {"angle": 30.0, "structure": [{"type": "rien", "longueur": None}, {"type": "garde", "longueur": 5.0}]},
+    ]
+    structure = StructureColonnes.depuis_morceaux(morceaux)
+    assert structure.types.dtype == np.int8 and structure.debuts.tolist() == [0, 3, 5]
+    assert np.isnan(structure.longueurs[0]) and structure.longueurs[1] == 1000
+    assert [vue.structure_dict() for vue in structure] == [m["structure"] for m in morceaux]
+    assert structure.morceau(1).angle == 30.0
+    assert structure.morceau(0).cle() != structure.morceau(1).cle()
+
+@pytest.mark.parametrize("graine", range(5))
+def test_longueurs_libres_identiques_au_calcul_par_element(graine):
+    """Propriété : sur des structures aléatoires (« rien », extrémités, morceaux trop courts), les deux calculs coïncident exactement."""
+    rng = random.Random(graine)
+    morceaux = []
+    for _ in range(200):
+        structure = []
+        for _ in range(rng.randint(0, 9)):
+            type_ = rng.choice(["poteau", "liaison", "section", "section", "rien", "platine"])
+            structure.append({"type": type_, "longueur": round(rng.uniform(100, 2000), rng.randint(0, 2)) if type_ == "section" else None})
+        morceaux.append({"angle": 0.0, "structure": structure})
+    assert _libres(morceaux) == _longueurs_libres_reference(morceaux)
+
+def test_plan_dict_conforme_au_modele(projet_exemple):
+    """Le plan calculé en colonnes a exactement la forme et les types de `FinalPlanData.model_dump()`."""
+    from generateurbackend.calcul import FinalPlanData, ProjectData, calculer_plan_dict
+    for remplissage in ("barreaudage_vertical", "barreaudage_horizontal"):
+        plan = calculer_plan_dict(ProjectData(**dict(projet_exemple, remplissage_type=remplissage)))
+        assert FinalPlanData.model_validate(plan).model_dump() == plan
+        assert all(type(s["vide_entre_barreaux_mm"]) is float for m in plan["morceaux"] for s in m["sections_details"])
@@ -0,0 +1,110 @@
+# test_dessin_dxf.py
+import asyncio
+import json
+
+import pytest
+
+from generateurbackend.dessin_dxf import COTES_NATIVES, COTES_RENDUES, PREFIXE_BLOC_MORCEAU, creer_plan_dxf
+
+
+@pytest.fixture
+def plan_repete(projet_exemple, requete):
+    """Plan de cinq morceaux dont seulement deux géométries distinctes."""
+    from generateurbackend.main import ProjectData, process_data
+    droit, rampant = projet_exemple["morceaux"]
+    projet_exemple["morceaux"] = [droit, droit, rampant, droit, rampant]
+    projet_exemple["nombre_morceaux"] = 5
+    return json.loads(asyncio.run(process_data(ProjectData(**projet_exemple), requete)).body)["data"]
+
+def test_morceaux_identiques_en_blocs(plan_repete):
+    """Chaque morceau distinct est défini une fois dans un bloc, puis inséré à chaque occurrence."""
+    doc = creer_plan_dxf(plan_repete)
+    blocs = [bloc.name for bloc in doc.blocks if bloc.name.startswith(PREFIXE_BLOC_MORCEAU)]
+    assert blocs == [f"{PREFIXE_BLOC_MORCEAU}1", f"{PREFIXE_BLOC_MORCEAU}2"]
+
+    insertions = doc.modelspace().query("INSERT")
+    assert [insert.dxf.name for insert in insertions] == [f"{PREFIXE_BLOC_MORCEAU}{n}" for n in (1, 1, 2, 1, 2)]
+    abscisses = [insert.dxf.insert.x for insert in insertions]
+    assert abscisses == sorted(abscisses)
+    # Les barreaux ne sont dessinés que dans les définitions de blocs
+    assert len(doc.modelspace().query("LWPOLYLINE[layer=='BARREAU']")) == 0
+    assert len(doc.blocks.get(f"{PREFIXE_BLOC_MORCEAU}1").query("LWPOLYLINE[layer=='BARREAU']")) == 15
+
+def test_cotes_natives_blocs_partages(projet_exemple):
+    """
+    En profil natif, les cotes de même forme partagent un bloc de géométrie, décalé par leur point
+    d'insertion : le fichier passe l'audit et chaque cote se dessine comme en profil rendu.
+    """
+    from ezdxf import bbox
+    from generateurbackend.calcul import ProjectData, calculer_plan_dict
+    for morceau in projet_exemple["morceaux"]:
+        morceau["structure"] = [{"type": "poteau"}] + [{"type": "section", "longueur": 1000}, {"type": "liaison"}] * 3 + [{"type": "section", "longueur": 1000}, {"type": "poteau"}]
+        morceau["nombre_sections"] = 4
+    plan = calculer_plan_dict(ProjectData(**projet_exemple))
+    dessins = {}
+    for cotes in (COTES_RENDUES, COTES_NATIVES):
+        doc = creer_plan_dxf(plan, cotes=cotes)
+        auditeur = doc.audit()
+        assert not auditeur.fixes and not auditeur.errors
+        dimensions = [e for bloc in doc.blocks if bloc.name.startswith(PREFIXE_BLOC_MORCEAU) for e in bloc.query("DIMENSION")]
+        assert all(dimension.dxf.geometry in doc.blocks for dimension in dimensions)
+        emprises = [bbox.extents(dimension.virtual_entities()) for dimension in dimensions]
+        dessins[cotes] = ([(e.extmin.round(6), e.extmax.round(6)) for e in emprises], sum(bloc.name.startswith("*D") for bloc in doc.blocks))
+    assert dessins[COTES_NATIVES][0] == dessins[COTES_RENDUES][0]
+    # Par morceau, 11 cotes : 2 hauteurs, 1 longueur totale, 4 sections et 4 vides. Vides d'extrémité et
+    # vides intermédiaires : 2 formes ; sections : 1 forme, 3 sur le rampant (sections d'extrémité différentes)
+    assert dessins[COTES_RENDUES][1] == 2 * 11 and dessins[COTES_NATIVES][1] == (3 + 1 + 2) + (3 + 3 + 2)
+
+def test_emprise_incrementale(plan_repete):
+    """L'emprise tenue à jour pendant le dessin englobe celle calculée par ezdxf et figure dans le fichier."""
+    from ezdxf import bbox
+    from generateurbackend.dessin_dxf import serialiser_dxf
+    doc = creer_plan_dxf(plan_repete)
+    reelle = bbox.extents(doc.modelspace())
+    extmin, extmax = doc.header["$EXTMIN"], doc.header["$EXTMAX"]
+    assert extmin[0] <= reelle.extmin.x and extmin[1] <= reelle.extmin.y
+    assert extmax[0] >= reelle.extmax.x and extmax[1] >= reelle.extmax.y
+    assert extmax[0] - extmin[0] < 1.05 * reelle.size.x
+    assert f"$EXTMIN\n 10\n{extmin[0]}".encode() in serialiser_dxf(doc)
+
+def test_nouveaux_documents_independants(plan_repete):
+    """Chaque document a ses calques, son style de cotes et sa propre empreinte ; un plan n'altère pas les suivants."""
+    from generateurbackend.dessin_dxf import STYLE_COTES, nouveau_document
+    premier, second = nouveau_document(), nouveau_document()
+    assert STYLE_COTES in premier.dimstyles and "COTES_VIDE" in premier.layers and "_ARCHTICK" in premier.blocks
+    assert premier.header["$FINGERPRINTGUID"] != second.header["$FINGERPRINTGUID"]
+    premier.layers.add("AJOUT")
+    creer_plan_dxf(plan_repete)
+    assert "AJOUT" not in second.layers and "AJOUT" not in nouveau_document().layers
+
+def test_feuilles_et_rangees_pour_installation_longue():
+    """Une longue installation est répartie en rangées dans l'espace objet et en feuilles A3 avec fenêtres."""
+    from generateurbackend.benchmark import plan_synthetique
+    from generateurbackend.dessin_dxf import LONGUEUR_RANGEE_MAX
+    doc = creer_plan_dxf(plan_synthetique(30, 6))
+    insertions = doc.modelspace().query("INSERT")
+    assert max(insert.dxf.insert.x for insert in insertions) < LONGUEUR_RANGEE_MAX
+    assert len({insert.dxf.insert.y for insert in insertions}) > 1
+
+    feuilles = [nom for nom in doc.layouts.names() if nom != "Model"]
+    assert feuilles == [f"Feuille {n}" for n in range(1, len(feuilles) + 1)] and len(feuilles) > 1
+    # Une fenêtre pour le cartouche, au moins une pour la vue d'ensemble et une par morceau (hors fenêtre principale)
+    fenetres = [vp for nom in feuilles for vp in doc.paperspace(nom).query("VIEWPORT") if vp.dxf.id > 1]
+    assert len(fenetres) >= 1 + 1 + 30
+    for vp in fenetres:
+        assert vp.dxf.width <= 400 and vp.dxf.height <= 277
+
+def test_plan_valide_a_la_relecture(plan_repete):
+    """Le fichier produit se relit, passe l'audit sans correction et n'a aucun handle en double."""
+    import io
+    import re
+    import ezdxf
+    from generateurbackend.dessin_dxf import creer_plan_dxf_bytes
+    for cotes in (COTES_RENDUES, COTES_NATIVES):
+        texte = creer_plan_dxf_bytes(plan_repete, cotes=cotes).decode("utf-8")
+        handles = re.findall(r"\n  5\n([0-9A-F]+)\n", texte)
+        assert handles and len(handles) == len(set(handles))
+        doc = ezdxf.read(io.StringIO(texte))
+        auditeur = doc.audit()
+        assert not auditeur.fixes and not auditeur.errors
+        assert len(doc.blocks.get(f"{PREFIXE_BLOC_MORCEAU}1").query("DIMENSION")) == 7
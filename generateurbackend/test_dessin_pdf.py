@@ -0,0 +1,102 @@
+# test_dessin_pdf.py
+import re
+import zlib
+
+import pytest
+
+from generateurbackend.benchmark import plan_synthetique
+from generateurbackend.dessin_pdf import construire_plan_pdf, iter_plan_pdf
+
+
+def test_plan_court_une_page_par_morceau():
+    """Une installation courte garde sa mise en page : une page de synthèse, puis une page par morceau."""
+    pdf = construire_plan_pdf(plan_synthetique(2, 3))
+    assert pdf.pages_count == 3
+
+def test_erreur_de_dessin_propagee():
+    """Une erreur de dessin remonte à l'appelant au lieu d'être affichée et remplacée par None."""
+    from generateurbackend.dessin_pdf import creer_plan_pdf_bytes
+    plan = plan_synthetique(2, 3)
+    del plan["morceaux"]
+    with pytest.raises(KeyError):
+        creer_plan_pdf_bytes(plan)
+
+def test_installation_longue_en_feuilles():
+    """Vue d'ensemble et morceaux trop longs pour l'échelle minimale sont répartis sur plusieurs feuilles."""
+    pdf = construire_plan_pdf(plan_synthetique(3, 40))
+    pdf.set_compression(False)
+    contenu = bytes(pdf.output())
+    nb_feuilles_vue = int(re.search(rb"Vue d'ensemble sur (\d+) feuilles", contenu).group(1))
+    assert nb_feuilles_vue > 1
+    assert len(re.findall(rb"Vue d'Ensemble - Feuille \d+/", contenu)) == nb_feuilles_vue
+    # Chacun des trois morceaux (40 sections) dépasse une page à l'échelle minimale
+    assert len(re.findall(rb"\) - Feuille 1/", contenu)) == 3
+    assert pdf.pages_count > 1 + nb_feuilles_vue + 3
+
+def test_rendu_page_par_page_identique():
+    """Le PDF assemblé page par page contient les mêmes pages que le document construit en mémoire."""
+    from generateurbackend.fusion_pdf import PartiePDF
+    plan = plan_synthetique(4, 30, platine=True)
+    blocs = list(iter_plan_pdf(plan))
+    assert len(blocs) > 1
+    contenu = b"".join(blocs)
+    assert contenu.startswith(b"%PDF-") and contenu.endswith(b"%%EOF\n")
+
+    document = PartiePDF(contenu)
+    pdf = construire_plan_pdf(plan)
+    assert len(document.pages) == pdf.pages_count
+    # Chaque entrée de la table xref pointe sur le début de son objet
+    for numero in document.objets:
+        assert re.search(rb"\n%d 0 obj\n" % numero, contenu)
+    # Les polices communes à toutes les parties ne sont écrites qu'une fois
+    polices = [corps for corps in document.objets.values() if b"/Type /Font" in corps]
+    assert len(polices) == len(set(polices))
+    # Numérotation continue des pages, d'une partie à l'autre
+    numeros = []
+    for page in document.pages:
+        flux = document.objets[int(re.search(rb"/Contents (\d+) 0 R", document.objets[page]).group(1))]
+        texte = zlib.decompress(flux[flux.index(b"stream\n") + 7:])
+        numeros.append(int(re.search(rb"\(Page (\d+)\)", texte).group(1)))
+    assert numeros == list(range(1, pdf.pages_count + 1))
+
+def test_pages_en_parallele_identiques_au_rendu_en_serie(tmp_path):
+    """Les parties dessinées dans le pool de rendu partagé donnent le même PDF, octet pour octet."""
+    import asyncio
+    from datetime import datetime, timezone
+    from generateurbackend.rendu import ExecuteurRendu, rendre_pdf_par_parties
+    plan = plan_synthetique(5, 6, platine=True)
+    date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    # Une seule place en file : les parties attendent la leur au lieu de créer d'autres processus
+    executeur = ExecuteurRendu(nb_workers=2, file_max=0)
+    chemin = tmp_path / "plan.pdf"
+    try:
+        taille = asyncio.run(rendre_pdf_par_parties(executeur, plan, str(chemin), 3, date))
+    finally:
+        executeur.fermer()
+    serie = b"".join(iter_plan_pdf(plan, date_creation=date))
+    assert chemin.read_bytes() == serie and taille == len(serie)
+    assert executeur.en_cours == 0
+
+def test_fusion_relue_par_un_lecteur_pdf():
+    """
+    Garde-fou de FusionPDF (structure des fichiers fpdf2) : un lecteur PDF relit le document assemblé
+    sans réparation, avec les mêmes pages et le même texte que le document construit en mémoire.
+    """
+    import fpdf
+    from generateurbackend.dessin_pdf import FPDF_FUSION_VERIFIEE, FUSION_PDF
+    pymupdf = pytest.importorskip("pymupdf")
+    assert FUSION_PDF == (tuple(int(n) for n in fpdf.FPDF_VERSION.split(".")[:2]) == FPDF_FUSION_VERIFIEE)
+    if not FUSION_PDF:
+        pytest.skip(f"assemblage non vérifié avec fpdf2 {fpdf.FPDF_VERSION} : plan construit en mémoire")
+    plan = plan_synthetique(4, 30, platine=True)
+    assemble = pymupdf.open(stream=b"".join(iter_plan_pdf(plan)), filetype="pdf")
+    reference = pymupdf.open(stream=bytes(construire_plan_pdf(plan).output()), filetype="pdf")
+    assert not assemble.is_repaired and assemble.page_count == reference.page_count > 1
+    assert [page.get_text() for page in assemble] == [page.get_text() for page in reference]
+
+def test_plan_en_memoire_sans_fusion_verifiee(monkeypatch):
+    """Avec une version de fpdf2 non vérifiée, le plan est produit d'un seul tenant, sans FusionPDF."""
+    from generateurbackend import dessin_pdf
+    monkeypatch.setattr(dessin_pdf, "FUSION_PDF", False)
+    blocs = list(iter_plan_pdf(plan_synthetique(2, 3)))
+    assert len(blocs) == 1 and blocs[0].startswith(b"%PDF-") and blocs[0].rstrip().endswith(b"%%EOF")
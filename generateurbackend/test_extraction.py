@@ -0,0 +1,77 @@
+# test_extraction.py
+import asyncio
+
+import pytest
+
+from generateurbackend.cache_ia import CacheAnalyses
+from generateurbackend.client_ia import BackendLocal, ClientIA, ErreurTemporaireIA, ServiceIAError
+from generateurbackend.extraction import designation_profil, extraire_formulaire
+
+FORMULAIRE_HABITUEL = "garde-corps de 7m en 2 morceaux, poteaux 40x40, barreaux 20x20, écart 110"
+
+
+def test_description_habituelle():
+    extraction = extraire_formulaire(FORMULAIRE_HABITUEL)
+    assert extraction.confiance == 1.0 and extraction.non_resolus == [] and extraction.suffisante(0.8)
+    champs = extraction.champs
+    assert (champs["poteau_dims"], champs["barreau_dims"], champs["ecart_barreaux"], champs["nombre_morceaux"]) == ("40x40", "20x20", 110, 2)
+    assert [m["structure"] for m in champs["morceaux"]] == [[{"type": "poteau"}, {"type": "section", "longueur": 3500.0}, {"type": "poteau"}]] * 2
+
+def test_unites_profils_et_coordonnees():
+    extraction = extraire_formulaire(
+        "Client : Martin SARL, chantier le 15/03/2025. Garde-corps de 12,5 m en trois morceaux identiques de 2 sections à 30°, "
+        "poteaux 40×40, lisses 40x30, barreaux Ø20, écart entre barreaux 11 cm, hauteur 1,10 m, lisse basse à 10 cm")
+    champs = extraction.champs
+    assert champs["nom_client"] == "Martin SARL" and champs["date_chantier"] == "2025-03-15"
+    assert champs["lissehaute_dims"] == champs["lissebasse_dims"] == "40x30" and champs["barreau_dims"] == "Ø20"
+    assert (champs["ecart_barreaux"], champs["hauteur_totale"], champs["hauteur_lisse_basse"]) == (110, 1100, 100)
+    assert champs["morceaux_identiques"] == "oui" and len(champs["morceaux"]) == 3
+    assert champs["morceaux"][0]["angle"] == 30.0 and champs["morceaux"][0]["structure"][1]["longueur"] == 2083.3
+    assert extraction.suffisante(0.8)
+    assert designation_profil("plat 50 x 8") == "Plat 50x8"
+
+def test_hauteur_sans_unite():
+    """L'unité d'une hauteur donnée sans unité est déduite de son ordre de grandeur."""
+    for description, hauteur in (("hauteur 1,10", 1100), ("hauteur 110", 1100), ("hauteur 1100", 1100), ("h=0.9", 900)):
+        assert extraire_formulaire(f"garde-corps de 7m en 2 morceaux, {description}").champs["hauteur_totale"] == hauteur
+    assert extraire_formulaire("hauteur 1,10, lisse basse à 0,1").champs["hauteur_lisse_basse"] == 100
+
+def test_longueurs_incoherentes_non_resolues():
+    """Une longueur totale qui contredit celle des morceaux laisse le découpage au modèle."""
+    extraction = extraire_formulaire("garde-corps de 7m en 2 morceaux de 3m, poteaux 40x40")
+    assert "morceaux" not in extraction.champs and "morceaux" in extraction.non_resolus and not extraction.suffisante(0.8)
+    champs = extraire_formulaire("garde-corps de 7m en 2 morceaux de 3,5m, poteaux 40x40").champs
+    assert [m["structure"][1]["longueur"] for m in champs["morceaux"]] == [3500.0] * 2
+
+def test_description_libre_laissee_au_modele():
+    assert not extraire_formulaire("Il faudrait un joli garde-corps pour la terrasse").suffisante(0.8)
+    # Cote non expliquée, barreaux évoqués sans dimensions
+    extraction = extraire_formulaire("garde-corps de 7m, poteaux 40x40, barreaux verticaux, environ 3 ou 4 coudes")
+    assert extraction.confiance < 0.8 and "barreau_dims" in extraction.non_resolus
+
+
+def _route(monkeypatch, backend):
+    from generateurbackend import main
+    monkeypatch.setattr(main, "client_ia", ClientIA(backend, tentatives=1))
+    monkeypatch.setattr(main, "cache_analyses", CacheAnalyses(max_entrees=10, ttl=60))
+    return lambda description: asyncio.run(main.parse_text_to_form(main.DescriptionData(description=description)))
+
+def test_parse_text_sans_appel_au_modele(monkeypatch):
+    backend = BackendLocal({"poteau_dims": "80x80"})
+    parse_text = _route(monkeypatch, backend)
+    formulaire = parse_text(FORMULAIRE_HABITUEL)
+    assert formulaire.poteau_dims == "40x40" and formulaire.nombre_morceaux == 2 and backend.appels == 0
+    # Description incomplète : le modèle complète, les champs lus par règles priment
+    formulaire = parse_text("garde-corps pour M. Dupont, poteaux 40x40, environ 3 ou 4 coudes")
+    assert backend.appels == 1 and formulaire.poteau_dims == "40x40" and formulaire.nom_client == "Dupont"
+
+def test_parse_text_modele_indisponible(monkeypatch):
+    class BackendEnPanne(BackendLocal):
+        async def analyser_texte(self, description, schema):
+            raise ErreurTemporaireIA("service surchargé")
+
+    parse_text = _route(monkeypatch, BackendEnPanne())
+    formulaire = parse_text("garde-corps pour M. Dupont, poteaux 40x40, environ 3 ou 4 coudes")
+    assert formulaire.nom_client == "Dupont" and formulaire.poteau_dims == "40x40"
+    with pytest.raises(ServiceIAError):
+        parse_text("Il faudrait un joli garde-corps pour la terrasse")
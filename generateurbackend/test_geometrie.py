@@ -0,0 +1,47 @@
+# test_geometrie.py
+import asyncio
+import json
+
+import pytest
+
+from generateurbackend.geometrie import calculer_geometrie
+from generateurbackend.main import ProjectData, process_data
+
+
+@pytest.fixture
+def plan_exemple(projet_exemple, requete):
+    projet_exemple["morceaux"].append(dict(projet_exemple["morceaux"][0]))
+    return json.loads(asyncio.run(process_data(ProjectData(**projet_exemple), requete)).body)["data"]
+
+def test_geometrie_morceaux_partages(plan_exemple):
+    """Les morceaux identiques partagent une seule géométrie ; la vue d'ensemble couvre tout le chemin."""
+    geometrie = calculer_geometrie(plan_exemple)
+    droit, rampant, copie = geometrie.morceaux
+    assert copie is droit and rampant is not droit
+    assert len(geometrie.vue_ensemble.segments) == 15
+    assert geometrie.vue_ensemble.bbox[2] == pytest.approx(geometrie.vue_ensemble.segments[-1, 2])
+
+def test_geometrie_morceau_droit(plan_exemple):
+    """Poteaux, lisses et barreaux sont placés dans le repère local du morceau."""
+    morceau = plan_exemple["morceaux"][0]
+    geometrie = calculer_geometrie(plan_exemple).morceaux[0]
+    assert geometrie.elements == ["poteau", "section", "liaison", "section", "poteau"]
+    assert geometrie.poteaux[:, 0].tolist() == [0, 40 + 950, 40 + 950 + 20 + 1150]
+    assert geometrie.lisses.shape == (4, 6)
+    # Lisse haute : sous le haut du garde-corps ; lisse basse : au-dessus de sa hauteur de pose
+    assert geometrie.lisses[0, 2:4].tolist() == [1020 - 40, 1020]
+    assert geometrie.lisses[1, 2:4].tolist() == [100, 140]
+
+    nombres = [section["nombre_barreaux"] for section in morceau["sections_details"]]
+    assert geometrie.barreaux_par_section == nombres and len(geometrie.barreaux) == sum(nombres)
+    premiere = morceau["sections_details"][0]
+    assert geometrie.barreaux[0].tolist() == pytest.approx([40 + premiere["jeu_depart_mm"], 140, 20, 1020 - 100 - 80])
+    assert geometrie.points_cles[-1].tolist() == pytest.approx([morceau["longueur_totale"], 0])
+
+def test_geometrie_morceau_rampant(plan_exemple):
+    """Sur un morceau rampant, les barreaux suivent la pente et l'emprise inclut le dénivelé."""
+    geometrie = calculer_geometrie(plan_exemple).morceaux[1]
+    premiere_section = geometrie.barreaux[:geometrie.barreaux_par_section[0]]
+    x, y = premiere_section[:, 0] - 40, premiere_section[:, 1] - 140
+    assert y == pytest.approx(x * geometrie.sin_angle / geometrie.cos_angle)
+    assert geometrie.bbox[3] == geometrie.points_cles[-1, 1] + 1020 > 1020
@@ -1,7 +1,13 @@
 # test_main.py
+import asyncio
+import io
+import json
+import zipfile
+
 import pytest
 # On suppose que le fichier main.py est dans le même dossier ou dans le PYTHONPATH
-from main import get_deduction_dimension, get_thickness_dimension, calculate_repartition, RepartitionResult
+from generateurbackend.calcul import RepartitionResult, calculate_repartition
+from generateurbackend.utils import get_deduction_dimension, get_thickness_dimension
 
 # --- Tests pour get_deduction_dimension ---
 
@@ -95,3 +101,67 @@ def test_calculate_repartition_exact_fit():
     assert result.nombre_barreaux == 3
     assert result.vide_entre_barreaux_mm == pytest.approx(100)
     assert result.jeu_depart_mm == pytest.approx(100)
+
+# --- Tests pour le traitement par lot ---
+
+def _zip_batch(monkeypatch, projets, formats, nb_workers=0):
+    from generateurbackend import main
+    from generateurbackend.rendu import ExecuteurRendu
+    executeur = ExecuteurRendu(nb_workers=nb_workers, file_max=1)
+    monkeypatch.setattr(main, "executeur_rendu", executeur)
+    requete = main.BatchRequest(projets=projets, formats=formats)
+
+    async def telecharger():
+        reponse = await main.batch_plans(requete)
+        return b"".join([bloc async for bloc in reponse.body_iterator])
+
+    try:
+        return zipfile.ZipFile(io.BytesIO(asyncio.run(telecharger())))
+    finally:
+        executeur.fermer()
+
+def test_batch_plans_erreur_isolee(monkeypatch, projet_exemple):
+    """Un projet invalide est signalé dans le rapport sans faire échouer le reste du lot."""
+    projet_invalide = dict(projet_exemple, titre_plan="Invalide", morceaux=[{"nombre_sections": 1, "structure": [{"type": "poteau"}, {"type": "section"}, {"type": "poteau"}]}])
+    archive = _zip_batch(monkeypatch, [projet_exemple, projet_invalide, projet_exemple], ["pdf", "dxf"])
+    assert sorted(archive.namelist()) == ["001_Plan_Test.dxf", "001_Plan_Test.pdf", "003_Plan_Test.dxf", "003_Plan_Test.pdf", "rapport.json"]
+    rapport = json.loads(archive.read("rapport.json"))
+    assert [r["status"] for r in rapport] == ["success", "error", "success"]
+    assert archive.read("001_Plan_Test.pdf").startswith(b"%PDF")
+
+def test_batch_plans_pool_de_processus(monkeypatch, projet_exemple):
+    """Les projets du lot sont calculés et dessinés dans les processus du pool."""
+    archive = _zip_batch(monkeypatch, [projet_exemple] * 3, ["dxf"], nb_workers=2)
+    assert len([nom for nom in archive.namelist() if nom.endswith(".dxf")]) == 3
+
+# --- Tests pour le rendu en un seul aller-retour ---
+
+def test_process_and_render_puis_plan_id(tmp_path, monkeypatch, projet_exemple):
+    """Le plan calculé et dessiné en une requête peut être redessiné plus tard par son identifiant."""
+    from starlette.requests import Request
+    from generateurbackend import main
+    from generateurbackend.cache_rendu import CacheRendu
+    from generateurbackend.rendu import ExecuteurRendu
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=0))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    requete = Request({"type": "http", "headers": []})
+
+    async def scenario():
+        reponse = await main.process_and_render("pdf", main.ProjectData(**projet_exemple), requete)
+        plan_id = reponse.headers["x-plan-id"]
+        plan = json.loads((await main.get_plan(plan_id)).body)
+        reponse_dxf = await main.render_stored_plan(plan_id, "DXF", requete)
+        contenu_dxf = b"".join([bloc async for bloc in reponse_dxf.body_iterator])
+        return plan_id, plan, contenu_dxf
+
+    plan_id, plan, contenu_dxf = asyncio.run(scenario())
+    assert plan["data"]["titre_plan"] == "Plan Test"
+    autre_id = json.loads(asyncio.run(main.process_data(main.ProjectData(**projet_exemple), requete)).body)["plan_id"]
+    assert autre_id != plan_id and main.stock_plans.get(autre_id) == main.stock_plans.get(plan_id)
+    assert contenu_dxf.startswith(b"  0\nSECTION")
+    with pytest.raises(main.HTTPException) as exc_info:
+        asyncio.run(main.render_stored_plan("inconnu", "pdf", requete))
+    assert exc_info.value.status_code == 404
+    with pytest.raises(main.HTTPException) as exc_info:
+        asyncio.run(main.render_stored_plan(plan_id, "dxf", requete, cotes="aucune"))
+    assert exc_info.value.status_code == 422
@@ -0,0 +1,51 @@
+# test_metriques.py
+import asyncio
+
+from generateurbackend.metriques import Registre
+
+
+def test_exposition_prometheus():
+    registre = Registre()
+    requetes = registre.compteur("requetes_total", "Requêtes.", ("route",))
+    durees = registre.histogramme("duree_secondes", "Durées.", ("etape",), bornes=(0.1, 1))
+    requetes.inc(route="/a")
+    requetes.inc(2, route="/a")
+    durees.observe(0.05, etape="dessin")
+    durees.observe(0.5, etape="dessin")
+    texte = registre.exposer()
+    assert "# TYPE requetes_total counter\nrequetes_total{route=\"/a\"} 3\n" in texte
+    assert 'duree_secondes_bucket{etape="dessin",le="0.1"} 1' in texte
+    assert 'duree_secondes_bucket{etape="dessin",le="+Inf"} 2' in texte
+    assert 'duree_secondes_count{etape="dessin"} 2' in texte
+
+def test_desactive_et_journal():
+    """Désactivé, rien n'est mesuré ; dans un journal, les mesures sont notées puis rejouées."""
+    registre = Registre(actif=False)
+    compteur = registre.compteur("n_total", "N.")
+    compteur.inc()
+    assert compteur.valeur() == 0
+
+    registre.actif = True
+    with registre.journaliser() as journal:
+        compteur.inc(5)
+    assert compteur.valeur() == 0 and journal == [("n_total", (), 5)]
+    registre.rejouer(journal)
+    assert compteur.valeur() == 5
+
+def test_rendu_mesure(tmp_path, monkeypatch, projet_exemple):
+    """Un rendu DXF via le pool note ses étapes, le cache et les octets produits."""
+    from generateurbackend import main
+    from generateurbackend.cache_rendu import CacheRendu
+    from generateurbackend.metriques import CACHE_RENDU, DUREE_ETAPES, OCTETS_PRODUITS
+    from generateurbackend.rendu import ExecuteurRendu
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=10**8))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    plan = main.calculer_plan_et_mesurer(main.ProjectData(**projet_exemple))
+    avant = {etape: DUREE_ETAPES.nombre(etape=etape) for etape in ("geometrie", "dessin_dxf", "serialisation_dxf")}
+    octets, miss = OCTETS_PRODUITS.valeur(format="dxf"), CACHE_RENDU.valeur(format="dxf", resultat="miss")
+
+    asyncio.run(main.rendre_plan(plan, "dxf"))
+    assert all(DUREE_ETAPES.nombre(etape=etape) == n + 1 for etape, n in avant.items())
+    assert OCTETS_PRODUITS.valeur(format="dxf") > octets
+    assert CACHE_RENDU.valeur(format="dxf", resultat="miss") == miss + 1
+    assert "garde_corps_etape_duree_secondes_count{etape=\"dessin_dxf\"}" in main.registre.exposer()
@@ -0,0 +1,37 @@
+# test_mise_en_page.py
+import numpy as np
+import pytest
+
+from generateurbackend.mise_en_page import decouper_chemin, ranger_par_etageres, segments_chemin
+
+
+def test_ranger_par_etageres_ordre_et_limites():
+    """Les rectangles sont rangés dans l'ordre, sans dépasser la feuille, en changeant d'étagère puis de feuille."""
+    tailles = [(150, 50), (150, 80), (150, 40), (300, 100), (80, 100)]
+    feuilles = ranger_par_etageres(tailles, 400, 200, espacement=10)
+    assert [[p.index for p in feuille] for feuille in feuilles] == [[0, 1, 2], [3, 4]]
+    assert [(p.x, p.y) for p in feuilles[0]] == [(0, 0), (160, 0), (0, 90)]
+    for feuille in feuilles:
+        for p in feuille:
+            largeur, hauteur = tailles[p.index]
+            assert p.x + largeur <= 400 and p.y + hauteur <= 200
+
+def test_ranger_par_etageres_element_trop_grand():
+    feuilles = ranger_par_etageres([(50, 50), (500, 300), (50, 50)], 400, 200)
+    assert [[p.index for p in feuille] for feuille in feuilles] == [[0], [1], [2]]
+
+def test_decouper_chemin_plat():
+    """Un chemin horizontal de 100 m est découpé en fenêtres contiguës de 40 m au plus."""
+    fenetres = decouper_chemin(segments_chemin([(0, 0), (60000, 0), (100000, 0)]), 100, 1000, 40000, 5000)
+    assert [(f.x, f.largeur) for f in fenetres] == [(0, 40000), (40000, 40000), (80000, 20000)]
+    assert all((f.y, f.hauteur) == (-100, 1100) for f in fenetres)
+
+def test_decouper_chemin_en_pente():
+    """Sur un chemin en pente, chaque fenêtre suit la montée et respecte la hauteur demandée."""
+    angle = np.radians(30)
+    fin = (50000 * np.cos(angle), 50000 * np.sin(angle))
+    fenetres = decouper_chemin(segments_chemin([(0, 0), fin]), 0, 1000, 40000, 5000)
+    assert len(fenetres) > 1
+    assert all(f.hauteur <= 5000 + 1e-6 for f in fenetres) and fenetres[0].hauteur == pytest.approx(5000)
+    assert fenetres[0].x == 0 and fenetres[-1].x + fenetres[-1].largeur == pytest.approx(fin[0])
+    assert [f.y for f in fenetres] == sorted(f.y for f in fenetres)
@@ -0,0 +1,23 @@
+# test_plans.py
+from generateurbackend.plans import OCTETS_PLAN_ID, StockPlans
+
+
+def test_plan_id_aleatoire():
+    """Chaque ajout reçoit un nouvel identifiant, même pour un plan identique."""
+    stock = StockPlans(max_plans=10, ttl=60)
+    plan_id = stock.ajouter({"titre_plan": "A", "morceaux": []})
+    assert len(plan_id) == 2 * OCTETS_PLAN_ID
+    assert stock.ajouter({"morceaux": [], "titre_plan": "A"}) != plan_id
+    assert stock.get(plan_id) == {"titre_plan": "A", "morceaux": []}
+    assert stock.get("inconnu") is None
+
+def test_plans_expiration_et_lru():
+    """Les plans expirés ou les moins récemment utilisés au-delà de la limite sont oubliés."""
+    stock = StockPlans(max_plans=10, ttl=-1)
+    assert stock.get(stock.ajouter({"a": 1})) is None
+
+    stock = StockPlans(max_plans=2, ttl=60)
+    id_a, id_b = stock.ajouter({"a": 1}), stock.ajouter({"b": 1})
+    stock.get(id_a)
+    stock.ajouter({"c": 1})
+    assert stock.get(id_b) is None and stock.get(id_a) is not None
@@ -0,0 +1,88 @@
+# test_profilage.py
+import asyncio
+import json
+import pstats
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from generateurbackend.dessin_dxf import COTES_RENDUES
+from generateurbackend.profilage import StockProfils, anonymiser, jeton_valide, rejouer
+
+
+def requete_profilee(jeton=None, query=b""):
+    headers = [(b"x-profilage", b"1")] if not query else []
+    if jeton:
+        headers.append((b"x-profilage-jeton", jeton.encode()))
+    return Request({"type": "http", "headers": headers, "query_string": query})
+
+@pytest.fixture
+def app_profilage(tmp_path, monkeypatch):
+    from generateurbackend import main
+    from generateurbackend.cache_rendu import CacheRendu
+    from generateurbackend.rendu import ExecuteurRendu
+    monkeypatch.setattr(main, "PROFILAGE_JETON", "secret")
+    monkeypatch.setattr(main, "stock_profils", StockProfils(tmp_path / "profils", max_profils=2))
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=10**8))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    return main
+
+def test_jeton_et_anonymisation():
+    """Sans jeton configuré, le profilage est refusé ; le plan enregistré ne nomme ni client ni chantier."""
+    assert not jeton_valide("secret", None) and not jeton_valide(None, "secret") and not jeton_valide("autre", "secret")
+    assert jeton_valide("secret", "secret")
+    anonyme = anonymiser({"titre_plan": "Villa Dupont", "nom_client": "M. Dupont", "morceaux": [1]})
+    assert anonyme == {"titre_plan": "Plan anonyme", "nom_client": "Client anonyme", "morceaux": [1]}
+
+def test_profilage_refuse_sans_jeton(app_profilage, projet_exemple, requete):
+    plan = app_profilage.FinalPlanData(**json.loads(asyncio.run(app_profilage.process_data(app_profilage.ProjectData(**projet_exemple), requete)).body)["data"])
+    for requete in (requete_profilee(), requete_profilee("faux"), requete_profilee(query=b"profilage=1")):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(app_profilage.draw_dxf_plan(plan, requete))
+        assert exc_info.value.status_code == 403
+
+def test_rendu_sans_profilage(app_profilage, projet_exemple, requete):
+    """Sans en-tête ni paramètre de profilage, les routes de dessin ne profilent pas."""
+    plan = app_profilage.FinalPlanData(**json.loads(asyncio.run(app_profilage.process_data(app_profilage.ProjectData(**projet_exemple), requete)).body)["data"])
+    for route in (app_profilage.draw_dxf_plan, app_profilage.draw_pdf_plan):
+        reponse = asyncio.run(route(plan, requete))
+        assert "x-profil-id" not in reponse.headers
+
+def test_rendu_profile_et_rejoue(app_profilage, projet_exemple):
+    """Un rendu profilé ignore le cache, enregistre profil et plan anonymisé, et peut être rejoué."""
+    main = app_profilage
+    reponse = asyncio.run(main.process_data(main.ProjectData(**projet_exemple), requete_profilee("secret")))
+    plan = main.FinalPlanData(**json.loads(reponse.body)["data"])
+    asyncio.run(main.draw_dxf_plan(plan, Request({"type": "http", "headers": [], "query_string": b""})))
+
+    # Le plan est déjà dans le cache : le rendu profilé le redessine quand même
+    reponse = asyncio.run(main.draw_dxf_plan(plan, requete_profilee("secret")))
+    dossier = main.stock_profils.dossier / reponse.headers["x-profil-id"]
+    assert any(nom == "creer_plan_dxf" for _, _, nom in pstats.Stats(str(dossier / "profil.prof")).stats)
+    infos = json.loads((dossier / "infos.json").read_text())
+    assert infos["route"] == "draw-dxf" and infos["options"] == {"cotes": COTES_RENDUES}
+    entree = json.loads((dossier / "entree.json").read_text())
+    assert entree["nom_client"] == "Client anonyme" and entree["morceaux"] == plan.model_dump()["morceaux"]
+    assert len(rejouer(dossier, repetitions=1)) == 1
+
+    # Au-delà de PROFILAGE_MAX profils, les plus anciens sont supprimés
+    asyncio.run(main.draw_pdf_plan(plan, requete_profilee("secret")))
+    assert len(list(main.stock_profils.dossier.iterdir())) == 2
+
+def test_profil_enregistre_hors_de_la_boucle(app_profilage, projet_exemple, monkeypatch):
+    """L'écriture des fichiers du profil se fait dans le pool de threads, pas dans la boucle d'événements."""
+    import threading
+    main = app_profilage
+    enregistrer, fils = main.stock_profils.enregistrer, []
+
+    def enregistrer_espion(*args, **kwargs):
+        fils.append(threading.current_thread())
+        return enregistrer(*args, **kwargs)
+
+    monkeypatch.setattr(main.stock_profils, "enregistrer", enregistrer_espion)
+    reponse = asyncio.run(main.process_data(main.ProjectData(**projet_exemple), requete_profilee("secret")))
+    plan = main.FinalPlanData(**json.loads(reponse.body)["data"])
+    asyncio.run(main.draw_dxf_plan(plan, requete_profilee("secret")))
+    asyncio.run(main.draw_pdf_plan(plan, requete_profilee("secret")))
+    assert len(fils) == 3 and threading.main_thread() not in fils
@@ -0,0 +1,33 @@
+# test_profils.py
+import pytest
+
+from generateurbackend.profils import PROFIL_VIDE, parse_profil, profils_du_plan
+
+
+@pytest.mark.parametrize("designation, forme, dimensions, epaisseur, deduction", [
+    ("40x40", "carre", (40, 40), 40, 40),
+    ("40x20", "rectangulaire", (40, 20), 40, 20),
+    ("Plat 50x8", "plat", (50, 8), 50, 8),
+    ("Ø42.4x2", "rond", (42.4, 2), 42.4, 2),
+    ("40x40x3", "carre", (40, 40, 3), 40, 40),
+    ("40", "inconnu", (40,), 40, 40),
+    ("abc", "inconnu", (), 0, 0),
+])
+def test_parse_profil(designation, forme, dimensions, epaisseur, deduction):
+    """Chaque désignation courante est décomposée en forme et dimensions."""
+    profil = parse_profil(designation)
+    assert (profil.forme, profil.dimensions, profil.epaisseur, profil.deduction) == (forme, dimensions, epaisseur, deduction)
+
+def test_parse_profil_vide_et_cache():
+    """Une désignation vide donne le profil vide ; une même désignation n'est analysée qu'une fois."""
+    assert parse_profil("") is PROFIL_VIDE and parse_profil(None) is PROFIL_VIDE
+    parse_profil.cache_clear()
+    assert parse_profil("Plat 60x10") is parse_profil("Plat 60x10")
+    assert parse_profil.cache_info().hits == 1
+
+def test_profils_du_plan(projet_exemple):
+    """Tous les profilés d'un projet sont résolus en un appel, depuis un dict ou un modèle."""
+    from generateurbackend.calcul import ProjectData
+    profils = profils_du_plan(projet_exemple)
+    assert profils == profils_du_plan(ProjectData(**projet_exemple))
+    assert profils["liaison"].deduction == 20 and profils["barreau"].epaisseur == 20
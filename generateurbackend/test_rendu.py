@@ -0,0 +1,142 @@
+# test_rendu.py
+import asyncio
+import json
+import tempfile
+import threading
+
+import pytest
+
+from generateurbackend.rendu import ExecuteurRendu, RenduSatureError, contexte_processus, tache_batch_projet, tache_rendu_dxf
+
+
+def test_executeur_execute_la_tache():
+    """Le résultat de la tâche est renvoyé à l'appelant."""
+    executeur = ExecuteurRendu(nb_workers=0, file_max=0)
+    assert asyncio.run(executeur.executer(sum, [1, 2, 3])) == 6
+    assert executeur.en_cours == 0
+
+def test_executeur_sature():
+    """Au-delà de la capacité, une demande est refusée avec RenduSatureError."""
+    executeur = ExecuteurRendu(nb_workers=0, file_max=0, retry_after=7)
+    libere = threading.Event()
+
+    async def scenario():
+        premiere = asyncio.ensure_future(executeur.executer(libere.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(RenduSatureError) as exc_info:
+            await executeur.executer(sum, [1])
+        libere.set()
+        await premiere
+        return exc_info.value
+
+    erreur = asyncio.run(scenario())
+    assert erreur.retry_after == 7
+    assert executeur.en_cours == 0
+
+def test_executeur_attente_reveillee():
+    """Avec attendre=True, une demande patiente sans scruter la file et reprend dès qu'un rendu se termine."""
+    executeur = ExecuteurRendu(nb_workers=0, file_max=0)
+    libere = threading.Event()
+
+    async def scenario():
+        premiere = asyncio.ensure_future(executeur.executer(libere.wait, 5))
+        await asyncio.sleep(0.05)
+        annulee = asyncio.ensure_future(executeur.executer(sum, [1], attendre=True))
+        suivante = asyncio.ensure_future(executeur.executer(sum, [2, 3], attendre=True))
+        await asyncio.sleep(0.05)
+        assert not suivante.done() and len(executeur._attente) == 2
+        annulee.cancel()
+        libere.set()
+        await premiere
+        return await asyncio.wait_for(suivante, 1)
+
+    assert asyncio.run(scenario()) == 5
+    assert executeur.en_cours == 0 and not executeur._attente
+
+def test_contexte_sans_fork(monkeypatch):
+    """Les processus de rendu ne sont jamais forkés depuis le serveur (qui a déjà des threads)."""
+    assert contexte_processus().get_start_method() in ("forkserver", "spawn")
+    assert contexte_processus("spawn").get_start_method() == "spawn"
+    monkeypatch.setenv("RENDU_CONTEXTE", "fork")
+    with pytest.raises(ValueError):
+        contexte_processus()
+
+def test_executeur_pool_de_processus(projet_exemple, requete):
+    """Un rendu DXF passe par un vrai processus du pool et revient sous forme d'octets."""
+    from generateurbackend.main import ProjectData, process_data
+    plan = json.loads(asyncio.run(process_data(ProjectData(**projet_exemple), requete)).body)["data"]
+    executeur = ExecuteurRendu(nb_workers=1, file_max=1)
+    try:
+        executeur.demarrer(["generateurbackend.dessin_dxf"])
+        assert executeur._pool._mp_context.get_start_method() != "fork"
+        contenu = asyncio.run(executeur.executer(tache_rendu_dxf, plan))
+    finally:
+        executeur.fermer()
+    assert contenu.startswith(b"  0\nSECTION")
+
+def modules_charges(noms):
+    """Modules parmi `noms` déjà importés dans le processus qui exécute la fonction."""
+    import sys
+    return [nom for nom in noms if nom in sys.modules]
+
+def test_lot_sans_importer_l_application(projet_exemple):
+    """Un projet du lot est calculé et dessiné dans un processus de rendu qui n'importe pas l'application."""
+    executeur = ExecuteurRendu(nb_workers=1, file_max=1)
+
+    async def scenario():
+        fichiers = await executeur.executer(tache_batch_projet, projet_exemple, ["dxf"])
+        return fichiers, await executeur.executer(modules_charges, ["generateurbackend.main", "generateurbackend.cache_ia", "generateurbackend.client_ia"])
+
+    try:
+        fichiers, charges = asyncio.run(scenario())
+    finally:
+        executeur.fermer()
+    assert fichiers["dxf"].startswith(b"  0\nSECTION")
+    assert charges == []
+
+def test_pdf_en_memoire_sans_fichier(tmp_path, monkeypatch, projet_exemple, requete):
+    """Le PDF est produit en mémoire : aucun fichier n'apparaît dans le dossier courant."""
+    from generateurbackend import main
+    from generateurbackend.cache_rendu import CacheRendu
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=0))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    plan = main.FinalPlanData(**json.loads(asyncio.run(main.process_data(main.ProjectData(**projet_exemple), requete)).body)["data"])
+
+    async def telecharger():
+        reponse = await main.draw_pdf_plan(plan, requete)
+        return reponse, b"".join([bloc async for bloc in reponse.body_iterator])
+
+    reponse, contenu = asyncio.run(telecharger())
+    assert contenu.startswith(b"%PDF")
+    assert reponse.headers["content-length"] == str(len(contenu))
+    assert reponse.headers["content-disposition"] == "attachment; filename*=utf-8''Plan%20Test.pdf"
+    assert list(tmp_path.iterdir()) == []
+
+def test_dxf_compresse_si_accepte(tmp_path, monkeypatch, projet_exemple):
+    """Avec Accept-Encoding: gzip, le DXF est envoyé compressé et aucun fichier temporaire n'est créé."""
+    import gzip
+    from starlette.requests import Request
+    from generateurbackend import main
+    from generateurbackend.cache_rendu import CacheRendu
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(main, "cache_rendu", CacheRendu(tmp_path / "cache", taille_max=0))
+    monkeypatch.setattr(main, "executeur_rendu", ExecuteurRendu(nb_workers=0, file_max=1))
+    requete = Request({"type": "http", "headers": [(b"accept-encoding", b"deflate, gzip;q=0.9")]})
+    plan = main.FinalPlanData(**json.loads(asyncio.run(main.process_data(main.ProjectData(**projet_exemple), requete)).body)["data"])
+
+    async def telecharger():
+        reponse = await main.draw_dxf_plan(plan, requete)
+        return reponse, b"".join([bloc async for bloc in reponse.body_iterator])
+
+    reponse, contenu = asyncio.run(telecharger())
+    assert reponse.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(contenu).startswith(b"  0\nSECTION")
+    assert list(tmp_path.iterdir()) == []
+
+def test_choisir_encodage():
+    from generateurbackend.main import choisir_encodage
+    assert choisir_encodage(None) is None
+    assert choisir_encodage("br, deflate") == "deflate"
+    assert choisir_encodage("gzip;q=0, deflate") == "deflate"
+    assert choisir_encodage("identity") is None
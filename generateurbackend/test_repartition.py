@@ -0,0 +1,47 @@
+# test_repartition.py
+import random
+
+import numpy as np
+import pytest
+
+from generateurbackend.calcul import calculate_repartition
+from generateurbackend.repartition import calculate_repartition_batch
+
+
+def _comparer(longueurs, epaisseurs, ecarts):
+    """Vérifie, cas par cas, l'égalité exacte entre la version vectorisée et la version scalaire."""
+    nombres, vides, jeux = calculate_repartition_batch(longueurs, epaisseurs, ecarts)
+    for k, (longueur, epaisseur, ecart) in enumerate(zip(longueurs, epaisseurs, ecarts)):
+        attendu = calculate_repartition(longueur, epaisseur, ecart)
+        assert (int(nombres[k]), float(vides[k]), float(jeux[k])) == (attendu.nombre_barreaux, attendu.vide_entre_barreaux_mm, attendu.jeu_depart_mm), (longueur, epaisseur, ecart)
+
+def test_batch_cas_limites():
+    """Cas limites : longueurs nulles/négatives, paramètres invalides, écarts tombant juste, un seul barreau."""
+    cas = [
+        (940, 20, 110), (0, 20, 110), (-100, 20, 110), (200, 20, 110), (100, 20, 110), (460, 20, 100),
+        (130, 20, 110), (130.0000001, 20, 110), (240, 20, 110), (1000, 0, 110), (1000, 20, 0), (1000, -5, 110),
+        (110, 20, 110), (110.000000001, 20, 110), (1e-9, 20, 110), (1e6, 12.5, 99.9),
+    ]
+    longueurs, epaisseurs, ecarts = (list(colonne) for colonne in zip(*cas))
+    _comparer(longueurs, epaisseurs, ecarts)
+
+@pytest.mark.parametrize("graine", range(5))
+def test_batch_proprietes_aleatoires(graine):
+    """Propriété : sur des entrées aléatoires (entières et décimales), les deux versions coïncident exactement."""
+    rng = random.Random(graine)
+    longueurs = [rng.choice([rng.randint(-50, 5000), round(rng.uniform(0, 5000), rng.randint(0, 3))]) for _ in range(2000)]
+    epaisseurs = [rng.choice([20, 12, 14.5, 25.4, rng.randint(1, 60)]) for _ in range(2000)]
+    ecarts = [rng.choice([110, 100, 99.9, rng.randint(1, 200)]) for _ in range(2000)]
+    _comparer(longueurs, epaisseurs, ecarts)
+
+def test_batch_multiples_exacts():
+    """Propriété : quand la longueur est un multiple exact du motif barreau + écart, aucun barreau n'est ajouté en trop."""
+    longueurs = [n * (20 + 110) + 110 for n in range(0, 200)]
+    _comparer(longueurs, [20] * len(longueurs), [110] * len(longueurs))
+
+def test_batch_diffusion_scalaire():
+    """L'épaisseur et l'écart peuvent être des scalaires diffusés sur toutes les sections."""
+    nombres, vides, jeux = calculate_repartition_batch(np.array([940.0, 200.0, 0.0]), 20, 110)
+    assert nombres.tolist() == [7, 1, 0]
+    assert vides.tolist() == pytest.approx([100, 90, 0])
+    assert jeux.tolist() == pytest.approx([100, 90, 0])
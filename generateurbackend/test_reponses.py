@@ -0,0 +1,65 @@
+# test_reponses.py
+import asyncio
+import json
+import math
+
+from generateurbackend import reponses
+from generateurbackend.reponses import ReponseJSON, arrondir_flottants, encoder_json
+
+
+def appeler(app, methode, chemin, corps=b"", query=b""):
+    """Appelle l'application ASGI et retourne (statut, en-têtes, corps)."""
+    messages = [{"type": "http.request", "body": corps, "more_body": False}]
+    envoyes = []
+
+    async def recevoir():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def envoyer(message):
+        envoyes.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": methode, "scheme": "http",
+             "path": chemin, "raw_path": chemin.encode(), "query_string": query, "root_path": "",
+             "headers": [(b"content-type", b"application/json")], "client": ("test", 1), "server": ("test", 80)}
+    asyncio.run(app(scope, recevoir, envoyer))
+    debut = next(m for m in envoyes if m["type"] == "http.response.start")
+    return debut["status"], dict(debut["headers"]), b"".join(m.get("body", b"") for m in envoyes if m["type"] == "http.response.body")
+
+
+def test_encodage_identique_a_json():
+    contenu = {"titre": "Plan n°1 é", "valeurs": [1, 2.5, None, True], "imbrique": {"vide": 97.14285714285714}}
+    assert json.loads(encoder_json(contenu)) == contenu
+    assert json.loads(ReponseJSON(contenu).body) == contenu
+
+def test_non_finis_ecrits_null_avec_ou_sans_orjson(monkeypatch):
+    """NaN et infinis donnent `null` avec orjson comme avec le module json de la bibliothèque standard."""
+    contenu = {"vide": math.nan, "valeurs": [math.inf, -math.inf, 1.5], "titre": "Plan"}
+    attendu = {"vide": None, "valeurs": [None, None, 1.5], "titre": "Plan"}
+    avec_orjson = encoder_json(contenu)
+    monkeypatch.setattr(reponses, "orjson", None)
+    assert json.loads(avec_orjson) == json.loads(encoder_json(contenu)) == attendu
+    assert math.isnan(contenu["vide"])
+
+def test_arrondi_des_flottants():
+    contenu = {"sections": [{"nombre_barreaux": 7, "vide_entre_barreaux_mm": 97.14285714285714}], "angle": 12.5}
+    assert arrondir_flottants(contenu, 1) == {"sections": [{"nombre_barreaux": 7, "vide_entre_barreaux_mm": 97.1}], "angle": 12.5}
+    assert contenu["sections"][0]["vide_entre_barreaux_mm"] == 97.14285714285714
+    assert json.loads(ReponseJSON(contenu, decimales=0).body)["sections"][0]["vide_entre_barreaux_mm"] == 97.0
+
+def test_process_data_arrondi_et_corps_invalide(projet_exemple):
+    """`?decimales=` arrondit la réponse seulement ; un corps de draw-pdf invalide est refusé par le gestionnaire 422."""
+    from generateurbackend import main
+    statut, entetes, corps = appeler(main.app, "POST", "/api/process-data", json.dumps(projet_exemple).encode(), b"decimales=1")
+    assert statut == 200 and entetes[b"content-type"] == b"application/json"
+    reponse = json.loads(corps)
+    vides = [s["vide_entre_barreaux_mm"] for m in reponse["data"]["morceaux"] for s in m["sections_details"]]
+    assert vides and all(v == round(v, 1) for v in vides)
+    assert main.stock_plans.get(reponse["plan_id"]) is not None
+
+    assert appeler(main.app, "POST", "/api/process-data", json.dumps(projet_exemple).encode(), b"decimales=9")[0] == 422
+    for corps_invalide in (b"{pas du json", json.dumps({"titre_plan": "Plan"}).encode()):
+        statut, _, corps = appeler(main.app, "POST", "/api/draw-pdf", corps_invalide)
+        assert statut == 422 and "body" in json.loads(corps)["detail"]
+    schema = main.app.openapi()
+    assert schema["paths"]["/api/draw-dxf"]["post"]["requestBody"]["content"]["application/json"]["schema"]["$ref"].endswith("/FinalPlanData")
+    assert "FinalPlanData" in schema["components"]["schemas"]